@@ -4,6 +4,7 @@ from sklearn.ensemble import IsolationForest
 import logging
 import datetime
 import os
+import tempfile
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("mlops-pipeline")
@@ -35,10 +36,17 @@ def evaluate_model(new_model, X_val):
 
 def deploy_model(model):
     logger.info(f"Deploying new model version to {MODEL_PATH}...")
-    joblib.dump(model, MODEL_PATH)
-    # Trigger K8s rollout restart
-    # subprocess.run("kubectl rollout restart deployment risk-engine", shell=True)
-    logger.info("Deployment trigger sent to Kubernetes.")
+    # Write next to the live file and rename over it: the risk-engine workers
+    # poll MODEL_PATH and hot-swap the new version, no restart or partial reads
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(MODEL_PATH), prefix=".risk_model-", suffix=".joblib")
+    os.close(fd)
+    try:
+        joblib.dump(model, tmp)  # uncompressed, so workers can memory-map it
+        os.replace(tmp, MODEL_PATH)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    logger.info("New model published; risk-engine workers will load it within their poll interval.")
 
 def run_pipeline():
     logger.info(f"Starting MLOps Pipeline at {datetime.datetime.now()}")
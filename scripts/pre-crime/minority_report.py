@@ -37,6 +37,16 @@ class PreCrimeModel:
         
         return probability, reasons
 
+def profile_from_baseline(user_id, baseline, data_access_volume, biometric_stress_marker=0.0):
+    """User profile from a risk-engine GET /baseline/{user_id} response."""
+    return {
+        "id": user_id,
+        "login_hour_variance": baseline["login_hour_variance"],
+        "data_access_volume": data_access_volume,
+        "historical_avg": baseline["historical_avg"] or 0.0,
+        "biometric_stress_marker": biometric_stress_marker,
+    }
+
 if __name__ == "__main__":
     # Simulation
     suspect = {
@@ -1,7 +1,7 @@
-from fastapi import FastAPI, Request, HTTPException, Depends
+import redis.asyncio as redis
+from fastapi import FastAPI, Request
 from gabizap_common.logger import setup_logger
 from gabizap_common.config import BaseConfig
-import httpx
 
 logger = setup_logger("api-gateway")
 
@@ -9,9 +9,43 @@ class Config(BaseConfig):
     AUTH_SERVICE_URL: str
     USER_SERVICE_URL: str
     IRIS_SERVICE_URL: str
+    RISK_SERVICE_URL: str = "http://risk-engine:8005"
+    # Upstream connection pool (one per backend service)
+    UPSTREAM_MAX_CONNECTIONS: int = 100
+    UPSTREAM_MAX_KEEPALIVE: int = 20
+    UPSTREAM_KEEPALIVE_EXPIRY_S: float = 30.0
+    UPSTREAM_CONNECT_TIMEOUT_S: float = 5.0
+    # Engine calls (image processing) can legitimately take seconds
+    UPSTREAM_READ_TIMEOUT_S: float = 60.0
+    UPSTREAM_POOL_TIMEOUT_S: float = 5.0
+    # Negotiated via ALPN, so only effective for https upstreams
+    UPSTREAM_HTTP2: bool = False
+    # Rate limits (requests per window, per verified identity or client IP)
+    RATE_LIMIT: int = 100
+    RATE_LIMIT_WINDOW_S: float = 60.0
+    LOGIN_RATE_LIMIT: int = 10          # per IP on /auth/token
+    ENGINE_RATE_LIMIT: int = 30         # per identity on /iris
+    RATE_LIMIT_REDIS_TIMEOUT_S: float = 0.05
+    # Seconds of clock skew tolerated on token expiry
+    TOKEN_LEEWAY_S: int = 0
+    # auth-service's public signing keys; an unknown kid refetches at most every JWKS_MIN_REFRESH_S
+    JWKS_URL: str = ""
+    JWKS_TTL_S: float = 300.0
+    JWKS_MIN_REFRESH_S: float = 10.0
+    TOKEN_ALGORITHMS: str = "ES256"
+    # Risk decisions per (subject, device, IP prefix), scored in the background
+    RISK_CACHE_TTL_S: float = 60.0
+    RISK_STALE_TTL_S: float = 300.0
+    RISK_DEFAULT_ACTION: str = "allow"   # until a context's first scoring lands
+    RISK_TIMEOUT_S: float = 1.0
+    RISK_MAX_INFLIGHT: int = 32
 
-from .middleware import RateLimitMiddleware
-from .zero_trust import ZeroTrustMiddleware
+from .middleware import RateLimitMiddleware, RateLimitRule
+from .proxy import UpstreamPool
+from .risk import RiskCache
+from .zero_trust import TokenVerifier, ZeroTrustMiddleware
+from gabizap_common.jwks import RemoteKeySet
+from gabizap_common.revocation import RevocationFeed, RevocationSet
 
 config = Config(SERVICE_NAME="api-gateway")
 config.REDIS_URL = "redis://redis:6379/0" 
@@ -19,34 +53,65 @@ config.REDIS_URL = "redis://redis:6379/0"
 app = FastAPI(title="GABIZAP API Gateway")
 
 # Add Middlewares
-app.add_middleware(RateLimitMiddleware, redis_url=config.REDIS_URL, limit=100, window=60)
-# Note: Middleware order matters. Last added is executed first? No, first added is outer?
-# Starlette executes in order added? Actually typical is LIFO for some implementations, but let's assume standard behavior.
-# We want Rate Limit first (cheap), then Zero Trust (expensive).
-app.add_middleware(ZeroTrustMiddleware, auth_url=config.AUTH_SERVICE_URL, risk_url="http://risk-engine:8005")
+app.add_middleware(
+    RateLimitMiddleware, redis_url=config.REDIS_URL, limit=config.RATE_LIMIT, window=config.RATE_LIMIT_WINDOW_S,
+    redis_timeout=config.RATE_LIMIT_REDIS_TIMEOUT_S,
+    rules=[
+        RateLimitRule("login", "/auth/token", config.LOGIN_RATE_LIMIT, config.RATE_LIMIT_WINDOW_S, per="ip"),
+        RateLimitRule("engine", "/iris/", config.ENGINE_RATE_LIMIT, config.RATE_LIMIT_WINDOW_S),
+    ],
+)
+# Starlette runs the last added middleware outermost: Zero Trust verifies the
+# token first (locally, microseconds) so the rate limiter can key on the
+# verified principal; unauthenticated requests are rejected before reaching it.
+revocations = RevocationSet()
+signing_keys = RemoteKeySet(config.JWKS_URL or f"{config.AUTH_SERVICE_URL}/.well-known/jwks.json",
+                            ttl_s=config.JWKS_TTL_S, min_refresh_s=config.JWKS_MIN_REFRESH_S)
+verifier = TokenVerifier(signing_keys, config.TOKEN_ALGORITHMS.split(","), revocations=revocations,
+                         leeway=config.TOKEN_LEEWAY_S)
+revocation_feed = RevocationFeed(redis.from_url(config.REDIS_URL), revocations)
+risk_cache = RiskCache(config.RISK_SERVICE_URL, ttl=config.RISK_CACHE_TTL_S, stale_ttl=config.RISK_STALE_TTL_S,
+                       default_action=config.RISK_DEFAULT_ACTION, timeout=config.RISK_TIMEOUT_S,
+                       max_inflight=config.RISK_MAX_INFLIGHT)
+app.add_middleware(ZeroTrustMiddleware, auth_url=config.AUTH_SERVICE_URL, risk_url=config.RISK_SERVICE_URL,
+                   verifier=verifier, risk=risk_cache)
+
+upstreams = UpstreamPool(
+    max_connections=config.UPSTREAM_MAX_CONNECTIONS, max_keepalive=config.UPSTREAM_MAX_KEEPALIVE,
+    keepalive_expiry=config.UPSTREAM_KEEPALIVE_EXPIRY_S, connect_timeout=config.UPSTREAM_CONNECT_TIMEOUT_S,
+    read_timeout=config.UPSTREAM_READ_TIMEOUT_S, pool_timeout=config.UPSTREAM_POOL_TIMEOUT_S,
+    http2=config.UPSTREAM_HTTP2,
+)
+
+@app.on_event("startup")
+async def start_revocation_feed():
+    await revocation_feed.start(wait=2.0)
+    # Failures are logged; the first token then triggers another fetch
+    await signing_keys.refresh()
+
+@app.on_event("shutdown")
+async def close_upstreams():
+    await revocation_feed.stop()
+    await signing_keys.close()
+    await risk_cache.close()
+    await upstreams.close()
 
 @app.get("/health")
 async def health_check():
     logger.info("Health check received")
-    return {"status": "healthy", "service": "api-gateway"}
+    return {"status": "healthy", "service": "api-gateway", "risk_cache": risk_cache.stats(),
+            "signing_keys": signing_keys.stats()}
 
 async def forward_request(service_url: str, request: Request, path: str):
-    async with httpx.AsyncClient() as client:
-        # Forward the request to the downstream service
-        # This is a simplified example; a real gateway would handle headers, methods, bodies more robustly
-        url = f"{service_url}/{path}"
-        try:
-            resp = await client.request(
-                method=request.method,
-                url=url,
-                headers=request.headers,
-                params=request.query_params,
-                content=await request.body()
-            )
-            return resp.json()
-        except httpx.RequestError as exc:
-            logger.error(f"Error connecting to {service_url}: {exc}")
-            raise HTTPException(status_code=503, detail="Service unavailable")
+    # Pooled keep-alive connection; body, status and headers streamed through as-is
+    return await upstreams.forward(service_url, request, path)
+
+@app.get("/auth/validate")
+async def validate_session(request: Request):
+    # Answered from the claims ZeroTrustMiddleware just verified: session
+    # heartbeats never reach auth-service
+    claims = request.state.claims
+    return {"valid": True, "sub": claims["sub"], "exp": claims["exp"]}
 
 @app.api_route("/auth/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
 async def auth_proxy(path: str, request: Request):
@@ -56,4 +121,8 @@ async def auth_proxy(path: str, request: Request):
 async def user_proxy(path: str, request: Request):
     return await forward_request(config.USER_SERVICE_URL, request, path)
 
+@app.api_route("/iris/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+async def iris_proxy(path: str, request: Request):
+    return await forward_request(config.IRIS_SERVICE_URL, request, path)
+
 # Add more routes as needed
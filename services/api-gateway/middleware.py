@@ -1,46 +1,200 @@
-from fastapi import Request, HTTPException, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
-import redis.asyncio as redis
+import asyncio
+import math
 import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import redis.asyncio as redis
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 from gabizap_common.logger import setup_logger
 
 logger = setup_logger("api-gateway")
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app: ASGIApp, redis_url: str, limit: int = 100, window: int = 60):
-        super().__init__(app)
-        self.redis = redis.from_url(redis_url, encoding="utf-8", decode_responses=True)
+# Distributed rate limiting, as plain ASGI middleware (no BaseHTTPMiddleware
+# request/response wrapping, so streamed bodies pass straight through).
+#
+# Limits use GCRA (generic cell rate algorithm): each key stores a single
+# "theoretical arrival time". A limit of N per window is one token every
+# window / N, with bursts of up to N. The check-and-update is one Lua script,
+# so it is atomic across gateway replicas and costs one Redis round trip;
+# Redis' own clock is used, so replica clock skew doesn't matter.
+#
+# Local token leases: instead of one token per round trip the gateway asks
+# for a small lease (RateLimitRule.lease) and serves the next requests of
+# that key from memory. Leased tokens are already charged in Redis, so the
+# global limit still holds; unused ones lapse after LEASE_TTL. When Redis
+# errors or is slower than redis_timeout the limiter stops calling it for
+# BACKOFF_S and enforces the same limits per process instead of failing open.
+
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local want = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + tonumber(clock[2]) / 1000
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local granted = math.min(want, math.floor((now + burst * interval - tat) / interval))
+if granted <= 0 then
+    return {0, math.ceil(tat - now - (burst - 1) * interval)}
+end
+tat = tat + granted * interval
+redis.call('SET', KEYS[1], tostring(tat), 'PX', math.max(1, math.ceil(tat - now)))
+return {granted, 0}
+"""
+
+LEASE_TTL = 1.0           # seconds a leased token stays usable locally
+BACKOFF_S = 1.0           # local-only enforcement after a Redis failure
+MAX_LOCAL_KEYS = 100000
+
+
+def gcra(tat: float, now: float, interval: float, burst: int, want: int) -> Tuple[int, float, float]:
+    """In-process twin of GCRA_SCRIPT (ms units): (granted, new_tat, retry_after_ms)."""
+    tat = max(tat, now)
+    granted = min(want, math.floor((now + burst * interval - tat) / interval))
+    if granted <= 0:
+        return 0, tat, tat - now - (burst - 1) * interval
+    return granted, tat + granted * interval, 0.0
+
+
+class RateLimitRule:
+    """
+    `limit` requests per `window` seconds to paths starting with `prefix`,
+    counted per client IP or per identity (the verified principal an outer
+    middleware put in scope["state"], else the client IP).
+    """
+
+    def __init__(self, name: str, prefix: str = "/", limit: int = 100, window: float = 60.0,
+                 per: str = "identity", lease: Optional[int] = None):
+        if per not in ("identity", "ip"):
+            raise ValueError(f"Unknown rate limit key: {per}")
+        self.name = name
+        self.prefix = prefix
         self.limit = limit
         self.window = window
+        self.per = per
+        self.interval_ms = window * 1000.0 / limit
+        # A lease is a few percent of the budget: small enough that tokens
+        # stranded on one replica barely matter, 1 for tight (login) limits
+        self.lease = lease or max(1, limit // 20)
+
+
+class _Lease:
+    __slots__ = ("tokens", "expires")
+
+    def __init__(self, tokens: int, expires: float):
+        self.tokens = tokens
+        self.expires = expires
+
+
+class RateLimiter:
+    def __init__(self, client, redis_timeout: float = 0.05):
+        self.redis = client
+        self.redis_timeout = redis_timeout
+        self._script = client.register_script(GCRA_SCRIPT)
+        self._leases: Dict[str, _Lease] = {}
+        self._local_tat: Dict[str, float] = {}
+        self._redis_down_until = 0.0
+        self.redis_calls = 0
+        self.local_hits = 0
+        self.fallbacks = 0
+
+    def _prune(self, now: float):
+        if len(self._leases) > MAX_LOCAL_KEYS:
+            self._leases = {k: v for k, v in self._leases.items() if v.expires > now and v.tokens}
+        if len(self._local_tat) > MAX_LOCAL_KEYS:
+            ms = now * 1000.0
+            self._local_tat = {k: v for k, v in self._local_tat.items() if v > ms}
+
+    async def acquire(self, key: str, rule: RateLimitRule) -> Tuple[bool, float]:
+        """Takes one token for key; returns (allowed, retry_after_seconds)."""
+        now = time.monotonic()
+        lease = self._leases.get(key)
+        if lease is not None and lease.tokens and lease.expires > now:
+            lease.tokens -= 1
+            self.local_hits += 1
+            self._charge_local(key, rule, now)
+            return True, 0.0
+
+        if now >= self._redis_down_until:
+            try:
+                self.redis_calls += 1
+                granted, retry_ms = await asyncio.wait_for(
+                    self._script(keys=[key], args=[rule.interval_ms, rule.limit, rule.lease]),
+                    self.redis_timeout)
+                granted, retry_ms = int(granted), int(retry_ms)
+                if granted:
+                    self._prune(now)
+                    lease = self._leases.get(key)
+                    expires = now + min(LEASE_TTL, rule.window)
+                    if lease is not None and lease.expires > now:
+                        # Concurrent refills of one key: keep both grants
+                        lease.tokens += granted - 1
+                        lease.expires = expires
+                    else:
+                        self._leases[key] = _Lease(granted - 1, expires)
+                    self._charge_local(key, rule, now)
+                    return True, 0.0
+                return False, retry_ms / 1000.0
+            except (redis.RedisError, OSError, asyncio.TimeoutError) as e:
+                logger.error(f"Rate limiter falling back to local limits: {e!r}")
+                self._redis_down_until = now + BACKOFF_S
+
+        # Degraded mode: the same limit per process (looser across replicas, but bounded)
+        self.fallbacks += 1
+        ms = now * 1000.0
+        granted, tat, retry_ms = gcra(self._local_tat.get(key, ms), ms, rule.interval_ms, rule.limit, 1)
+        self._prune(now)
+        self._local_tat[key] = tat
+        return bool(granted), retry_ms / 1000.0
+
+    def _charge_local(self, key: str, rule: RateLimitRule, now: float):
+        # Track this process' own usage even while Redis decides, so switching
+        # to degraded mode doesn't hand every key a fresh burst
+        ms = now * 1000.0
+        tat = max(self._local_tat.get(key, ms), ms)
+        self._local_tat[key] = min(tat + rule.interval_ms, ms + rule.limit * rule.interval_ms)
+
+
+def client_identity(scope: Scope, per: str) -> str:
+    if per == "identity":
+        # Only a principal an outer middleware has verified: a raw bearer
+        # token or unverified JWT claim can be rotated or forged at will
+        principal = scope.get("state", {}).get("principal")
+        if principal:
+            return f"user:{principal}"
+    client = scope.get("client")
+    return "ip:" + (client[0] if client else "unknown")
+
+
+class RateLimitMiddleware:
+    def __init__(self, app: ASGIApp, redis_url: Optional[str] = None, limit: int = 100, window: int = 60,
+                 rules: Sequence[RateLimitRule] = (), exempt: Sequence[str] = ("/health",),
+                 redis_timeout: float = 0.05, client=None):
+        self.app = app
+        client = client or redis.from_url(redis_url, encoding="utf-8", decode_responses=True)
+        self.limiter = RateLimiter(client, redis_timeout)
+        self.default = RateLimitRule("default", "/", limit, window)
+        # Longest prefix wins
+        self.rules = sorted(rules, key=lambda r: len(r.prefix), reverse=True)
+        self.exempt = frozenset(exempt)
+
+    def rule_for(self, path: str) -> RateLimitRule:
+        for rule in self.rules:
+            if path.startswith(rule.prefix):
+                return rule
+        return self.default
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            return await self.app(scope, receive, send)
 
-    async def dispatch(self, request: Request, call_next):
-        # Allow health checks without limiting
-        if request.url.path == "/health":
-            return await call_next(request)
-
-        client_ip = request.client.host
-        key = f"rate_limit:{client_ip}"
-        
-        try:
-            current = await self.redis.get(key)
-            if current and int(current) >= self.limit:
-                logger.warning(f"Rate limit exceeded for {client_ip}")
-                return Response("Too Many Requests", status_code=429)
-            
-            async with self.redis.pipeline() as pipe:
-                await pipe.incr(key)
-                if not current:
-                    await pipe.expire(key, self.window)
-                await pipe.execute()
-                
-        except Exception as e:
-            logger.error(f"Redis error in rate limiter: {e}")
-            # Fail open if Redis is down, or closed? Secure systems fail closed.
-            # For availability, we might fail open, but for "Defense Grade", fail closed.
-            # Let's fail open for now to avoid locking out legitimate users during transient redis faults, 
-            # but log heavily.
-            pass
-
-        response = await call_next(request)
-        return response
+        rule = self.rule_for(scope["path"])
+        identity = client_identity(scope, rule.per)
+        allowed, retry_after = await self.limiter.acquire(f"rate_limit:{rule.name}:{identity}", rule)
+        if not allowed:
+            logger.warning(f"Rate limit {rule.name} exceeded for {identity}")
+            response = PlainTextResponse("Too Many Requests", status_code=429,
+                                         headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+            return await response(scope, receive, send)
+        await self.app(scope, receive, send)
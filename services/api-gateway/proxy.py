@@ -0,0 +1,93 @@
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict
+
+import httpx
+from fastapi import HTTPException, Request
+from starlette.background import BackgroundTask
+from starlette.responses import StreamingResponse
+from gabizap_common.logger import setup_logger
+
+logger = setup_logger("api-gateway")
+
+# Reverse proxy to the backend services.
+#
+# One long-lived httpx.AsyncClient per upstream keeps a pool of keep-alive
+# connections, so a proxied request normally reuses an open socket instead
+# of paying DNS + TCP (+ TLS) setup. Bodies are streamed both ways: the
+# client's upload is passed to the upstream chunk by chunk as it arrives,
+# and the upstream response is relayed with its status code and headers
+# unchanged, whatever its content type (JSON, images, errors).
+
+# Connection-scoped headers (RFC 9110 7.6.1) are never forwarded; Host is
+# set by httpx for the upstream URL
+HOP_BY_HOP = frozenset({
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "proxy-connection",
+    "te", "trailer", "transfer-encoding", "upgrade", "host",
+})
+
+
+def _forward_headers(raw):
+    """Drops hop-by-hop headers, including any named in Connection, from (bytes, bytes) pairs."""
+    named = {token.strip().lower() for k, v in raw if k.lower() == b"connection" for token in v.split(b",")}
+    return [(k, v) for k, v in raw if k.lower().decode("latin-1") not in HOP_BY_HOP and k.lower() not in named]
+
+
+class UpstreamPool:
+    """Per-upstream pooled clients, created on first use and closed with close()."""
+
+    def __init__(self, max_connections: int = 100, max_keepalive: int = 20, keepalive_expiry: float = 30.0,
+                 connect_timeout: float = 5.0, read_timeout: float = 60.0, pool_timeout: float = 5.0,
+                 http2: bool = False):
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=pool_timeout)
+        self.http2 = http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("HTTP/2 requested but the h2 package is missing, using HTTP/1.1")
+                self.http2 = False
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+
+    def client(self, base_url: str) -> httpx.AsyncClient:
+        client = self._clients.get(base_url)
+        if client is None:
+            # The client is shared by every caller: never follow redirects or
+            # keep cookies from one user's response for the next request
+            no_cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+            client = self._clients[base_url] = httpx.AsyncClient(
+                base_url=base_url, limits=self.limits, timeout=self.timeout, http2=self.http2,
+                cookies=httpx.Cookies(no_cookies), follow_redirects=False, trust_env=False)
+        return client
+
+    async def close(self):
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+    async def forward(self, base_url: str, request: Request, path: str) -> StreamingResponse:
+        client = self.client(base_url)
+        peer = request.client.host if request.client else ""
+        forwarded_for = request.headers.get("x-forwarded-for")
+        headers = [(k, v) for k, v in _forward_headers(request.headers.raw) if k.lower() != b"x-forwarded-for"]
+        headers.append((b"x-forwarded-for", f"{forwarded_for}, {peer}".encode() if forwarded_for else peer.encode()))
+        headers.append((b"x-forwarded-proto", request.url.scheme.encode()))
+        has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+        upstream = client.build_request(request.method, f"/{path}", headers=headers, params=request.query_params,
+                                        content=request.stream() if has_body else None)
+        try:
+            resp = await client.send(upstream, stream=True)
+        except httpx.TimeoutException as exc:
+            logger.error(f"Timeout from {base_url}: {exc!r}")
+            raise HTTPException(status_code=504, detail="Service timeout")
+        except httpx.RequestError as exc:
+            logger.error(f"Error connecting to {base_url}: {exc!r}")
+            raise HTTPException(status_code=503, detail="Service unavailable")
+
+        # Raw bytes: Content-Encoding and Content-Length stay valid as sent
+        response = StreamingResponse(resp.aiter_raw(), status_code=resp.status_code,
+                                     background=BackgroundTask(resp.aclose))
+        # Set as a list so repeated headers (Set-Cookie) survive
+        response.raw_headers = _forward_headers(resp.headers.raw)
+        return response
@@ -0,0 +1,167 @@
+import asyncio
+import functools
+import ipaddress
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set, Tuple
+
+import httpx
+from gabizap_common.logger import setup_logger
+
+logger = setup_logger("api-gateway")
+
+# Risk-engine decisions for the zero-trust path, off the request's critical path.
+#
+# Decisions are cached per (subject, device, IP prefix). A request never
+# waits for the risk engine:
+#   fresh  (age < ttl)              cached decision, no call
+#   stale  (age < ttl + stale_ttl)  cached decision, re-scored in the background
+#   miss                            default action, scored in the background
+# so a risky context is enforced from the request after its scoring lands.
+# Background scoring is deduplicated per key and capped at max_inflight; a
+# failed call keeps the previous decision until it ages out.
+
+ACTIONS = ("allow", "step_up", "block")
+MAX_ENTRIES = 100000
+VELOCITY_WINDOW_S = 60.0
+
+
+@functools.lru_cache(maxsize=65536)
+def ip_prefix(ip: str) -> str:
+    """/24 for IPv4, /64 for IPv6: one decision covers a client's nearby addresses."""
+    try:
+        addr = ipaddress.ip_address(ip)
+    except ValueError:
+        return ip
+    bits = 24 if addr.version == 4 else 64
+    return str(ipaddress.ip_network(f"{addr}/{bits}", strict=False))
+
+
+class _Entry:
+    __slots__ = ("action", "score", "scored_at", "window_start", "count")
+
+    def __init__(self, action: str, score: Optional[int], scored_at: float, now: float):
+        self.action = action
+        self.score = score
+        self.scored_at = scored_at
+        # Requests seen for this key in the current velocity window
+        self.window_start = now
+        self.count = 0
+
+
+class RiskCache:
+    def __init__(self, risk_url: str, ttl: float = 60.0, stale_ttl: float = 300.0, default_action: str = "allow",
+                 timeout: float = 1.0, max_inflight: int = 32, max_entries: int = MAX_ENTRIES):
+        if default_action not in ACTIONS:
+            raise ValueError(f"Unknown risk action: {default_action}")
+        self.risk_url = risk_url
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.default_action = default_action
+        self.max_inflight = max_inflight
+        self.max_entries = max_entries
+        self.client = httpx.AsyncClient(base_url=risk_url, timeout=timeout, trust_env=False,
+                                        limits=httpx.Limits(max_connections=max_inflight))
+        self._entries: Dict[Tuple[str, str, str], _Entry] = {}
+        self._inflight: Set[Tuple[str, str, str]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.rescored = 0
+        self.errors = 0
+        self.dropped = 0
+        self.check_seconds = 0.0
+
+    def stats(self) -> dict:
+        checks = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self._entries), "hits": self.hits, "stale_hits": self.stale_hits,
+            "misses": self.misses, "hit_rate": round((self.hits + self.stale_hits) / checks, 4) if checks else None,
+            "rescored": self.rescored, "errors": self.errors, "dropped": self.dropped,
+            "inflight": len(self._inflight),
+            "mean_check_us": round(self.check_seconds / checks * 1e6, 2) if checks else None,
+        }
+
+    def check(self, subject: str, device: str, ip: str) -> str:
+        """Action for this request context; never waits on the risk engine."""
+        started = time.perf_counter()
+        now = time.monotonic()
+        key = (subject, device, ip_prefix(ip))
+        entry = self._entries.get(key)
+        if entry is not None and now - entry.scored_at >= self.ttl + self.stale_ttl:
+            entry.action, entry.score = self.default_action, None
+            entry.scored_at = -float("inf")
+            self.misses += 1
+            self._rescore(key, entry, now)
+        elif entry is None:
+            if len(self._entries) >= self.max_entries:
+                self._evict(now)
+            entry = self._entries[key] = _Entry(self.default_action, None, -float("inf"), now)
+            self.misses += 1
+            self._rescore(key, entry, now)
+        elif now - entry.scored_at >= self.ttl:
+            self.stale_hits += 1
+            self._rescore(key, entry, now)
+        else:
+            self.hits += 1
+
+        if now - entry.window_start >= VELOCITY_WINDOW_S:
+            entry.window_start, entry.count = now, 0
+        entry.count += 1
+        self.check_seconds += time.perf_counter() - started
+        return entry.action
+
+    def _evict(self, now: float):
+        horizon = self.ttl + self.stale_ttl
+        self._entries = {k: e for k, e in self._entries.items() if now - e.scored_at < horizon or k in self._inflight}
+        if len(self._entries) >= self.max_entries:
+            self._entries = dict(list(self._entries.items())[len(self._entries) // 2:])
+
+    def _rescore(self, key, entry: _Entry, now: float):
+        if key in self._inflight:
+            return
+        if len(self._inflight) >= self.max_inflight:
+            # Risk engine saturated: keep serving the cached/default decision
+            self.dropped += 1
+            return
+        self._inflight.add(key)
+        task = asyncio.get_running_loop().create_task(self._score(key, entry, now))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _score(self, key, entry: _Entry, now: float):
+        subject, device, _ = key
+        elapsed = max(now - entry.window_start, 1.0)
+        context = {
+            "user_id": subject,
+            "hour": datetime.now(timezone.utc).hour,
+            # A device id the client presents is weak evidence, its absence weaker still
+            "device_trust": 0.9 if device else 0.5,
+            # No geolocation at the gateway; distance is scored downstream
+            "geo_dist": 0.0,
+            "velocity": entry.count * 60.0 / elapsed,
+        }
+        try:
+            resp = await self.client.post("/score", json=context)
+            resp.raise_for_status()
+            result = resp.json()
+            action = result.get("action", self.default_action)
+            if action not in ACTIONS:
+                raise ValueError(f"Unknown risk action: {action}")
+            entry.action, entry.score = action, result.get("risk_score")
+            entry.scored_at = time.monotonic()
+            self.rescored += 1
+            if action != "allow":
+                logger.warning(f"Risk engine: {action} for {subject} ({result.get('risk_score')})")
+        except (httpx.HTTPError, ValueError) as e:
+            self.errors += 1
+            logger.error(f"Risk scoring failed for {subject}: {e!r}")
+        finally:
+            self._inflight.discard(key)
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.client.aclose()
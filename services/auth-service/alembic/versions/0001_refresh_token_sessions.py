@@ -0,0 +1,59 @@
+"""Refresh-token sessions: session_id column, tokens stored as SHA-256 digests
+
+Revision ID: 0001_refresh_token_sessions
+Revises:
+Create Date: 2026-10-18
+
+Existing refresh tokens can't be carried over. Their rows hold the
+plaintext token while lookups are now by digest, and they have no session
+to belong to. They are deleted, so every user logs in again once after this
+upgrade; access tokens already issued stay valid until they expire.
+
+On a fresh database there is no refresh_tokens table yet: the service
+creates its tables at startup, and this revision is a no-op.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001_refresh_token_sessions"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _columns(table: str):
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return None
+    return {column["name"] for column in inspector.get_columns(table)}
+
+
+def _indexes(table: str):
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade() -> None:
+    columns = _columns("refresh_tokens")
+    if columns is None or "session_id" in columns:
+        return
+    # Forced re-login: plaintext tokens without a session
+    op.execute("DELETE FROM refresh_tokens")
+    with op.batch_alter_table("refresh_tokens") as batch:
+        batch.add_column(sa.Column("session_id", sa.String(), nullable=False))
+    op.create_index("ix_refresh_tokens_session_id", "refresh_tokens", ["session_id"])
+    if "ix_refresh_tokens_user_id" not in _indexes("refresh_tokens"):
+        op.create_index("ix_refresh_tokens_user_id", "refresh_tokens", ["user_id"])
+
+
+def downgrade() -> None:
+    columns = _columns("refresh_tokens")
+    if columns is None or "session_id" not in columns:
+        return
+    # Digests can't be turned back into tokens: those sessions end as well
+    op.execute("DELETE FROM refresh_tokens")
+    op.drop_index("ix_refresh_tokens_user_id", table_name="refresh_tokens")
+    op.drop_index("ix_refresh_tokens_session_id", table_name="refresh_tokens")
+    with op.batch_alter_table("refresh_tokens") as batch:
+        batch.drop_column("session_id")
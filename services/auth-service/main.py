@@ -1,44 +1,98 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from datetime import timedelta
-from typing import Annotated
+import hashlib
+import os
+import secrets
+import uuid
+import redis.asyncio as redis
+from fastapi import FastAPI, Depends, HTTPException, Response, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from datetime import datetime, timedelta, timezone
+from typing import Annotated, List, Optional, Tuple
 
 from gabizap_common.config import BaseConfig
+from gabizap_common.executor import BoundedExecutor, register_overload_handler
+from gabizap_common.jwks import InvalidToken, KeySet, TokenVerifier
 from gabizap_common.logger import setup_logger
+from gabizap_common.passwords import hash_password, verify_password
+from gabizap_common.revocation import RevocationFeed, RevocationSet, publish_revocation
 from . import models, schemas
-# In a real app, we'd move security logic to common or a utility file
-from passlib.context import CryptContext
-from jose import JWTError, jwt
+from .negative_cache import NegativeCache
+from .sessions import SessionStore
+from .signing_keys import ALGORITHM, SigningKeys, write_key
 
 logger = setup_logger("auth-service")
 
 class Config(BaseConfig):
     DATABASE_URL: str
+    # Async connection pool; a login holds a connection only for its lookup
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_S: float = 5.0
+    DB_POOL_RECYCLE_S: int = 1800
+    # bcrypt worker processes (0 = one per core) and hashes queued or running
+    # before /token answers 503: 64 is a few seconds of backlog per core
+    HASH_WORKERS: int = 0
+    HASH_MAX_PENDING: int = 64
+    # Unknown emails rejected without a DB lookup for this long
+    NEGATIVE_CACHE_TTL_S: float = 30.0
+    NEGATIVE_CACHE_SIZE: int = 100000
+    # Refresh tokens rotate on every use; a session ends this long after its last refresh
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14
+    SESSION_CACHE_SIZE: int = 100000
+    SESSION_LOCAL_TTL_S: float = 30.0
+    # ES256 private keys (signing_keys.py); unset = a throwaway key per process
+    JWT_KEYS_DIR: Optional[str] = None
+    # A new key signs only after verifiers refreshed their JWKS (api-gateway JWKS_TTL_S)
+    JWT_KEY_ACTIVATION_S: float = 600.0
+    JWKS_MAX_AGE_S: int = 300
 
 config = Config(SERVICE_NAME="auth-service")
 
+def async_database_url(url: str) -> str:
+    """Maps a sync SQLAlchemy URL (also used by alembic) to its asyncio driver."""
+    scheme, sep, rest = url.partition("://")
+    driver = {"postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg",
+              "postgresql+psycopg2": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}.get(scheme, scheme)
+    return driver + sep + rest
+
 # Database Setup
-engine = create_engine(config.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-models.Base.metadata.create_all(bind=engine)
+engine_options = {}
+if not config.DATABASE_URL.startswith("sqlite"):
+    engine_options = dict(pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW,
+                          pool_timeout=config.DB_POOL_TIMEOUT_S, pool_recycle=config.DB_POOL_RECYCLE_S,
+                          pool_pre_ping=True)
+engine = create_async_engine(async_database_url(config.DATABASE_URL), **engine_options)
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False)
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # Security Setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt is CPU-bound for ~100-300 ms: it runs in worker processes, never on the event loop
+hasher = BoundedExecutor("bcrypt", kind="process", workers=config.HASH_WORKERS,
+                         max_pending=config.HASH_MAX_PENDING)
+unknown_emails = NegativeCache(config.SECRET_KEY.encode(), ttl=config.NEGATIVE_CACHE_TTL_S,
+                               max_entries=config.NEGATIVE_CACHE_SIZE)
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Tokens are signed with a private key; other services verify with the published public keys
+if config.JWT_KEYS_DIR:
+    if not (os.path.isdir(config.JWT_KEYS_DIR) and any(n.endswith(".pem") for n in os.listdir(config.JWT_KEYS_DIR))):
+        logger.info(f"Created signing key {write_key(config.JWT_KEYS_DIR)} in {config.JWT_KEYS_DIR}")
+    signing_keys = SigningKeys.load(config.JWT_KEYS_DIR, activation_s=config.JWT_KEY_ACTIVATION_S)
+else:
+    logger.warning("No JWT_KEYS_DIR: signing with a key of this process only, tokens won't survive a restart")
+    signing_keys = SigningKeys.generate()
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def token_digest(token: str) -> str:
+    # Refresh tokens are stored hashed: a copy of the table can't be replayed
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+def utc_timestamp(dt: datetime) -> float:
+    # Columns hold naive UTC datetimes (datetime.utcnow)
+    return dt.replace(tzinfo=timezone.utc).timestamp()
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -46,39 +100,221 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, config.SECRET_KEY, algorithm=config.ALGORITHM)
+    # jti lets a single token be revoked before it expires
+    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "jti": uuid.uuid4().hex})
+    encoded_jwt = signing_keys.sign(to_encode)
     return encoded_jwt
 
-app = FastAPI(title="GABIZAP Auth Service")
+def create_refresh_token(db: AsyncSession, user_id: int, session_id: str) -> Tuple[str, datetime]:
+    """Adds a new refresh token of the session to `db`; the caller commits."""
+    token = secrets.token_urlsafe(32)
+    expires_at = datetime.utcnow() + timedelta(days=config.REFRESH_TOKEN_EXPIRE_DAYS)
+    db.add(models.RefreshToken(token=token_digest(token), session_id=session_id, user_id=user_id,
+                               expires_at=expires_at))
+    return token, expires_at
 
-@app.post("/token", response_model=schemas.Token)
-async def login_for_access_token(form_data: schemas.UserLogin, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.email).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+def token_response(email: str, session_id: str, refresh_token: str) -> dict:
     access_token_expires = timedelta(minutes=config.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
+        data={"sub": email, "sid": session_id}, expires_delta=access_token_expires
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token,
+            "expires_in": int(access_token_expires.total_seconds())}
+
+app = FastAPI(title="GABIZAP Auth Service")
+register_overload_handler(app)
+
+# Revocations are pushed to every service that verifies tokens locally,
+# this one included (other replicas revoke sessions too)
+revocation_redis = redis.from_url(config.REDIS_URL) if config.REDIS_URL else None
+revocations = RevocationSet()
+revocation_feed = RevocationFeed(revocation_redis, revocations) if revocation_redis else None
+
+async def load_session(session_id: str) -> Optional[Tuple[int, float]]:
+    # Cold path of SessionStore: Redis lost the session or isn't configured
+    async with SessionLocal() as db:
+        row = (await db.execute(
+            select(models.RefreshToken.user_id, models.RefreshToken.expires_at)
+            .where(models.RefreshToken.session_id == session_id, models.RefreshToken.revoked.is_(False),
+                   models.RefreshToken.expires_at > datetime.utcnow())
+            .order_by(models.RefreshToken.expires_at.desc()).limit(1)
+        )).first()
+    return None if row is None else (row.user_id, utc_timestamp(row.expires_at))
+
+verifier = TokenVerifier(KeySet.from_jwks(signing_keys.jwks()), [ALGORITHM], revocations=revocations)
+sessions = SessionStore(revocation_redis, load_session, revocations,
+                        access_ttl_s=config.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+                        local_ttl_s=config.SESSION_LOCAL_TTL_S, max_entries=config.SESSION_CACHE_SIZE)
+
+@app.on_event("startup")
+async def startup():
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    hasher.start()
+    if revocation_feed is not None:
+        await revocation_feed.start(wait=2.0)
+
+@app.on_event("shutdown")
+async def shutdown():
+    if revocation_feed is not None:
+        await revocation_feed.stop()
+    hasher.shutdown()
+    await engine.dispose()
+
+async def revoke_sessions(db: AsyncSession, *conditions) -> List[str]:
+    """Revokes every refresh token matching `conditions` and ends their sessions."""
+    session_ids = (await db.scalars(
+        select(models.RefreshToken.session_id).distinct()
+        .where(models.RefreshToken.revoked.is_(False), *conditions)
+    )).all()
+    if session_ids:
+        await db.execute(update(models.RefreshToken)
+                         .where(models.RefreshToken.session_id.in_(session_ids))
+                         .values(revoked=True))
+        await db.commit()
+        await sessions.revoke(session_ids)
+    return list(session_ids)
+
+INVALID_CREDENTIALS = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Incorrect username or password",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+INVALID_REFRESH_TOKEN = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Invalid refresh token",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def decode_access_token(credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer())) -> dict:
+    # Signature, expiry and pushed jti/sid revocations
+    try:
+        return verifier.verify(credentials.credentials)
+    except InvalidToken as e:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e),
+                            headers={"WWW-Authenticate": "Bearer"})
+
+@app.get("/.well-known/jwks.json")
+def jwks(response: Response):
+    response.headers["Cache-Control"] = f"public, max-age={config.JWKS_MAX_AGE_S}"
+    return signing_keys.jwks()
+
+@app.post("/token", response_model=schemas.Token)
+async def login_for_access_token(form_data: schemas.UserLogin):
+    if form_data.email in unknown_emails:
+        raise INVALID_CREDENTIALS
+    # Connection released before hashing: the pool isn't held for bcrypt's duration
+    async with SessionLocal() as db:
+        user = (await db.execute(
+            select(models.User.id, models.User.hashed_password).where(models.User.email == form_data.email)
+        )).first()
+    if user is None:
+        unknown_emails.add(form_data.email)
+        raise INVALID_CREDENTIALS
+    if not await hasher.run(verify_password, form_data.password, user.hashed_password):
+        raise INVALID_CREDENTIALS
+    session_id = uuid.uuid4().hex
+    async with SessionLocal() as db:
+        refresh_token, expires_at = create_refresh_token(db, user.id, session_id)
+        await db.commit()
+    await sessions.put(session_id, user.id, utc_timestamp(expires_at))
+    return token_response(form_data.email, session_id, refresh_token)
+
+@app.post("/token/refresh", response_model=schemas.Token)
+async def refresh_access_token(body: schemas.RefreshRequest):
+    async with SessionLocal() as db:
+        token = (await db.execute(
+            select(models.RefreshToken.id, models.RefreshToken.session_id, models.RefreshToken.user_id,
+                   models.RefreshToken.revoked, models.User.email)
+            .join(models.User, models.User.id == models.RefreshToken.user_id)
+            .where(models.RefreshToken.token == token_digest(body.refresh_token))
+        )).first()
+        if token is None:
+            raise INVALID_REFRESH_TOKEN
+        # Rotation: the presented token is spent by a conditional update, so
+        # of two refreshes racing with the same token only one gets through
+        spent = await db.execute(
+            update(models.RefreshToken)
+            .where(models.RefreshToken.id == token.id, models.RefreshToken.revoked.is_(False),
+                   models.RefreshToken.expires_at > datetime.utcnow())
+            .values(revoked=True)
+        )
+        if spent.rowcount != 1:
+            if token.revoked:
+                # A rotated-out token came back: it was copied, so whoever
+                # holds the current one may not be the user. End the session.
+                await revoke_sessions(db, models.RefreshToken.session_id == token.session_id)
+                logger.warning(f"Refresh token reuse in session {token.session_id}, session revoked")
+            raise INVALID_REFRESH_TOKEN
+        refresh_token, expires_at = create_refresh_token(db, token.user_id, token.session_id)
+        await db.commit()
+    await sessions.put(token.session_id, token.user_id, utc_timestamp(expires_at))
+    return token_response(token.email, token.session_id, refresh_token)
+
+@app.post("/token/revoke", status_code=status.HTTP_204_NO_CONTENT)
+async def revoke_refresh_token(body: schemas.RefreshRequest, db: AsyncSession = Depends(get_db)):
+    # Ends the token's session; unknown tokens are not an error (RFC 7009)
+    session_id = await db.scalar(select(models.RefreshToken.session_id)
+                                 .where(models.RefreshToken.token == token_digest(body.refresh_token)))
+    if session_id is not None:
+        await revoke_sessions(db, models.RefreshToken.session_id == session_id)
+
+@app.api_route("/validate", methods=["GET", "POST"], response_model=schemas.TokenValidation)
+async def validate_token(claims: dict = Depends(decode_access_token)):
+    # Hot path: signature, expiry and revocations checked locally, sessions
+    # from SessionStore; no database query
+    session_id = claims.get("sid")
+    if session_id is not None and await sessions.active(session_id) is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Session has ended",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return {"valid": True, "sub": claims["sub"], "exp": claims["exp"], "sid": session_id}
+
+@app.delete("/users/{user_id}/sessions")
+async def revoke_user_sessions(user_id: int, claims: dict = Depends(decode_access_token),
+                               db: AsyncSession = Depends(get_db)):
+    # Everywhere-logout for the user themself, or for an admin (e.g. on a SOC alert)
+    caller = (await db.execute(
+        select(models.User.id, models.User.role, models.User.is_superuser).where(models.User.email == claims["sub"])
+    )).first()
+    if caller is None or (caller.id != user_id and not caller.is_superuser and caller.role != "admin"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed")
+    session_ids = await revoke_sessions(db, models.RefreshToken.user_id == user_id)
+    logger.info(f"Revoked {len(session_ids)} sessions of user {user_id}")
+    return {"revoked_sessions": len(session_ids)}
 
 @app.post("/users/", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if db_user:
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    if await db.scalar(select(models.User.id).where(models.User.email == user.email)) is not None:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hasher.run(hash_password, user.password)
     db_user = models.User(email=user.email, hashed_password=hashed_password, full_name=user.full_name)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Registered concurrently
+        raise HTTPException(status_code=400, detail="Email already registered")
+    await db.refresh(db_user)
+    unknown_emails.discard(user.email)
     return db_user
 
+@app.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(claims: dict = Depends(decode_access_token), db: AsyncSession = Depends(get_db)):
+    if "sid" in claims:
+        await revoke_sessions(db, models.RefreshToken.session_id == claims["sid"])
+    if "jti" not in claims:
+        # Issued before token ids existed; it lapses at its expiry
+        return
+    if revocation_redis is None:
+        logger.error("No REDIS_URL configured, cannot revoke token")
+        raise HTTPException(status_code=503, detail="Revocation unavailable")
+    revocations.add(claims["jti"], claims["exp"])
+    await publish_revocation(revocation_redis, claims["jti"], claims["exp"])
+    logger.info(f"Revoked token {claims['jti']} of {claims.get('sub')}")
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "auth-service"}
+    return {"status": "healthy", "service": "auth-service", "hasher": hasher.stats(),
+            "negative_cache": {"entries": len(unknown_emails), "hits": unknown_emails.hits},
+            "sessions": sessions.stats()}
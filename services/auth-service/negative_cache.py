@@ -0,0 +1,51 @@
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+
+
+class NegativeCache:
+    """
+    Emails recently looked up and not found, so a credential-stuffing burst
+    of unknown accounts is rejected without a database round trip.
+
+    Safe to expose to attacker-chosen input: entries are 16-byte keyed
+    digests (no email addresses held in memory), the table is capped at
+    max_entries with the oldest evicted first, and entries expire after
+    ttl seconds. Registration discards the email, so a new account can log
+    in at once on this replica (other replicas within ttl).
+    """
+
+    def __init__(self, key: bytes, ttl: float = 30.0, max_entries: int = 100000):
+        self._key = key
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[bytes, float]" = OrderedDict()
+        self.hits = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _digest(self, email: str) -> bytes:
+        return hmac.new(self._key, email.encode("utf-8"), hashlib.sha256).digest()[:16]
+
+    def __contains__(self, email: str) -> bool:
+        digest = self._digest(email)
+        expires = self._entries.get(digest)
+        if expires is None:
+            return False
+        if expires <= time.monotonic():
+            del self._entries[digest]
+            return False
+        self.hits += 1
+        return True
+
+    def add(self, email: str):
+        digest = self._digest(email)
+        self._entries[digest] = time.monotonic() + self.ttl
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, email: str):
+        self._entries.pop(self._digest(email), None)
@@ -4,6 +4,17 @@ from typing import Optional
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class TokenValidation(BaseModel):
+    valid: bool
+    sub: str
+    exp: int
+    sid: Optional[str] = None
 
 class TokenData(BaseModel):
     email: Optional[str] = None
@@ -0,0 +1,124 @@
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+import redis.asyncio as redis
+from gabizap_common.logger import setup_logger
+from gabizap_common.revocation import RevocationSet, publish_revocation
+
+logger = setup_logger("auth-service")
+
+# Active sessions, so /validate doesn't query the database.
+#
+# A session starts at login and continues through refresh-token rotation.
+# Its id (sid) is in every access token issued for it, and the
+# refresh_tokens table is the source of truth. SessionStore writes
+# through to Redis (auth:session:<sid>, expiring with the session) and
+# to process memory. A lookup is a dict hit. After local_ttl, a restart,
+# or on another replica, it is one Redis GET. The database is queried
+# only when Redis has lost the key or isn't configured; that result,
+# found or not, is cached too.
+#
+# Revoking a session deletes its key and publishes the sid on the
+# revocation channel. Every replica's RevocationSet, and the gateway's,
+# then rejects the session's access tokens without waiting for their
+# expiry.
+
+SESSION_KEY = "auth:session:{}"
+
+# sid -> (user_id, session expiry) or None
+Loader = Callable[[str], Awaitable[Optional[Tuple[int, float]]]]
+
+
+class SessionStore:
+    def __init__(self, client, loader: Loader, revocations: RevocationSet, access_ttl_s: float,
+                 local_ttl_s: float = 30.0, max_entries: int = 100000):
+        self.redis = client
+        self.loader = loader
+        self.revocations = revocations
+        # Revoked sids are remembered as long as an access token of the session can live
+        self.access_ttl_s = access_ttl_s
+        # Re-check interval for sessions found in memory; bounds how stale a
+        # replica can be when revocations can't be pushed (no Redis)
+        self.local_ttl_s = local_ttl_s
+        self.max_entries = max_entries
+        self._local: Dict[str, Tuple[Optional[int], float]] = {}
+        self.hits = 0
+        self.redis_hits = 0
+        self.loads = 0
+
+    def __len__(self) -> int:
+        return len(self._local)
+
+    def stats(self) -> dict:
+        return {"cached": len(self._local), "hits": self.hits, "redis_hits": self.redis_hits,
+                "loads": self.loads}
+
+    def _remember(self, sid: str, user_id: Optional[int], expires: float, now: float):
+        if len(self._local) >= self.max_entries:
+            self._local = {s: v for s, v in self._local.items() if v[1] > now}
+            # Still full of live sessions: drop the oldest half (dicts keep insertion order)
+            if len(self._local) >= self.max_entries:
+                self._local = dict(list(self._local.items())[len(self._local) // 2:])
+        self._local[sid] = (user_id, min(expires, now + self.local_ttl_s))
+
+    async def put(self, sid: str, user_id: int, expires_at: float):
+        """Records an active session, after its refresh token is committed."""
+        if self.redis is not None:
+            try:
+                await self.redis.set(SESSION_KEY.format(sid), f"{user_id}:{expires_at}", exat=int(expires_at))
+            except (redis.RedisError, OSError) as e:
+                logger.error(f"Session cache write failed for {sid}: {e!r}")
+        self._remember(sid, user_id, expires_at, time.time())
+
+    async def _fetch(self, sid: str) -> Optional[Tuple[int, float]]:
+        if self.redis is not None:
+            try:
+                value = await self.redis.get(SESSION_KEY.format(sid))
+            except (redis.RedisError, OSError) as e:
+                logger.error(f"Session cache read failed, loading {sid} from the database: {e!r}")
+                value = None
+            if value is not None:
+                self.redis_hits += 1
+                user_id, _, expires_at = (value.decode() if isinstance(value, bytes) else value).partition(":")
+                return int(user_id), float(expires_at)
+        self.loads += 1
+        session = await self.loader(sid)
+        if session is not None and self.redis is not None:
+            try:
+                await self.redis.set(SESSION_KEY.format(sid), f"{session[0]}:{session[1]}", exat=int(session[1]))
+            except (redis.RedisError, OSError):
+                pass
+        return session
+
+    async def active(self, sid: str) -> Optional[int]:
+        """User id of session `sid` if it is active, else None."""
+        if sid in self.revocations:
+            return None
+        now = time.time()
+        entry = self._local.get(sid)
+        if entry is not None and entry[1] > now:
+            self.hits += 1
+            return entry[0]
+        session = await self._fetch(sid)
+        if session is None or session[1] <= now:
+            self._remember(sid, None, now + self.local_ttl_s, now)
+            return None
+        self._remember(sid, session[0], session[1], now)
+        return session[0]
+
+    async def revoke(self, sids: Iterable[str]):
+        """Ends sessions whose refresh tokens are already revoked in the database."""
+        sids = list(sids)
+        exp = time.time() + self.access_ttl_s
+        for sid in sids:
+            self._local.pop(sid, None)
+            self.revocations.add(sid, exp)
+        if self.redis is None or not sids:
+            return
+        try:
+            await self.redis.delete(*(SESSION_KEY.format(sid) for sid in sids))
+            for sid in sids:
+                await publish_revocation(self.redis, sid, exp)
+        except (redis.RedisError, OSError) as e:
+            # Other replicas still catch up within local_ttl, from the database
+            logger.error(f"Session revocation not published: {e!r}")
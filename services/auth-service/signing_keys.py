@@ -0,0 +1,113 @@
+import base64
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from jose import jwk, jwt
+from jose.backends.base import Key
+
+# Access-token signing keys and the JWKS that publishes them.
+#
+# Keys are ES256 (P-256) private keys, one PEM file each in
+# JWT_KEYS_DIR. The kid is the key's RFC 7638 thumbprint, so every replica
+# derives the same id from the same file. All keys in the directory are
+# published. The newest (by mtime) signs once it is older than
+# activation_s, so verifiers can fetch it before any token needs it.
+#
+# Rotation without failed verifications:
+#   1. python signing_keys.py <JWT_KEYS_DIR>  (writes a new key)
+#   2. restart the auth-service replicas within activation_s
+#   3. once access tokens signed by the old key have expired, delete it
+#      and restart again
+#
+# EdDSA would be the smaller and faster choice, but python-jose (used for
+# every JWT here) only implements ES/RS/HS algorithms.
+
+ALGORITHM = "ES256"
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def public_jwk(key: Key) -> dict:
+    public = key.public_key().to_dict()
+    # RFC 7638: required members only, sorted, no whitespace
+    canonical = json.dumps({k: public[k] for k in ("crv", "kty", "x", "y")}, separators=(",", ":"), sort_keys=True)
+    return {**public, "kid": _b64(hashlib.sha256(canonical.encode()).digest()), "use": "sig", "alg": ALGORITHM}
+
+
+def generate_pem() -> bytes:
+    return ec.generate_private_key(ec.SECP256R1()).private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+
+
+def write_key(directory: str) -> str:
+    """Writes a new private key into `directory` (atomically, mode 0600); returns its kid."""
+    os.makedirs(directory, exist_ok=True)
+    pem = generate_pem()
+    kid = public_jwk(jwk.construct(pem, ALGORITHM))["kid"]
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".key-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+        os.replace(tmp, os.path.join(directory, f"{kid}.pem"))
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return kid
+
+
+class SigningKeys:
+    def __init__(self, keys: List[Tuple[float, Key, dict]], activation_s: float = 0.0):
+        if not keys:
+            raise ValueError("No signing keys")
+        # (created, private key, public JWK), oldest first
+        self.keys = sorted(keys, key=lambda k: k[0])
+        self.activation_s = activation_s
+        self._jwks = {"keys": [public for _, _, public in self.keys]}
+
+    @classmethod
+    def generate(cls) -> "SigningKeys":
+        key = jwk.construct(generate_pem(), ALGORITHM)
+        return cls([(time.time(), key, public_jwk(key))])
+
+    @classmethod
+    def load(cls, directory: str, activation_s: float = 0.0) -> "SigningKeys":
+        keys = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".pem"):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, "rb") as f:
+                key = jwk.construct(f.read(), ALGORITHM)
+            keys.append((os.stat(path).st_mtime, key, public_jwk(key)))
+        return cls(keys, activation_s)
+
+    def jwks(self) -> dict:
+        return self._jwks
+
+    def current(self, now: Optional[float] = None) -> Tuple[Key, str]:
+        """The newest key past its activation delay (the oldest if none is yet)."""
+        now = time.time() if now is None else now
+        _, key, public = self.keys[0]
+        for created, candidate, candidate_public in self.keys[1:]:
+            if created + self.activation_s <= now:
+                key, public = candidate, candidate_public
+        return key, public["kid"]
+
+    def sign(self, claims: dict) -> str:
+        key, kid = self.current()
+        return jwt.encode(claims, key, algorithm=ALGORITHM, headers={"kid": kid})
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: python signing_keys.py <keys directory>")
+    print(write_key(sys.argv[1]))
@@ -0,0 +1,131 @@
+import asyncio
+import math
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+# Bounded offload for CPU-bound request stages (OpenCV, skimage, mediapipe).
+#
+# Handlers await BoundedExecutor.run(fn, ...) instead of calling fn inline,
+# so the event loop keeps serving health checks and cheap requests while
+# the pool works. Admission is capped: once max_pending tasks are queued or
+# running, run() raises Overloaded immediately instead of growing an
+# unbounded backlog, and the service answers 503 with a Retry-After derived
+# from the current backlog and the observed task time.
+#
+#   executor = BoundedExecutor("liveness", kind="process", workers=4)
+#   register_overload_handler(app)
+#   result = await executor.run(check_liveness, image)
+
+
+def _noop():
+    return None
+
+
+def _timed_call(fn: Callable, args: tuple, kwargs: dict):
+    # Runs in the worker: time the task itself, not its wait in the pool queue
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+class Overloaded(Exception):
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name} executor saturated, retry in {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    def __init__(self, name: str, kind: str = "thread", workers: int = 0,
+                 max_pending: Optional[int] = None, initializer: Optional[Callable] = None,
+                 initargs: tuple = ()):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.name = name
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 1
+        # Default: every worker busy plus one queued task each
+        self.max_pending = max_pending or self.workers * 2
+        self.initializer = initializer
+        self.initargs = initargs
+        self.pending = 0
+        self.rejected = 0
+        self.completed = 0
+        # EWMA of task service time, seeds the Retry-After estimate
+        self.avg_task_seconds = 0.0
+        self._pool: Optional[Executor] = None
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=self.initializer,
+                                                 initargs=self.initargs)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name,
+                                                initializer=self.initializer, initargs=self.initargs)
+        return self._pool
+
+    def start(self):
+        """Creates the pool eagerly, so workers spawn and load models before traffic."""
+        pool = self.pool
+        for _ in range(self.workers):
+            pool.submit(_noop)
+        return pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def retry_after(self) -> int:
+        backlog = self.pending / self.workers
+        return max(1, math.ceil(backlog * self.avg_task_seconds))
+
+    def admit(self, n: int = 1):
+        """Reserves n slots or raises Overloaded; pair with release(n)."""
+        if self.pending + n > self.max_pending:
+            self.rejected += 1
+            raise Overloaded(self.name, self.retry_after())
+        self.pending += n
+
+    def release(self, n: int = 1):
+        self.pending -= n
+
+    def record(self, seconds: float):
+        """Feeds one task's service time into the Retry-After estimate."""
+        self.avg_task_seconds = seconds if not self.completed else 0.8 * self.avg_task_seconds + 0.2 * seconds
+        self.completed += 1
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        # Only touched from the event loop thread, so no lock is needed
+        self.admit()
+        try:
+            loop = asyncio.get_running_loop()
+            result, seconds = await loop.run_in_executor(self.pool, _timed_call, fn, args, kwargs)
+        finally:
+            self.release()
+        self.record(seconds)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+            "avg_task_ms": round(self.avg_task_seconds * 1000, 2),
+        }
+
+
+def register_overload_handler(app):
+    """Maps Overloaded to 503 + Retry-After on a FastAPI/Starlette app."""
+    from starlette.responses import JSONResponse
+
+    @app.exception_handler(Overloaded)
+    async def overloaded(request, exc: Overloaded):
+        return JSONResponse(status_code=503, headers={"Retry-After": str(exc.retry_after)},
+                            content={"detail": "Service busy, retry later"})
@@ -0,0 +1,82 @@
+from typing import Sequence
+
+import numpy as np
+
+# Hand geometry descriptor: mediapipe's 21 landmarks -> a compact, invariant
+# float32 vector that can be compared by Euclidean distance.
+#
+# Raw landmarks are normalized image coordinates, so they change with where
+# the hand is, how large it appears and how it is turned. The descriptor:
+#   - converts x/y/z to pixel units (x and y are normalized by different
+#     image sides, z by the width) so the aspect ratio doesn't skew shapes
+#   - centres the hand on the wrist
+#   - divides by the palm size: mean wrist -> finger-base (MCP) distance
+#   - rotates into a hand frame: y along wrist -> middle MCP, x across the
+#     knuckles (pinky -> index MCP), z the palm normal. This removes in-plane
+#     rotation and most of the out-of-plane tilt
+# and then concatenates
+#   - the x/y hand-frame coordinates of the 20 non-wrist landmarks (40 dims;
+#     mediapipe's relative depth is too noisy to keep as a coordinate)
+#   - 23 inter-joint distance ratios: the 20 bone lengths of the landmark
+#     skeleton plus the 3 knuckle gaps, over the palm size. These do not
+#     change with finger pose, which makes them the identity-bearing part.
+# Each block is scaled so its squared distance is a per-dimension mean; the
+# ratio block is weighted up since posture moves the coordinates.
+
+N_LANDMARKS = 21
+WRIST = 0
+MCPS = (5, 9, 13, 17)               # index, middle, ring, pinky finger bases
+BONES = (
+    (0, 1), (1, 2), (2, 3), (3, 4),         # thumb
+    (0, 5), (5, 6), (6, 7), (7, 8),         # index
+    (0, 9), (9, 10), (10, 11), (11, 12),    # middle
+    (0, 13), (13, 14), (14, 15), (15, 16),  # ring
+    (0, 17), (17, 18), (18, 19), (19, 20),  # pinky
+    (5, 9), (9, 13), (13, 17),              # knuckle gaps
+)
+N_COORDS = 2 * (N_LANDMARKS - 1)
+DESCRIPTOR_DIM = N_COORDS + len(BONES)   # 63
+COORD_WEIGHT = 1.0
+RATIO_WEIGHT = 2.0
+MIN_PALM_PX = 4.0                   # smaller than this is not a usable detection
+
+_BONE_A = np.array([a for a, _ in BONES])
+_BONE_B = np.array([b for _, b in BONES])
+_WEIGHTS = np.concatenate([
+    np.full(N_COORDS, COORD_WEIGHT / np.sqrt(N_COORDS)),
+    np.full(len(BONES), RATIO_WEIGHT / np.sqrt(len(BONES))),
+]).astype(np.float32)
+
+
+def _unit(v: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(v)
+    if norm < 1e-9:
+        raise ValueError("Degenerate hand landmarks")
+    return v / norm
+
+
+def hand_descriptor(landmarks: Sequence[float], width: int, height: int) -> np.ndarray:
+    """
+    Flattened (x, y, z) landmarks as returned by extract_landmarks, plus the
+    image size they were detected in -> float32 descriptor of DESCRIPTOR_DIM.
+    Raises ValueError when the landmarks can't give a stable hand frame.
+    """
+    points = np.asarray(landmarks, dtype=np.float64)
+    if points.shape != (N_LANDMARKS * 3,) or not np.all(np.isfinite(points)):
+        raise ValueError(f"Expected {N_LANDMARKS} (x, y, z) hand landmarks")
+    points = points.reshape(N_LANDMARKS, 3) * (width, height, width)
+    points -= points[WRIST]
+
+    palm = np.linalg.norm(points[list(MCPS)], axis=1).mean()
+    if palm < MIN_PALM_PX:
+        raise ValueError("Degenerate hand landmarks")
+
+    y_axis = _unit(points[9])
+    across = points[5] - points[17]
+    x_axis = _unit(across - (across @ y_axis) * y_axis)
+    frame = np.stack([x_axis, y_axis, np.cross(x_axis, y_axis)])
+    aligned = points @ frame.T / palm
+
+    lengths = np.linalg.norm(points[_BONE_A] - points[_BONE_B], axis=1) / palm
+    descriptor = np.concatenate([aligned[1:, :2].ravel(), lengths]).astype(np.float32)
+    return descriptor * _WEIGHTS
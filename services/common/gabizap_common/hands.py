@@ -0,0 +1,36 @@
+from typing import List, Optional
+
+import mediapipe as mp
+import numpy as np
+
+mp_hands = mp.solutions.hands
+
+
+def create_hands(static_image_mode: bool = True):
+    """
+    mediapipe graphs are not thread-safe: each caller needs its own instance.
+    static_image_mode=False keeps tracking state between process() calls, so
+    consecutive frames of one capture skip palm detection while the hand
+    stays in view.
+    """
+    return mp_hands.Hands(
+        static_image_mode=static_image_mode,
+        max_num_hands=1,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+
+
+def extract_landmarks(hands, rgb: np.ndarray) -> Optional[List[float]]:
+    """Flattened (x, y, z) hand landmarks of an RGB frame, or None when no hand is found."""
+    results = hands.process(rgb)
+
+    if not results.multi_hand_landmarks:
+        return None
+
+    # Extract landmarks and flatten to vector
+    landmarks = []
+    for hand_landmarks in results.multi_hand_landmarks:
+        for lm in hand_landmarks.landmark:
+            landmarks.extend([lm.x, lm.y, lm.z])
+    return landmarks
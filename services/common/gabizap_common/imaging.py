@@ -0,0 +1,45 @@
+import cv2
+import numpy as np
+
+# Decode-once image buffer shared by the biometric stages.
+#
+# Uploads used to be decoded separately by every engine (PIL in liveness and
+# hand, cv2.imdecode in iris), each converting colour spaces again. A
+# DecodedImage decodes the bytes once and derives the gray and RGB views on
+# first use; every stage reading the same view shares one array.
+#
+#   image = DecodedImage.from_bytes(contents)
+#   check_liveness(image.gray)
+#   extract_landmarks(hands, image.rgb)
+
+
+class DecodedImage:
+    __slots__ = ("bgr", "_gray", "_rgb")
+
+    def __init__(self, bgr: np.ndarray):
+        self.bgr = bgr
+        self._gray = None
+        self._rgb = None
+
+    @classmethod
+    def from_bytes(cls, contents: bytes) -> "DecodedImage":
+        bgr = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+        if bgr is None:
+            raise ValueError("Invalid image")
+        return cls(bgr)
+
+    @property
+    def shape(self):
+        return self.bgr.shape[:2]
+
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            self._gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    @property
+    def rgb(self) -> np.ndarray:
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB)
+        return self._rgb
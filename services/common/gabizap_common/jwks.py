@@ -0,0 +1,225 @@
+import asyncio
+import time
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import httpx
+from jose import JWTError, jwk, jwt
+from jose.backends.base import Key
+from gabizap_common.logger import setup_logger
+from gabizap_common.revocation import RevocationSet
+
+logger = setup_logger("jwks")
+
+# Access-token verification for every service, against auth-service's
+# public keys.
+#
+# auth-service signs with an asymmetric key (ES256) and publishes the
+# public halves at /.well-known/jwks.json, each with a key id (kid) that
+# tokens carry in their header. Verifiers hold only public keys, so a
+# compromised service can check tokens but not mint them. A RemoteKeySet
+# fetches the JWKS, keeps every key parsed once into a jose Key object,
+# and refreshes in the background after ttl. A token with a kid it
+# doesn't know triggers an immediate refetch: that is how a rotated-in key
+# is picked up. Refetches are rate-limited, so forged kids can't turn
+# into a request flood on auth-service.
+#
+#   keys = RemoteKeySet("http://auth-service:8001/.well-known/jwks.json")
+#   verifier = TokenVerifier(keys, ["ES256"], revocations=revocations)
+#   claims = await verifier.verify_async(token)
+#
+# Verified claims are cached per token string until expiry, so a repeat
+# token costs a dict lookup plus the expiry and revocation (jti, sid)
+# checks.
+
+MAX_CACHED_TOKENS = 100000
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class UnknownSigningKey(InvalidToken):
+    def __init__(self, kid: Optional[str]):
+        super().__init__(f"Invalid token: unknown signing key {kid!r}")
+        self.kid = kid
+
+
+def parse_jwks(jwks: dict) -> Dict[Optional[str], Tuple[Key, str]]:
+    """kid -> (parsed public key, algorithm) for the signing keys in a JWKS document."""
+    keys = {}
+    for entry in jwks.get("keys", []):
+        if entry.get("use", "sig") != "sig" or "alg" not in entry:
+            continue
+        try:
+            keys[entry.get("kid")] = (jwk.construct(entry, entry["alg"]), entry["alg"])
+        except (JWTError, ValueError, TypeError) as e:
+            logger.warning(f"Skipping unusable JWKS key {entry.get('kid')!r}: {e!r}")
+    return keys
+
+
+class KeySet:
+    """A fixed set of verification keys."""
+
+    def __init__(self, keys: Optional[Dict[Optional[str], Tuple[Key, str]]] = None):
+        self._keys = dict(keys or {})
+
+    @classmethod
+    def from_jwks(cls, jwks: dict) -> "KeySet":
+        return cls(parse_jwks(jwks))
+
+    @classmethod
+    def from_secret(cls, secret: str, algorithm: str = "HS256") -> "KeySet":
+        # Shared-secret tokens carry no kid
+        return cls({None: (jwk.construct(secret, algorithm), algorithm)})
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, kid: Optional[str]) -> Optional[Tuple[Key, str]]:
+        return self._keys.get(kid)
+
+    async def refresh_for(self, kid: Optional[str]) -> bool:
+        """Tries to learn key `kid`; a fixed set can't."""
+        return kid in self._keys
+
+
+class RemoteKeySet(KeySet):
+    def __init__(self, url: str, ttl_s: float = 300.0, min_refresh_s: float = 10.0, timeout: float = 2.0,
+                 client: Optional[httpx.AsyncClient] = None):
+        super().__init__()
+        self.url = url
+        self.ttl_s = ttl_s
+        self.min_refresh_s = min_refresh_s
+        self.client = client or httpx.AsyncClient(timeout=timeout)
+        self._fetched_at = 0.0
+        self._attempted_at = float("-inf")
+        self._refreshing: Optional[asyncio.Task] = None
+        self.fetches = 0
+        self.errors = 0
+
+    def stats(self) -> dict:
+        return {"keys": len(self._keys), "fetches": self.fetches, "errors": self.errors,
+                "age_s": round(time.monotonic() - self._fetched_at, 1) if self._fetched_at else None}
+
+    async def _fetch(self):
+        self._attempted_at = time.monotonic()
+        self.fetches += 1
+        try:
+            resp = await self.client.get(self.url)
+            resp.raise_for_status()
+            keys = parse_jwks(resp.json())
+        except (httpx.HTTPError, ValueError) as e:
+            # Keep verifying with the keys we have
+            self.errors += 1
+            logger.error(f"JWKS fetch from {self.url} failed: {e!r}")
+            return
+        if not keys:
+            self.errors += 1
+            logger.error(f"JWKS from {self.url} has no signing keys, keeping {len(self._keys)}")
+            return
+        added = keys.keys() - self._keys.keys()
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+        if added:
+            logger.info(f"JWKS keys {sorted(k or '' for k in added)} loaded from {self.url}")
+
+    async def refresh(self):
+        # Concurrent callers share one fetch
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._fetch())
+        await asyncio.shield(self._refreshing)
+
+    def get(self, kid: Optional[str]) -> Optional[Tuple[Key, str]]:
+        if time.monotonic() - self._fetched_at > self.ttl_s and (self._refreshing is None or self._refreshing.done()) \
+                and time.monotonic() - self._attempted_at > self.min_refresh_s:
+            try:
+                self._refreshing = asyncio.get_running_loop().create_task(self._fetch())
+            except RuntimeError:
+                pass
+        return self._keys.get(kid)
+
+    async def refresh_for(self, kid: Optional[str]) -> bool:
+        if kid in self._keys:
+            return True
+        if time.monotonic() - self._attempted_at < self.min_refresh_s and (
+                self._refreshing is None or self._refreshing.done()):
+            return False
+        await self.refresh()
+        return kid in self._keys
+
+    async def close(self):
+        if self._refreshing is not None:
+            self._refreshing.cancel()
+        await self.client.aclose()
+
+
+class TokenVerifier:
+    def __init__(self, keys: Union[KeySet, str], algorithms: Sequence[str] = ("ES256",),
+                 revocations: Optional[RevocationSet] = None, leeway: int = 0,
+                 max_cached: int = MAX_CACHED_TOKENS):
+        self.algorithms = list(algorithms)
+        # A plain string is a shared secret (HS256 deployments, tests)
+        self.keys = KeySet.from_secret(keys, self.algorithms[0]) if isinstance(keys, str) else keys
+        self.revocations = revocations if revocations is not None else RevocationSet()
+        self.leeway = leeway
+        self.max_cached = max_cached
+        self._cache: Dict[str, Tuple[dict, float]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _evict(self, now: float):
+        self._cache = {t: v for t, v in self._cache.items() if v[1] > now}
+        # Still full of live tokens: drop the oldest half (dicts keep insertion order)
+        if len(self._cache) >= self.max_cached:
+            self._cache = dict(list(self._cache.items())[len(self._cache) // 2:])
+
+    def _decode(self, token: str) -> dict:
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except JWTError as e:
+            raise InvalidToken(f"Invalid token: {e}")
+        entry = self.keys.get(kid)
+        if entry is None:
+            raise UnknownSigningKey(kid)
+        key, algorithm = entry
+        if algorithm not in self.algorithms:
+            raise InvalidToken(f"Invalid token: algorithm {algorithm} not accepted")
+        try:
+            # Only the key's own algorithm: no HS256 token "signed" with a public key
+            return jwt.decode(token, key, algorithms=[algorithm],
+                              options={"leeway": self.leeway, "require_exp": True, "require_sub": True})
+        except JWTError as e:
+            raise InvalidToken(f"Invalid token: {e}")
+
+    def verify(self, token: str) -> dict:
+        """Verified claims of `token` with the keys at hand; raises InvalidToken."""
+        now = time.time()
+        cached = self._cache.get(token)
+        if cached is None:
+            self.misses += 1
+            claims = self._decode(token)
+            if len(self._cache) >= self.max_cached:
+                self._evict(now)
+            expires = float(claims["exp"]) + self.leeway
+            self._cache[token] = (claims, expires)
+        else:
+            self.hits += 1
+            claims, expires = cached
+            if expires <= now:
+                del self._cache[token]
+                raise InvalidToken("Invalid token: Signature has expired.")
+        # Tokens issued before jti was added can't be revoked, only expire
+        if claims.get("jti") in self.revocations:
+            raise InvalidToken("Token has been revoked")
+        if claims.get("sid") in self.revocations:
+            raise InvalidToken("Session has been revoked")
+        return claims
+
+    async def verify_async(self, token: str) -> dict:
+        """verify(), fetching the key set again first if the token's kid is new."""
+        try:
+            return self.verify(token)
+        except UnknownSigningKey as e:
+            if not await self.keys.refresh_for(e.kid):
+                raise
+        return self.verify(token)
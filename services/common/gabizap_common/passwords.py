@@ -0,0 +1,29 @@
+import bcrypt
+
+# bcrypt password hashing, as plain functions so they can run in a process
+# pool (BoundedExecutor(kind="process")): each call is ~100-300 ms of CPU
+# that must not run on an event loop.
+#
+# Hashes are standard $2b$ strings, interchangeable with the ones passlib's
+# CryptContext(schemes=["bcrypt"]) produced. Like passlib (and bcrypt
+# itself before 5.0) only the first 72 bytes of a password are significant;
+# they are truncated explicitly because bcrypt>=5 rejects longer input.
+
+BCRYPT_ROUNDS = 12
+MAX_PASSWORD_BYTES = 72
+
+
+def _secret(password: str) -> bytes:
+    return password.encode("utf-8")[:MAX_PASSWORD_BYTES]
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(_secret(password), bcrypt.gensalt(rounds)).decode("ascii")
+
+
+def verify_password(password: str, hashed: str) -> bool:
+    try:
+        return bcrypt.checkpw(_secret(password), hashed.encode("ascii"))
+    except ValueError:
+        # Malformed or non-bcrypt hash
+        return False
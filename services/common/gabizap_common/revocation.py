@@ -0,0 +1,123 @@
+import asyncio
+import json
+import time
+from typing import Dict, Optional
+
+import redis.asyncio as redis
+from gabizap_common.logger import setup_logger
+
+logger = setup_logger("revocation")
+
+# Access-token revocation, pushed instead of polled.
+#
+# auth-service records every revoked token id (jti) in a Redis sorted set
+# scored by the token's expiry and publishes it on a channel. Services that
+# verify tokens locally keep a RevocationSet in memory, so the per-request
+# check is a dict lookup. A RevocationFeed keeps that set fresh: it
+# subscribes first and then loads the sorted set, so nothing revoked in
+# between is missed, and it does the same again after every reconnect.
+# Entries are dropped once the token they revoke has expired anyway.
+#
+#   revocations = RevocationSet()
+#   feed = RevocationFeed(redis.from_url(url), revocations)
+#   await feed.start()
+#   ...
+#   if claims["jti"] in revocations: reject
+
+REVOCATION_CHANNEL = "auth:revocations"
+REVOKED_KEY = "auth:revoked"
+
+
+async def publish_revocation(client, jti: str, exp: float):
+    """Revokes token `jti` (valid until unix time `exp`) for every subscriber."""
+    async with client.pipeline(transaction=True) as pipe:
+        pipe.zadd(REVOKED_KEY, {jti: exp})
+        pipe.zremrangebyscore(REVOKED_KEY, "-inf", time.time())
+        pipe.publish(REVOCATION_CHANNEL, json.dumps({"jti": jti, "exp": exp}))
+        await pipe.execute()
+
+
+class RevocationSet:
+    def __init__(self):
+        self._revoked: Dict[str, float] = {}
+        self._next_prune = 0.0
+
+    def __contains__(self, jti) -> bool:
+        return jti in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def add(self, jti: str, exp: float):
+        now = time.time()
+        if exp > now:
+            self._revoked[jti] = exp
+        if now >= self._next_prune:
+            self.prune(now)
+
+    def apply(self, message):
+        """Applies one pub/sub payload: {"jti": ..., "exp": ...}."""
+        try:
+            data = json.loads(message)
+            self.add(str(data["jti"]), float(data["exp"]))
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring malformed revocation message: {e!r}")
+
+    def prune(self, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        self._next_prune = now + 60.0
+
+
+class RevocationFeed:
+    def __init__(self, client, revocations: RevocationSet, retry_s: float = 1.0):
+        self.redis = client
+        self.revocations = revocations
+        self.retry_s = retry_s
+        # False until the first snapshot and while disconnected: revocations
+        # made meanwhile are applied on the next resync
+        self.synced = False
+        self._task: Optional[asyncio.Task] = None
+        self._ready = asyncio.Event()
+
+    async def start(self, wait: float = 0.0):
+        """Starts listening; optionally waits up to `wait` seconds for the first sync."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        if wait:
+            try:
+                await asyncio.wait_for(self._ready.wait(), wait)
+            except asyncio.TimeoutError:
+                logger.warning("Revocation feed not synced yet, continuing")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.synced = False
+
+    async def _run(self):
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(REVOCATION_CHANNEL)
+                    for jti, exp in await self.redis.zrangebyscore(REVOKED_KEY, time.time(), "+inf",
+                                                                   withscores=True):
+                        self.revocations.add(jti.decode() if isinstance(jti, bytes) else jti, exp)
+                    self.synced = True
+                    self._ready.set()
+                    logger.info(f"Revocation feed synced, {len(self.revocations)} revoked tokens")
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.revocations.apply(message["data"])
+                raise redis.ConnectionError("Revocation subscription closed")
+            except asyncio.CancelledError:
+                raise
+            except (redis.RedisError, OSError) as e:
+                self.synced = False
+                logger.error(f"Revocation feed disconnected, retrying in {self.retry_s}s: {e!r}")
+                await asyncio.sleep(self.retry_s)
@@ -7,7 +7,9 @@ setup(
     install_requires=[
         "pydantic>=2.0.0",
         "python-jose[cryptography]",
-        "passlib[bcrypt]",
+        "bcrypt",
+        "redis",
+        "httpx",
         "loguru",
         "prometheus-client",
         "opentelemetry-api",
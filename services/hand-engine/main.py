@@ -1,44 +1,111 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-import mediapipe as mp
-import numpy as np
-from PIL import Image
-import io
+from fastapi import FastAPI, UploadFile, File, HTTPException, Path
+import base64
+from gabizap_common.config import BaseConfig
+from gabizap_common.executor import BoundedExecutor, Overloaded, register_overload_handler
+from gabizap_common.handgeo import hand_descriptor
+from gabizap_common.hands import extract_landmarks
+from gabizap_common.imaging import DecodedImage
 from gabizap_common.logger import setup_logger
+from .pool import HandsPool
 
 logger = setup_logger("hand-engine")
+
+class Config(BaseConfig):
+    # Worker threads, each with its own mediapipe graph (0 = one per core);
+    # the graphs release the GIL while they run
+    HAND_WORKERS: int = 0
+    MAX_PENDING: int = 0   # 0 = workers * 2
+    # /track sessions: one tracking graph per capture device
+    MAX_SESSIONS: int = 64
+    SESSION_TTL_S: float = 30.0
+
+config = Config(SERVICE_NAME="hand-engine")
+
+executor = BoundedExecutor("hand", kind="thread", workers=config.HAND_WORKERS,
+                           max_pending=config.MAX_PENDING or None)
+pool = HandsPool(executor.workers, max_sessions=config.MAX_SESSIONS, session_ttl=config.SESSION_TTL_S)
+
+def describe(image: DecodedImage, landmarks):
+    if landmarks is None:
+        return None
+    height, width = image.shape
+    return landmarks, hand_descriptor(landmarks, width, height)
+
+def process_upload(contents: bytes):
+    image = DecodedImage.from_bytes(contents)
+    with pool.checkout() as hands:
+        landmarks = extract_landmarks(hands, image.rgb)
+    return describe(image, landmarks)
+
+def track_upload(session_id: str, contents: bytes):
+    image = DecodedImage.from_bytes(contents)
+    with pool.session(session_id) as hands:
+        landmarks = extract_landmarks(hands, image.rgb)
+    return describe(image, landmarks)
+
 app = FastAPI(title="GABIZAP Hand Engine")
+register_overload_handler(app)
+
+@app.on_event("startup")
+def start_executor():
+    executor.start()
 
-mp_hands = mp.solutions.hands
-hands = mp_hands.Hands(
-    static_image_mode=True,
-    max_num_hands=1,
-    min_detection_confidence=0.5
-)
+@app.on_event("shutdown")
+def stop_executor():
+    executor.shutdown()
+    pool.close()
+
+def landmarks_payload(hand):
+    if hand is None:
+        return {"status": "no_hand_detected"}
+    landmarks, descriptor = hand
+    return {
+        "embedding": landmarks,
+        # Position/scale/rotation-invariant float32 descriptor for the matcher
+        "descriptor": base64.b64encode(descriptor.astype("<f4").tobytes()).decode(),
+        "version": "v2",
+    }
 
 @app.post("/process")
 async def process_hand(file: UploadFile = File(...)):
     try:
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-        image_np = np.array(image)
-        
-        results = hands.process(image_np)
-        
-        if not results.multi_hand_landmarks:
-            return {"status": "no_hand_detected"}
-            
-        # Extract landmarks and flatten to vector
-        landmarks = []
-        for hand_landmarks in results.multi_hand_landmarks:
-            for lm in hand_landmarks.landmark:
-                landmarks.extend([lm.x, lm.y, lm.z])
-                
-        return {"embedding": landmarks, "version": "v1"}
-        
+        hand = await executor.run(process_upload, contents)
+        return landmarks_payload(hand)
+
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Error processing hand: {e}")
         raise HTTPException(status_code=500, detail="Processing failed") 
 
+@app.post("/track/{session_id}")
+async def track_hand(session_id: str = Path(..., max_length=128), file: UploadFile = File(...)):
+    """
+    One frame of a capture session. Frames sharing a session_id reuse the
+    session's tracking graph, so palm detection only re-runs when the hand
+    is lost. Send frames of a session in order, one at a time.
+    """
+    try:
+        contents = await file.read()
+        hand = await executor.run(track_upload, session_id, contents)
+        return {**landmarks_payload(hand), "session_id": session_id}
+
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Overloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Error tracking hand: {e}")
+        raise HTTPException(status_code=500, detail="Processing failed")
+
+@app.delete("/track/{session_id}")
+async def end_session(session_id: str = Path(..., max_length=128)):
+    closed = await executor.run(pool.close_session, session_id)
+    return {"session_id": session_id, "closed": closed}
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "hand-engine"}
+    return {"status": "healthy", "service": "hand-engine", "executor": executor.stats(), "hands": pool.stats()}
@@ -0,0 +1,161 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Optional, Tuple
+
+from gabizap_common.executor import Overloaded
+from gabizap_common.hands import create_hands
+
+# In-process pool of mediapipe Hands graphs for the hand-engine thread pool.
+#
+# A Hands object must never be used by two threads at once, but separate
+# instances run concurrently (process() releases the GIL inside the graph).
+#   - checkout(): exclusive loan of a static-image instance; at most `size`
+#     exist, extra callers wait for a returned one.
+#   - session(id): the tracking instance (static_image_mode=False) owned by
+#     one capture device. Frames of the same session are serialized on it,
+#     so mediapipe tracks the hand from frame to frame instead of re-running
+#     palm detection. Sessions idle for session_ttl seconds are closed; past
+#     max_sessions the least recently used idle session is evicted.
+
+
+class _Session:
+    __slots__ = ("hands", "lock", "last_used", "frames")
+
+    def __init__(self, hands):
+        self.hands = hands
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.frames = 0
+
+
+class HandsPool:
+    def __init__(self, size: int, max_sessions: int = 64, session_ttl: float = 30.0,
+                 factory: Callable = create_hands):
+        self.size = size
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.factory = factory
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = []
+        self._created = 0
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None):
+        if not self._slots.acquire(timeout=timeout):
+            raise Overloaded("hands", 1)
+        try:
+            with self._lock:
+                hands = self._idle.pop() if self._idle else None
+            if hands is None:
+                # Created lazily, so an idle service holds no graphs it never used
+                hands = self.factory(static_image_mode=True)
+                with self._lock:
+                    self._created += 1
+            try:
+                yield hands
+            finally:
+                with self._lock:
+                    self._idle.append(hands)
+        finally:
+            self._slots.release()
+
+    def _lookup(self, session_id: str, hands=None) -> Tuple[Optional[_Session], bool]:
+        """
+        (state, installed): the session, moved to most recently used. A
+        missing one is opened on `hands` if given (installed=True), else None.
+        """
+        with self._lock:
+            self._expire(time.monotonic())
+            state = self._sessions.get(session_id)
+            if state is None:
+                if len(self._sessions) >= self.max_sessions and not self._evict_one():
+                    raise Overloaded("hand-sessions", 1)
+                if hands is None:
+                    return None, False
+                self._sessions[session_id] = _Session(hands)
+                return self._sessions[session_id], True
+            self._sessions.move_to_end(session_id)
+            return state, False
+
+    @contextmanager
+    def session(self, session_id: str):
+        while True:
+            state, _ = self._lookup(session_id)
+            if state is None:
+                # Built outside the lock like checkout()'s, so other sessions
+                # and checkouts aren't held up by graph construction
+                hands = self.factory(static_image_mode=False)
+                installed = False
+                try:
+                    state, installed = self._lookup(session_id, hands)
+                finally:
+                    if not installed:
+                        hands.close()   # another thread opened this session meanwhile
+            with state.lock:
+                if state.hands is None:
+                    continue   # evicted between lookup and lock: start a fresh session
+                state.last_used = time.monotonic()
+                state.frames += 1
+                yield state.hands
+                return
+
+    def close_session(self, session_id: str) -> bool:
+        with self._lock:
+            state = self._sessions.pop(session_id, None)
+        if state is None:
+            return False
+        with state.lock:  # let an in-flight frame finish first
+            self._close(state)
+        return True
+
+    @staticmethod
+    def _close(state: _Session):
+        # Caller holds state.lock
+        state.hands.close()
+        state.hands = None
+
+    def _expire(self, now: float):
+        # Caller holds self._lock
+        for session_id, state in list(self._sessions.items()):
+            if now - state.last_used < self.session_ttl:
+                break   # ordered by last use
+            if state.lock.acquire(blocking=False):
+                del self._sessions[session_id]
+                self._close(state)
+                state.lock.release()
+
+    def _evict_one(self) -> bool:
+        # Caller holds self._lock; never evicts a session mid-frame
+        for session_id, state in self._sessions.items():
+            if state.lock.acquire(blocking=False):
+                del self._sessions[session_id]
+                self._close(state)
+                state.lock.release()
+                self.evicted += 1
+                return True
+        return False
+
+    def close(self):
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), OrderedDict()
+            idle, self._idle = self._idle, []
+        for hands in idle:
+            hands.close()
+        for state in sessions:
+            with state.lock:
+                self._close(state)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "static_instances": self._created,
+                "static_idle": len(self._idle),
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "evicted_sessions": self.evicted,
+            }
@@ -21,7 +21,7 @@ async def on_message(client, topic, payload, qos, properties):
         
         # Verify with Auth Service
         async with httpx.AsyncClient() as http:
-            resp = await http.post(f"{AUTH_SERVICE_URL}/auth/validate", 
+            resp = await http.post(f"{AUTH_SERVICE_URL}/validate", 
                                  headers={"Authorization": f"Bearer {user_token}"})
             
             if resp.status_code == 200:
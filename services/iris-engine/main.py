@@ -1,29 +1,136 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException
+from typing import List
 from gabizap_common.config import BaseConfig
+from gabizap_common.executor import Overloaded, register_overload_handler
 from gabizap_common.logger import setup_logger
-from .model import IrisModel
-import numpy as np
+from .model import IrisTemplate
+from .pipeline import EmbeddingBatcher
+import base64
 
 logger = setup_logger("iris-engine")
 
 class Config(BaseConfig):
     MODEL_PATH: str = "models/iris_v1.h5"
+    # 0 = one worker process per core
+    EMBED_WORKERS: int = 0
+    BATCH_MAX_SIZE: int = 16
+    BATCH_MAX_WAIT_MS: float = 0.0
+    MAX_BATCH_FILES: int = 64
+    # Images queued or in flight before /embed answers 503
+    # (0 = workers * batch * 2, and at least MAX_BATCH_FILES)
+    MAX_PENDING: int = 0
+    # Load mediapipe in the workers so /enroll also extracts hand landmarks
+    ENROLL_HAND: bool = True
 
 config = Config(SERVICE_NAME="iris-engine")
-model = IrisModel(config.MODEL_PATH)
+batcher = EmbeddingBatcher(config.MODEL_PATH, workers=config.EMBED_WORKERS,
+                           max_batch=config.BATCH_MAX_SIZE, max_wait_ms=config.BATCH_MAX_WAIT_MS,
+                           max_pending=config.MAX_PENDING, max_batch_files=config.MAX_BATCH_FILES,
+                           hands=config.ENROLL_HAND)
 
 app = FastAPI(title="GABIZAP Iris Engine")
+register_overload_handler(app)
+
+def template_payload(template: IrisTemplate) -> dict:
+    return {
+        "embedding": template.embedding.tolist(),
+        # Packed Gabor phase bits + validity mask for Hamming matching
+        "iris_code": base64.b64encode(template.code.tobytes()).decode(),
+        "iris_mask": base64.b64encode(template.mask.tobytes()).decode(),
+        "pupil": [round(v, 2) for v in template.pupil],
+        "iris": [round(v, 2) for v in template.iris],
+        "timings_ms": {stage: round(ms, 3) for stage, ms in template.timings.items()},
+    }
+
+@app.on_event("startup")
+async def start_pipeline():
+    await batcher.start()
+    logger.info(f"Iris pipeline started with {batcher.workers} worker processes")
+
+@app.on_event("shutdown")
+async def stop_pipeline():
+    await batcher.stop()
 
 @app.post("/embed")
 async def create_embedding(file: UploadFile = File(...)):
     try:
         contents = await file.read()
-        embedding = model.get_embedding(contents)
-        return {"embedding": embedding.tolist(), "version": "v1"}
+        # Queued into the next micro-batch; the event loop stays free meanwhile
+        template = await batcher.embed(contents)
+        return {**template_payload(template), "version": "v2"}
+    except ValueError as e:
+        # Undecodable image, or no pupil/limbus found: re-capture, don't retry
+        logger.warning(f"Iris rejected: {e}")
+        raise HTTPException(status_code=422, detail=str(e))
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Error processing iris: {e}")
         raise HTTPException(status_code=500, detail="Processing failed")
 
+@app.post("/embed/batch")
+async def create_embeddings(files: List[UploadFile] = File(...)):
+    # A batch larger than the admission limit would get 503 forever, not just under load
+    limit = min(config.MAX_BATCH_FILES, batcher.executor.max_pending)
+    if len(files) > limit:
+        raise HTTPException(status_code=413, detail=f"At most {limit} files per batch")
+
+    images = [await f.read() for f in files]
+    results = await batcher.embed_many(images)
+
+    embeddings = []
+    for f, result in zip(files, results):
+        if isinstance(result, ValueError):
+            embeddings.append({"filename": f.filename, "error": str(result)})
+        elif isinstance(result, Exception):
+            logger.error(f"Error processing iris {f.filename}: {result}")
+            embeddings.append({"filename": f.filename, "error": "Processing failed"})
+        else:
+            embeddings.append({"filename": f.filename, **template_payload(result)})
+    return {"embeddings": embeddings, "version": "v2"}
+
+@app.post("/enroll")
+async def enroll(file: UploadFile = File(...)):
+    """
+    Fused enrollment scan: one upload, decoded once, instead of separate
+    calls to liveness-engine /check, /embed and hand-engine /process.
+    """
+    try:
+        contents = await file.read()
+        result = await batcher.enroll(contents)
+    except ValueError as e:
+        logger.warning(f"Enrollment rejected: {e}")
+        raise HTTPException(status_code=422, detail=str(e))
+    except Overloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing enrollment: {e}")
+        raise HTTPException(status_code=500, detail="Processing failed")
+
+    response = {
+        "is_live": result.is_live,
+        "confidence": result.confidence,
+        "timings_ms": {stage: round(ms, 3) for stage, ms in result.timings.items()},
+        "version": "v2",
+    }
+    if not result.is_live:
+        logger.warning("SPOOFING ATTEMPT DETECTED during enrollment")
+        return {**response, "status": "spoof_detected"}
+
+    if result.template is not None:
+        response["iris"] = template_payload(result.template)
+    else:
+        response["iris"] = {"error": result.iris_error}
+    if config.ENROLL_HAND:
+        if result.hand is not None:
+            response["hand"] = {
+                "embedding": result.hand,
+                "descriptor": base64.b64encode(result.hand_descriptor.astype("<f4").tobytes()).decode(),
+            }
+        else:
+            response["hand"] = {"status": result.hand_error or "no_hand_detected"}
+    return {**response, "status": "ok"}
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "iris-engine"}
+    return {"status": "healthy", "service": "iris-engine", "executor": batcher.executor.stats()}
@@ -1,72 +1,277 @@
 import numpy as np
 import cv2
 import math
+import time
+from collections import OrderedDict
+
+# Daugman-style iris code: segment pupil and limbus, unwrap the annulus onto
+# a fixed polar grid (rubber sheet), filter each ring with a bank of 1-D
+# log-Gabor filters along the angular axis and keep two phase bits per
+# complex response.
+#
+# Code layout is column-major over the angular axis: every angular column
+# holds SCALES x CODE_ROWS x 2 bits as one machine word, so rotating the eye
+# by one column is a roll of the word array, with no bit-level shifting.
+
+RADIAL_RES = 32       # unwrap samples from pupil to limbus
+ANGULAR_RES = 256     # unwrap samples around the iris
+CODE_ROWS = 8         # radial rows kept in the code
+CODE_COLS = 128       # angular columns kept in the code
+WAVELENGTHS = (16.0, 32.0)   # log-Gabor centre wavelengths, in unwrap samples
+SIGMA_ON_F = 0.5
+EMBEDDING_DIM = 512
+EMBEDDING_BANDS = 8
+
+BITS_PER_COL = len(WAVELENGTHS) * CODE_ROWS * 2
+# One machine word per angular column
+COLUMN_DTYPE = {8: np.uint8, 16: np.uint16, 32: np.uint32, 64: np.uint64}[BITS_PER_COL]
+CODE_BYTES = CODE_COLS * BITS_PER_COL // 8
+
+_REMAP_CACHE_SIZE = 512
+_remap_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_filter_banks = {}
+
+if hasattr(np, "bitwise_count"):
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(words)
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(words: np.ndarray) -> np.ndarray:
+        bytes_ = words.view(np.uint8).reshape(*words.shape, -1)
+        return _POPCOUNT_TABLE[bytes_].sum(axis=-1)
+
+
+class IrisTemplate:
+    """Result of one pass through the pipeline (picklable, crosses the process pool)."""
+    __slots__ = ("code", "mask", "embedding", "pupil", "iris", "timings")
+
+    def __init__(self, code, mask, embedding, pupil, iris, timings):
+        self.code = code            # packed uint8, CODE_BYTES
+        self.mask = mask            # packed uint8, 1 = bit usable for matching
+        self.embedding = embedding  # float32 unit vector for the cosine matcher
+        self.pupil = pupil          # (x, y, r) in preprocessed image pixels
+        self.iris = iris
+        self.timings = timings      # stage -> milliseconds
+
+
+def rubber_sheet_maps(pupil_r: int, iris_r: int, dx: int, dy: int,
+                      radial: int = RADIAL_RES, angular: int = ANGULAR_RES):
+    """
+    cv2.remap lookup tables for Daugman's rubber sheet, relative to the iris
+    centre: sample (i, j) sits i/(radial-1) of the way from the pupil boundary
+    to the limbus along angle 2*pi*j/angular. The pupil centre may be offset
+    (dx, dy) from the iris centre. Cached per geometry, since integer radii
+    and offsets repeat constantly across captures.
+    """
+    key = (pupil_r, iris_r, dx, dy, radial, angular)
+    maps = _remap_cache.get(key)
+    if maps is not None:
+        _remap_cache.move_to_end(key)
+        return maps
+
+    theta = np.linspace(0, 2 * np.pi, angular, endpoint=False)
+    cos, sin = np.cos(theta), np.sin(theta)
+    t = np.linspace(0, 1, radial)[:, None]
+    inner_x, inner_y = dx + pupil_r * cos, dy + pupil_r * sin
+    outer_x, outer_y = iris_r * cos, iris_r * sin
+    maps = (((1 - t) * inner_x + t * outer_x).astype(np.float32),
+            ((1 - t) * inner_y + t * outer_y).astype(np.float32))
+
+    _remap_cache[key] = maps
+    if len(_remap_cache) > _REMAP_CACHE_SIZE:
+        _remap_cache.popitem(last=False)
+    return maps
+
+
+def log_gabor_bank(width: int = ANGULAR_RES, wavelengths=WAVELENGTHS, sigma_on_f: float = SIGMA_ON_F) -> np.ndarray:
+    """
+    Frequency-domain 1-D log-Gabor filters, shape (len(wavelengths), width).
+    Negative frequencies are zeroed, so the filtered signal is analytic and
+    its real/imaginary parts give the two phase bits.
+    """
+    key = (width, tuple(wavelengths), sigma_on_f)
+    bank = _filter_banks.get(key)
+    if bank is None:
+        freqs = np.fft.fftfreq(width)
+        bank = np.zeros((len(wavelengths), width))
+        positive = freqs > 0
+        for i, wavelength in enumerate(wavelengths):
+            f0 = 1.0 / wavelength
+            bank[i, positive] = np.exp(-(np.log(freqs[positive] / f0) ** 2) / (2 * np.log(sigma_on_f) ** 2))
+        _filter_banks[key] = bank
+    return bank
+
+
+def rotations(packed: np.ndarray, max_shift: int) -> np.ndarray:
+    """
+    Every rotation of a packed code by -max_shift..max_shift columns, shape
+    (2 * max_shift + 1, CODE_COLS), one word per angular column. These are
+    zero-copy windows over the code wrapped by max_shift columns each side.
+    """
+    cols = packed.view(COLUMN_DTYPE)
+    wrapped = np.concatenate([cols[CODE_COLS - max_shift:], cols, cols[:max_shift]])
+    windows = np.lib.stride_tricks.sliding_window_view(wrapped, CODE_COLS)
+    # Rotating right by s starts the window at max_shift - s
+    return windows[::-1]
+
+
+def hamming_distance(code_a, mask_a, code_b, mask_b, max_shift: int = 8):
+    """
+    Fractional Hamming distance between two packed iris codes, minimised over
+    rotations of b by -max_shift..max_shift angular columns (head tilt).
+    Only bits valid in both masks count. Returns (distance, best_shift);
+    distance is 1.0 when no bits overlap.
+    """
+    valid = mask_a.view(COLUMN_DTYPE) & rotations(mask_b, max_shift)
+    differing = _popcount((code_a.view(COLUMN_DTYPE) ^ rotations(code_b, max_shift)) & valid)
+    differing = differing.sum(axis=1, dtype=np.int64)
+    counted = _popcount(valid).sum(axis=1, dtype=np.int64)
+    hd = np.where(counted > 0, differing / np.maximum(counted, 1), 1.0)
+    best = int(np.argmin(hd))
+    return float(hd[best]), best - max_shift
+
 
 class IrisModel:
     def __init__(self, model_path: str = None):
         self.model_path = model_path
         # In a real scenario, we would load a pre-trained CNN (e.g. ResNet50)
         # self.model = tf.keras.models.load_model(model_path)
-        pass
+        self.bank = log_gabor_bank()
 
     def preprocess(self, image_bytes):
         # Decode image
         nparr = np.frombuffer(image_bytes, np.uint8)
         img = cv2.imdecode(nparr, cv2.IMREAD_GRAYSCALE)
-        
+
         if img is None:
             raise ValueError("Invalid image")
-            
+
+        return self.resize(img)
+
+    def resize(self, img):
         # Resize to standard size
-        img = cv2.resize(img, (320, 240))
+        if img.shape != (240, 320):
+            img = cv2.resize(img, (320, 240))
         return img
 
+    def segment(self, img):
+        """
+        Returns (pupil, iris) circles as (x, y, r). The pupil is the darkest
+        blob near the Hough iris candidate; the limbus radius comes from
+        Daugman's integro-differential operator, i.e. the sharpest rise in
+        mean intensity along circles around the pupil centre, using only the
+        lateral sectors so eyelids don't pull the edge in.
+        """
+        blurred = cv2.medianBlur(img, 5)
+        h, w = img.shape
+        circles = cv2.HoughCircles(blurred, cv2.HOUGH_GRADIENT, dp=1.2, minDist=50,
+                                   param1=100, param2=30, minRadius=10, maxRadius=80)
+        if circles is not None:
+            cx, cy, _ = circles[0][0]
+        else:
+            cx, cy = w / 2, h / 2
+
+        # Pupil: threshold the dark tail inside the search window
+        reach = 80
+        x0, y0 = int(max(cx - reach, 0)), int(max(cy - reach, 0))
+        roi = blurred[y0:int(min(cy + reach, h)), x0:int(min(cx + reach, w))]
+        dark, median = np.percentile(roi, (1, 50))
+        _, binary = cv2.threshold(roi, dark + 0.35 * (median - dark), 255, cv2.THRESH_BINARY_INV)
+        contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            raise ValueError("Pupil not found")
+        blob = max(contours, key=cv2.contourArea)
+        m = cv2.moments(blob)
+        if m["m00"] == 0:
+            raise ValueError("Pupil not found")
+        px, py = x0 + m["m10"] / m["m00"], y0 + m["m01"] / m["m00"]
+        pr = math.sqrt(m["m00"] / math.pi)
+
+        # Limbus: radial intensity profile around the pupil centre
+        max_r = int(min(5 * pr, reach + pr))
+        polar = cv2.warpPolar(blurred.astype(np.float32), (max_r, 360), (px, py), max_r,
+                              cv2.WARP_POLAR_LINEAR + cv2.INTER_LINEAR)
+        lateral = np.r_[polar[:45], polar[135:225], polar[315:]]
+        profile = np.convolve(lateral.mean(axis=0), np.ones(5) / 5, mode="same")
+        edge = np.diff(profile)
+        lo, hi = int(1.5 * pr), max_r - 3
+        if hi <= lo:
+            raise ValueError("Iris boundary not found")
+        ir = lo + int(np.argmax(edge[lo:hi])) + 1
+        return (px, py, pr), (px, py, float(ir))
+
+    def normalize(self, img, pupil, iris):
+        """Rubber-sheet unwrap -> (polar float32 image, validity mask)."""
+        px, py, pr = pupil
+        ix, iy, ir = iris
+        map_x, map_y = rubber_sheet_maps(int(round(pr)), int(round(ir)),
+                                         int(round(px - ix)), int(round(py - iy)))
+        polar = cv2.remap(img.astype(np.float32), map_x + np.float32(ix), map_y + np.float32(iy),
+                          cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=-1)
+        valid = polar >= 0
+        # Specular highlights and eyelash shadows carry no iris texture
+        if valid.any():
+            lo, hi = np.percentile(polar[valid], (1, 99))
+            valid &= (polar >= lo - 10) & (polar <= hi + 10)
+        return polar, valid
+
+    def encode(self, polar, valid):
+        """Gabor phase bits, packed column-major; returns (code, mask, embedding)."""
+        fill = polar[valid].mean() if valid.any() else 0.0
+        rows = np.where(valid, polar, fill)
+        rows = rows - rows.mean(axis=1, keepdims=True)
+
+        # FFT convolution of every ring with every filter in one pass
+        spectrum = np.fft.fft(rows, axis=1)
+        response = np.fft.ifft(spectrum[None, :, :] * self.bank[:, None, :], axis=2)
+
+        row_step, col_step = RADIAL_RES // CODE_ROWS, ANGULAR_RES // CODE_COLS
+        sampled = response[:, row_step // 2::row_step, ::col_step]          # (S, R, C)
+        sampled_valid = valid[row_step // 2::row_step, ::col_step]
+        magnitude = np.abs(sampled)
+        # Near-zero responses flip phase under noise ("fragile bits")
+        strong = magnitude > 0.1 * np.median(magnitude, axis=(1, 2), keepdims=True)
+
+        bits = np.stack([sampled.real > 0, sampled.imag > 0], axis=-1)     # (S, R, C, 2)
+        usable = np.broadcast_to((strong & sampled_valid[None])[..., None], bits.shape)
+        order = (2, 0, 1, 3)   # -> (C, S, R, 2): one angular column per byte row
+        code = np.packbits(bits.transpose(order).reshape(CODE_COLS, -1), axis=1).ravel()
+        mask = np.packbits(usable.transpose(order).reshape(CODE_COLS, -1), axis=1).ravel()
+
+        # Float embedding for the cosine matcher: per radial band, the log
+        # Fourier magnitude of the rings along the angular axis. Magnitudes
+        # ignore phase, so the embedding is invariant to eye rotation.
+        bands, n_freq = EMBEDDING_BANDS, EMBEDDING_DIM // EMBEDDING_BANDS
+        magnitude = np.abs(spectrum[:, 1:n_freq + 1]).reshape(bands, RADIAL_RES // bands, n_freq)
+        embedding = np.log1p(magnitude.mean(axis=1)).ravel()
+        embedding = (embedding - embedding.mean()).astype(np.float32)
+        norm = np.linalg.norm(embedding)
+        return code, mask, embedding / (norm if norm > 0 else 1.0)
+
+    def analyze(self, image_bytes) -> IrisTemplate:
+        t0 = time.perf_counter()
+        img = self.preprocess(image_bytes)
+        timings = {"decode": (time.perf_counter() - t0) * 1000.0}
+        return self.analyze_image(img, timings)
+
+    def analyze_image(self, gray, timings: dict = None) -> IrisTemplate:
+        """Runs segment/normalize/encode on an already decoded grayscale frame."""
+        timings = {} if timings is None else timings
+        t1 = time.perf_counter()
+        img = self.resize(gray)
+        pupil, iris = self.segment(img)
+        t2 = time.perf_counter()
+        polar, valid = self.normalize(img, pupil, iris)
+        t3 = time.perf_counter()
+        code, mask, embedding = self.encode(polar, valid)
+        t4 = time.perf_counter()
+        for stage, start, end in (("segment", t1, t2), ("normalize", t2, t3), ("encode", t3, t4)):
+            timings[stage] = (end - start) * 1000.0
+        return IrisTemplate(code, mask, embedding, pupil, iris, timings)
+
     def get_embedding(self, image_bytes):
-        try:
-            img = self.preprocess(image_bytes)
-            
-            # --- SIMULATION OF IRIS RECOGNITION PIPELINE ---
-            
-            # 1. Segmentation (Find Pupil and Iris boundaries)
-            # Use Hough Circle Transform
-            circles = cv2.HoughCircles(img, cv2.HOUGH_GRADIENT, dp=1.2, minDist=50,
-                                      param1=100, param2=30, minRadius=10, maxRadius=80)
-            
-            if circles is not None:
-                # We found an eye-like structure
-                pass
-            else:
-                # Fallback or error
-                pass
-
-            # 2. Normalization (Rubber Sheet Model)
-            # Unroll the iris into a rectangular block
-            # For this MVP, we will simulate the feature extraction by taking a central crop 
-            # and running a Gabor-like filter bank simulation (using DCT/FFT)
-            
-            # Crop center
-            h, w = img.shape
-            center_crop = img[h//4:3*h//4, w//4:3*w//4]
-            center_crop = cv2.resize(center_crop, (64, 64))
-            
-            # 3. Feature Encoding
-            # Use Discrete Cosine Transform as a proxy for complex Gabor filtering
-            dct = cv2.dct(np.float32(center_crop)/255.0)
-            
-            # Flatten and take top coefficients as embedding
-            flat_dct = dct.flatten()
-            
-            # Take first 512 coefficients (low frequency components = structure)
-            embedding = flat_dct[:512]
-            
-            # Normalize vector
-            norm = np.linalg.norm(embedding)
-            if norm == 0:
-                norm = 1.0
-            
-            return embedding / norm
-            
-        except Exception as e:
-            print(f"Embedding error: {e}")
-            # Return random noise on failure to keep pipeline moving in dev (or raise)
-            return np.random.rand(512).astype(np.float32)
+        return self.analyze(image_bytes).embedding
+
+    def compare(self, a: IrisTemplate, b: IrisTemplate, max_shift: int = 8):
+        return hamming_distance(a.code, a.mask, b.code, b.mask, max_shift=max_shift)
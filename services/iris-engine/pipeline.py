@@ -0,0 +1,229 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+from gabizap_common.executor import BoundedExecutor
+from .model import IrisModel, IrisTemplate
+
+# Per-process state, created by the pool initializer
+_worker_model: Optional[IrisModel] = None
+_worker_hands = None
+_worker_stages: Optional[ThreadPoolExecutor] = None
+
+
+def _init_worker(model_path: str, hands: bool = False):
+    global _worker_model, _worker_hands, _worker_stages
+    import cv2
+    # Parallelism comes from the pool; stop OpenCV oversubscribing each core
+    cv2.setNumThreads(1)
+    _worker_model = IrisModel(model_path)
+    if hands:
+        # mediapipe is only needed by /enroll; imported here so /embed-only
+        # deployments don't load the graph
+        from gabizap_common.hands import create_hands
+        _worker_hands = create_hands()
+    # Iris and hand stages of one enrollment run side by side on the shared frame
+    _worker_stages = ThreadPoolExecutor(max_workers=2, thread_name_prefix="enroll-stage")
+
+
+def _analyze_one(image: bytes):
+    try:
+        return _worker_model.analyze(image)
+    except ValueError as e:
+        # Undecodable image, no pupil/limbus: fails this image, not its batch
+        return e
+
+
+def analyze_images(images: List[bytes]):
+    """Runs in a pool worker: the CPU-heavy decode/segment/encode stages."""
+    started = time.perf_counter()
+    results = [_analyze_one(image) for image in images]
+    return results, time.perf_counter() - started
+
+
+class Enrollment:
+    __slots__ = ("is_live", "confidence", "template", "iris_error", "hand", "hand_descriptor", "hand_error",
+                 "timings")
+
+    def __init__(self, is_live: bool, confidence: float, timings: dict):
+        self.is_live = is_live
+        self.confidence = confidence
+        self.template: Optional[IrisTemplate] = None
+        self.iris_error: Optional[str] = None
+        self.hand: Optional[List[float]] = None
+        self.hand_descriptor: Optional[np.ndarray] = None
+        self.hand_error: Optional[str] = None
+        self.timings = timings
+
+
+def _timed_stage(fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args), None, (time.perf_counter() - started) * 1000.0
+    except ValueError as e:
+        # No pupil/limbus found etc.: reported per modality, the others still count
+        return None, str(e), (time.perf_counter() - started) * 1000.0
+
+
+def _hand_landmarks(image):
+    from gabizap_common.handgeo import hand_descriptor
+    from gabizap_common.hands import extract_landmarks
+    landmarks = extract_landmarks(_worker_hands, image.rgb)
+    if landmarks is None:
+        return None
+    height, width = image.shape
+    return landmarks, hand_descriptor(landmarks, width, height)
+
+
+def enroll_image(image_bytes: bytes) -> Enrollment:
+    """
+    Runs in a pool worker: the fused multimodal enrollment of one upload.
+
+    The bytes are decoded once; liveness and iris read the same gray buffer
+    and the hand stage (when the worker loaded mediapipe) the RGB view of
+    the same decode. Spoofs return right after liveness. Otherwise the iris and hand extractors run concurrently
+    on the worker's stage threads (OpenCV and mediapipe release the GIL).
+    """
+    from gabizap_common.imaging import DecodedImage
+    from gabizap_common.liveness import check_liveness
+
+    t0 = time.perf_counter()
+    image = DecodedImage.from_bytes(image_bytes)
+    gray = image.gray
+    t1 = time.perf_counter()
+    is_live, confidence = check_liveness(gray)
+    t2 = time.perf_counter()
+    result = Enrollment(is_live, confidence, {"decode": (t1 - t0) * 1000.0, "liveness": (t2 - t1) * 1000.0})
+    if not is_live:
+        result.timings["total"] = (t2 - t0) * 1000.0
+        return result
+
+    iris = _worker_stages.submit(_timed_stage, _worker_model.analyze_image, gray)
+    if _worker_hands is not None:
+        hand = _worker_stages.submit(_timed_stage, _hand_landmarks, image)
+        found, result.hand_error, result.timings["hand"] = hand.result()
+        if found is not None:
+            result.hand, result.hand_descriptor = found
+    result.template, result.iris_error, result.timings["iris"] = iris.result()
+    result.timings["total"] = (time.perf_counter() - t0) * 1000.0
+    return result
+
+
+class EmbeddingBatcher:
+    """
+    Micro-batching front for the iris pipeline.
+
+    Each pool worker takes one batch at a time. While every worker is busy,
+    incoming embed() calls accumulate in the queue; as soon as a worker frees
+    up, everything queued (up to max_batch) is sent to it as one task. An idle
+    service therefore adds no batching delay, a loaded one pays the IPC and
+    task overhead once per batch, and the OpenCV stages never run on the
+    event loop. max_wait_ms optionally lingers for stragglers on top of that.
+
+    Admission is per image through the shared BoundedExecutor: beyond
+    max_pending queued or in-flight images, embed() raises Overloaded (503).
+    embed_many() admits a batch as a whole, so the default max_pending also
+    fits one batch of max_batch_files; a larger batch could never be admitted.
+    enroll() shares the pool and the admission limit; with hands=True the
+    workers also load a mediapipe Hands graph for its hand stage.
+    """
+
+    def __init__(self, model_path: str, workers: int = 0, max_batch: int = 16, max_wait_ms: float = 0.0,
+                 max_pending: int = 0, max_batch_files: int = 0, hands: bool = False):
+        self.model_path = model_path
+        self.hands = hands
+        self.executor = BoundedExecutor("iris-embed", kind="process", workers=workers,
+                                        initializer=_init_worker, initargs=(model_path, hands))
+        self.workers = self.executor.workers
+        self.executor.max_pending = max_pending or max(self.workers * max_batch * 2, max_batch_files)
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._idle: Optional[asyncio.Semaphore] = None
+
+    async def start(self):
+        self.executor.start()
+        self._queue = asyncio.Queue()
+        self._idle = asyncio.Semaphore(self.workers)
+        self._task = asyncio.create_task(self._collect())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        self.executor.shutdown()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    async def _submit(self, image: bytes) -> IrisTemplate:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image, future))
+        return await future
+
+    async def embed(self, image: bytes) -> IrisTemplate:
+        self.executor.admit()
+        try:
+            return await self._submit(image)
+        finally:
+            self.executor.release()
+
+    async def embed_many(self, images: List[bytes]) -> List:
+        """Embeds all images; failed items come back as the raised exception."""
+        # All or nothing: a batch is admitted only if it fits as a whole
+        self.executor.admit(len(images))
+        try:
+            return await asyncio.gather(*(self._submit(image) for image in images), return_exceptions=True)
+        finally:
+            self.executor.release(len(images))
+
+    async def enroll(self, image: bytes) -> Enrollment:
+        """Fused liveness + iris + hand enrollment, on the same worker pool as embed()."""
+        return await self.executor.run(enroll_image, image)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            # Requests keep queueing while we wait for a free worker
+            await self._idle.acquire()
+            batch = [first]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except asyncio.QueueEmpty:
+                    pass
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            asyncio.create_task(self._dispatch(batch))
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results, seconds = await loop.run_in_executor(self.executor.pool, analyze_images,
+                                                          [image for image, _ in batch])
+            self.executor.record(seconds / len(batch))
+            for (_, future), result in zip(batch, results):
+                if future.done():  # caller may have gone away
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._idle.release()
@@ -1,56 +1,54 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-import cv2
-import numpy as np
-import io
-from PIL import Image
-from skimage.feature import local_binary_pattern
+from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect
+import asyncio
+from gabizap_common.config import BaseConfig
+from gabizap_common.executor import BoundedExecutor, Overloaded, register_overload_handler
+from gabizap_common.imaging import DecodedImage
+from gabizap_common.liveness import check_liveness, load_classifier
 from gabizap_common.logger import setup_logger
+from .temporal import TemporalLiveness, analyze_frame
 
 logger = setup_logger("liveness-engine")
+
+class Config(BaseConfig):
+    # CPU stages run in a process pool (0 = one worker per core)
+    LIVENESS_WORKERS: int = 0
+    MAX_PENDING: int = 0   # 0 = workers * 2
+    # Fitted LivenessClassifier (.npz); empty = built-in default coefficients
+    LIVENESS_MODEL_PATH: str = ""
+    # /stream: decide once P(live) leaves [REJECT, ACCEPT] after MIN_FRAMES
+    STREAM_MIN_FRAMES: int = 4
+    STREAM_MAX_FRAMES: int = 60
+    STREAM_ACCEPT: float = 0.95
+    STREAM_REJECT: float = 0.05
+    STREAM_MAX_FRAME_BYTES: int = 2 * 1024 * 1024
+    STREAM_IDLE_TIMEOUT_S: float = 10.0
+
+config = Config(SERVICE_NAME="liveness-engine")
+executor = BoundedExecutor("liveness", kind="process", workers=config.LIVENESS_WORKERS,
+                           max_pending=config.MAX_PENDING or None, initializer=load_classifier,
+                           initargs=(config.LIVENESS_MODEL_PATH,))
+
 app = FastAPI(title="GABIZAP Liveness Engine")
+register_overload_handler(app)
 
-# Parameters for LBP
-METHOD = 'uniform'
-P = 8
-R = 1
+def check_upload(contents: bytes):
+    # Decode + analysis in one pool task, so only raw bytes cross the process boundary
+    image = DecodedImage.from_bytes(contents)
+    return check_liveness(image.gray)
 
-def check_liveness(image_np):
-    # 1. Texture Analysis using LBP
-    # Real faces/irises have different texture micro-patterns than screens (pixels) or paper (grain)
-    gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
-    lbp = local_binary_pattern(gray, P, R, METHOD)
-    
-    # Calculate histogram of LBP
-    n_bins = int(lbp.max() + 1)
-    hist, _ = np.histogram(lbp, density=True, bins=n_bins, range=(0, n_bins))
-    
-    # Simple heuristic for demo:
-    # Screens often have more uniform patterns or aliasing
-    # Real skin has more entropy in specific bins
-    # We'll simulate a "Liveness Score" based on image sharpness and entropy
-    
-    # Sharpness (Laplacian variance)
-    laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-    
-    # Fake/screen usually has lower sharpness due to recapture, or Moire patterns
-    # Let's combine metrics
-    
-    score = min(100, max(0, (laplacian_var / 5.0) + (np.entropy(hist) * 10))) # Pseudo-logic
-    
-    # For demo randomness
-    is_live = laplacian_var > 100 # Threshold
-    confidence = min(0.99, laplacian_var / 500.0)
-    
-    return is_live, confidence
+@app.on_event("startup")
+def start_executor():
+    executor.start()
+
+@app.on_event("shutdown")
+def stop_executor():
+    executor.shutdown()
 
 @app.post("/check")
 async def detect_liveness(file: UploadFile = File(...)):
     try:
         contents = await file.read()
-        image = Image.open(io.BytesIO(contents))
-        image_np = np.array(image)
-        
-        is_live, confidence = check_liveness(image_np)
+        is_live, confidence = await executor.run(check_upload, contents)
         
         logger.info(f"Liveness Check: Live={is_live}, Conf={confidence:.2f}")
         
@@ -61,12 +59,70 @@ async def detect_liveness(file: UploadFile = File(...)):
         return {
             "is_live": is_live,
             "confidence": confidence,
-            "checks": ["texture_lbp", "laplacian_variance"]
+            "checks": ["texture_lbp_multiscale", "fft_moire", "laplacian_variance"]
         }
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Overloaded:
+        raise
     except Exception as e:
         logger.error(f"Liveness error: {e}")
         raise HTTPException(status_code=500, detail="Processing failed")
 
+@app.websocket("/stream")
+async def stream_liveness(websocket: WebSocket):
+    """
+    Video liveness over a WebSocket. The client sends one encoded frame per
+    binary message (or the text message "end" to force a decision); the
+    server answers each frame with a progress message and sends a decision
+    as soon as it is confident, then closes.
+    """
+    await websocket.accept()
+    state = TemporalLiveness(min_frames=config.STREAM_MIN_FRAMES, max_frames=config.STREAM_MAX_FRAMES,
+                             accept=config.STREAM_ACCEPT, reject=config.STREAM_REJECT)
+    previous = None   # last frame's thumbnail, the only image state kept per stream
+    decision = None
+    try:
+        while decision is None:
+            message = await asyncio.wait_for(websocket.receive(), config.STREAM_IDLE_TIMEOUT_S)
+            if message["type"] == "websocket.disconnect":
+                return
+            frame = message.get("bytes")
+            if frame is None:
+                if message.get("text") == "end":
+                    decision = state.decide("client_end")
+                continue
+            if len(frame) > config.STREAM_MAX_FRAME_BYTES:
+                await websocket.send_json({"type": "error", "detail": "Frame too large"})
+                continue
+            try:
+                previous, stats = await executor.run(analyze_frame, frame, previous)
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            decision = state.update(stats)
+            if decision is None:
+                await websocket.send_json({"type": "progress", "frames": state.frames,
+                                           "confidence": round(state.confidence, 4)})
+
+        logger.info(f"Stream Liveness: Live={decision['is_live']}, Conf={decision['confidence']:.2f}, "
+                    f"frames={decision['frames']} ({decision['reason']})")
+        if not decision["is_live"]:
+            logger.warning("SPOOFING ATTEMPT DETECTED (stream)")
+        await websocket.send_json({"type": "decision", **decision})
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except asyncio.TimeoutError:
+        await websocket.close(code=1001)
+    except Overloaded as e:
+        await websocket.send_json({"type": "error", "detail": "Service busy, retry later",
+                                   "retry_after": e.retry_after})
+        await websocket.close(code=1013)
+    except Exception as e:
+        logger.error(f"Stream liveness error: {e}")
+        await websocket.close(code=1011)
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "liveness-engine"}
+    return {"status": "healthy", "service": "liveness-engine", "executor": executor.stats()}
@@ -0,0 +1,167 @@
+import math
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from gabizap_common.imaging import DecodedImage
+from gabizap_common.liveness import check_liveness
+
+# Streaming (video) liveness.
+#
+# A clip is judged frame by frame without buffering it: each frame is
+# reduced to a small gray thumbnail plus a few numbers (FrameStats), and
+# TemporalLiveness folds those into running summaries. Only the previous
+# thumbnail is kept, for optical flow against the next frame.
+#
+# Evidence combines the single-frame classifier (mean log-odds over the
+# clip, which carries texture/moire cues) with three temporal cues a
+# still photo, print or replayed screen struggles to reproduce:
+#   - non-rigid motion: optical flow left after removing the global
+#     (median) flow. A hand-held photo moves rigidly, a static one not at all
+#   - pupil/blink activity: variation of the dark-pixel fraction in the
+#     central region (hippus, blinks)
+#   - sharpness trajectory: variation of log Laplacian variance (breathing,
+#     micro focus changes); a flat trajectory suggests a fixed surface
+# Each cue contributes a clipped log-ratio against a reference level, so a
+# single extreme cue cannot decide alone.
+
+FLOW_SIZE = (160, 120)          # (width, height) of the thumbnails
+DARK_LEVEL = 60                 # grey level below which a pixel counts as pupil/lash
+CENTRE = (slice(30, 90), slice(40, 120))
+
+# (weight, reference level) per temporal cue, in log-odds per unit of log-ratio
+MOTION_CUE = (0.8, 0.15)        # residual flow, px/frame at FLOW_SIZE
+PUPIL_CUE = (0.6, 0.004)        # std of the dark fraction
+SHARPNESS_CUE = (0.5, 0.03)     # std of log Laplacian variance
+CUE_CLIP = 3.0
+FRAME_LOGIT_CLIP = 6.0
+
+
+class FrameStats:
+    __slots__ = ("logit", "sharpness", "residual_flow", "global_flow", "dark_fraction")
+
+    def __init__(self, logit: float, sharpness: float, residual_flow: Optional[float],
+                 global_flow: Optional[float], dark_fraction: float):
+        self.logit = logit
+        self.sharpness = sharpness
+        self.residual_flow = residual_flow
+        self.global_flow = global_flow
+        self.dark_fraction = dark_fraction
+
+
+def analyze_frame(contents: bytes, previous: Optional[np.ndarray] = None):
+    """
+    Runs in a pool worker: decode one frame once, score it, and compare it
+    with the previous thumbnail. Returns (thumbnail, FrameStats); the caller
+    hands the thumbnail back with the next frame.
+    """
+    image = DecodedImage.from_bytes(contents)
+    gray = image.gray
+    _, confidence = check_liveness(gray)
+    confidence = min(max(confidence, 1e-6), 1 - 1e-6)
+    logit = math.log(confidence / (1 - confidence))
+
+    thumb = cv2.resize(gray, FLOW_SIZE, interpolation=cv2.INTER_AREA)
+    sharpness = math.log1p(cv2.Laplacian(thumb, cv2.CV_32F).var())
+    dark_fraction = float((thumb[CENTRE] < DARK_LEVEL).mean())
+
+    residual = global_flow = None
+    if previous is not None and previous.shape == thumb.shape:
+        flow = cv2.calcOpticalFlowFarneback(previous, thumb, None, 0.5, 2, 9, 2, 5, 1.1, 0)
+        median = np.median(flow.reshape(-1, 2), axis=0)
+        global_flow = float(np.hypot(*median))
+        residual = float(np.hypot(flow[..., 0] - median[0], flow[..., 1] - median[1]).mean())
+    return thumb, FrameStats(logit, sharpness, residual, global_flow, dark_fraction)
+
+
+class RunningStat:
+    """Welford mean/variance."""
+    __slots__ = ("n", "mean", "_m2")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x: float):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self._m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+
+def _cue(value: float, cue) -> float:
+    weight, reference = cue
+    return weight * min(CUE_CLIP, max(-CUE_CLIP, math.log((value + 1e-9) / reference)))
+
+
+class TemporalLiveness:
+    """
+    Rolling per-stream state. update() takes one frame's stats and returns
+    a decision dict as soon as the posterior leaves [reject, accept] (after
+    min_frames), or when max_frames is reached; otherwise None.
+    """
+
+    def __init__(self, min_frames: int = 4, max_frames: int = 60, accept: float = 0.95,
+                 reject: float = 0.05):
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        self.accept = accept
+        self.reject = reject
+        self.frames = 0
+        self.logits = RunningStat()
+        self.sharpness = RunningStat()
+        self.residual_flow = RunningStat()
+        self.dark_fraction = RunningStat()
+        self.decision: Optional[dict] = None
+
+    def evidence(self) -> dict:
+        """Log-odds contribution of each signal so far."""
+        terms = {"frames": max(-FRAME_LOGIT_CLIP, min(FRAME_LOGIT_CLIP, self.logits.mean))}
+        if self.residual_flow.n:
+            terms["motion"] = _cue(self.residual_flow.mean, MOTION_CUE)
+        if self.dark_fraction.n > 2:
+            terms["pupil"] = _cue(self.dark_fraction.std, PUPIL_CUE)
+        if self.sharpness.n > 2:
+            terms["sharpness"] = _cue(self.sharpness.std, SHARPNESS_CUE)
+        return terms
+
+    @property
+    def confidence(self) -> float:
+        total = sum(self.evidence().values()) if self.frames else 0.0
+        return 1.0 / (1.0 + math.exp(-total))
+
+    def update(self, stats: FrameStats) -> Optional[dict]:
+        if self.decision is not None:
+            return self.decision
+        self.frames += 1
+        self.logits.add(stats.logit)
+        self.sharpness.add(stats.sharpness)
+        self.dark_fraction.add(stats.dark_fraction)
+        if stats.residual_flow is not None:
+            self.residual_flow.add(stats.residual_flow)
+
+        confidence = self.confidence
+        if self.frames >= self.min_frames and not self.reject < confidence < self.accept:
+            return self.decide("early")
+        if self.frames >= self.max_frames:
+            return self.decide("max_frames")
+        return None
+
+    def decide(self, reason: str) -> dict:
+        """Final decision on the frames seen so far (also used when the client ends the stream)."""
+        confidence = self.confidence
+        self.decision = {
+            # Never accept on fewer frames than an early decision would need
+            "is_live": self.frames >= self.min_frames and confidence >= 0.5,
+            "confidence": confidence,
+            "frames": self.frames,
+            "reason": reason,
+            "evidence": {name: round(value, 3) for name, value in self.evidence().items()},
+        }
+        return self.decision
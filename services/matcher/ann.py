@@ -0,0 +1,216 @@
+import threading
+from typing import List, Optional
+
+import numpy as np
+
+from .gallery import top_k_indices
+
+
+class InvertedList:
+    """Growable int32 array of gallery rows belonging to one coarse cell."""
+
+    __slots__ = ("rows", "size")
+
+    def __init__(self):
+        self.rows = np.empty(16, dtype=np.int32)
+        self.size = 0
+
+    def append(self, row: int):
+        if self.size == self.rows.shape[0]:
+            grown = np.empty(max(16, 2 * self.size), dtype=np.int32)
+            grown[:self.size] = self.rows[:self.size]
+            self.rows = grown
+        self.rows[self.size] = row
+        self.size += 1
+
+    def replace(self, old: int, new: int):
+        pos = np.flatnonzero(self.rows[:self.size] == old)
+        if pos.size:
+            self.rows[pos[0]] = new
+
+    def discard(self, row: int):
+        pos = np.flatnonzero(self.rows[:self.size] == row)
+        if pos.size:
+            self.size -= 1
+            self.rows[pos[0]] = self.rows[self.size]
+
+    def view(self) -> np.ndarray:
+        return self.rows[:self.size]
+
+
+def spherical_kmeans(data: np.ndarray, n_clusters: int, n_iter: int = 10,
+                     seed: int = 0, chunk: int = 65536) -> np.ndarray:
+    """
+    Lloyd iterations on the unit sphere (assignment by max dot product,
+    centroids re-normalized). Returns a (n_clusters, dim) float32 matrix.
+    """
+    rng = np.random.default_rng(seed)
+    n = data.shape[0]
+    n_clusters = min(n_clusters, n)
+    centroids = data[rng.choice(n, size=n_clusters, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assign = assign_to_centroids(data, centroids, chunk)
+        counts = np.bincount(assign, minlength=n_clusters)
+        # Segment sums over points sorted by cell (much faster than np.add.at)
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        filled = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[filled] = np.add.reduceat(data[order], starts[filled], axis=0)
+
+        # Re-seed empty cells from random points so every list stays usable
+        empty = np.flatnonzero(counts == 0)
+        if empty.size:
+            sums[empty] = data[rng.choice(n, size=empty.size, replace=False)]
+
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+
+    return centroids
+
+
+def assign_to_centroids(data: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    out = np.empty(data.shape[0], dtype=np.int32)
+    for start in range(0, data.shape[0], chunk):
+        out[start:start + chunk] = np.argmax(data[start:start + chunk] @ centroids.T, axis=1)
+    return out
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate index over a TemplateGallery.
+
+    A coarse quantizer (spherical k-means) splits the gallery into n_lists
+    cells. A query only scores the gallery rows in its n_probe closest cells
+    (see TemplateGallery.search), using the same scoring as an exact scan.
+    Recall/latency knobs: n_lists (at train time) and n_probe (per query).
+
+    The index tracks gallery rows, so the gallery notifies it on every
+    upsert/remove (see TemplateGallery.attach_index).
+    """
+
+    def __init__(self, n_lists: int = 1024, n_probe: int = 8,
+                 train_sample: int = 100_000, n_iter: int = 10, seed: int = 0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_sample = train_sample
+        self.n_iter = n_iter
+        self.seed = seed
+
+        self.centroids: Optional[np.ndarray] = None
+        self.lists: List[InvertedList] = []
+        self._assign = np.empty(0, dtype=np.int32)
+        self._lock = threading.RLock()
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def empty_copy(self) -> "IVFIndex":
+        """An untrained index with the same parameters, for re-training off to the side."""
+        return IVFIndex(self.n_lists, self.n_probe, self.train_sample, self.n_iter, self.seed)
+
+    def train(self, vectors: np.ndarray):
+        """Fits the coarse quantizer and (re)builds every inverted list."""
+        n = vectors.shape[0]
+        if n == 0:
+            raise ValueError("Cannot train an IVF index on an empty gallery")
+
+        rng = np.random.default_rng(self.seed)
+        sample = vectors
+        if n > self.train_sample:
+            sample = vectors[np.sort(rng.choice(n, size=self.train_sample, replace=False))]
+
+        centroids = spherical_kmeans(sample, self.n_lists, self.n_iter, self.seed)
+        assign = assign_to_centroids(vectors, centroids)
+
+        lists = [InvertedList() for _ in range(centroids.shape[0])]
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(centroids.shape[0] + 1))
+        for cell, inv in enumerate(lists):
+            rows = order[bounds[cell]:bounds[cell + 1]].astype(np.int32)
+            inv.rows = np.concatenate([rows, np.empty(16, dtype=np.int32)])
+            inv.size = rows.shape[0]
+
+        with self._lock:
+            self.centroids = centroids
+            self.lists = lists
+            self._assign = assign
+
+    def export_state(self, n: int) -> dict:
+        """Arrays describing the trained index for the first n gallery rows."""
+        with self._lock:
+            sizes = np.array([inv.size for inv in self.lists], dtype=np.int64)
+            bounds = np.concatenate([[0], np.cumsum(sizes)])
+            order = np.concatenate([inv.view() for inv in self.lists]) if self.lists else np.empty(0)
+            return {
+                "centroids": self.centroids.copy(),
+                "assign": self._assign[:n].copy(),
+                "order": order.astype(np.int32),
+                "bounds": bounds,
+            }
+
+    def load_state(self, state: dict):
+        """
+        Restores export_state() output. Inverted lists are views into `order`,
+        so memory-mapped arrays are used in place until a list has to grow.
+        """
+        order, bounds = state["order"], state["bounds"]
+        lists = []
+        for cell in range(state["centroids"].shape[0]):
+            inv = InvertedList()
+            inv.rows = order[bounds[cell]:bounds[cell + 1]]
+            inv.size = inv.rows.shape[0]
+            lists.append(inv)
+        with self._lock:
+            self.centroids = np.asarray(state["centroids"])
+            self.lists = lists
+            self._assign = state["assign"]
+
+    # --- gallery hooks -------------------------------------------------
+
+    def on_upsert(self, rows: np.ndarray, vectors: np.ndarray):
+        with self._lock:
+            if not self.is_trained:
+                return
+            if rows.max(initial=-1) >= self._assign.shape[0]:
+                grown = np.full(max(rows.max() + 1, 2 * self._assign.shape[0]), -1, dtype=np.int32)
+                grown[:self._assign.shape[0]] = self._assign
+                self._assign = grown
+
+            cells = assign_to_centroids(vectors, self.centroids)
+            for row, cell in zip(rows, cells):
+                prev = self._assign[row]
+                if prev == cell:
+                    continue
+                if prev >= 0:
+                    self.lists[prev].discard(row)
+                self.lists[cell].append(row)
+                self._assign[row] = cell
+
+    def on_remove(self, row: int, last: int):
+        """Gallery row `row` was deleted and row `last` was moved into it."""
+        with self._lock:
+            if not self.is_trained:
+                return
+            cell = self._assign[row]
+            if cell >= 0:
+                self.lists[cell].discard(row)
+            if last != row:
+                moved_cell = self._assign[last]
+                if moved_cell >= 0:
+                    self.lists[moved_cell].replace(last, row)
+                self._assign[row] = moved_cell
+            self._assign[last] = -1
+
+    # --- search ---------------------------------------------------------
+
+    def candidates(self, query: np.ndarray, n_probe: Optional[int] = None) -> np.ndarray:
+        """Gallery rows in the n_probe cells closest to a normalized query."""
+        n_probe = min(n_probe or self.n_probe, len(self.lists))
+        with self._lock:
+            cells = top_k_indices(self.centroids @ query, n_probe)
+            parts = [self.lists[c].view() for c in cells]
+            return np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
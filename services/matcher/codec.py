@@ -0,0 +1,139 @@
+import json
+import struct
+from typing import Tuple
+
+import numpy as np
+
+# Versioned binary template encoding shared by Redis storage and the gallery.
+#
+#   header : magic "GZ" | version u8 | format u8 | dim u16      (6 bytes, LE)
+#   float32: dim * f32                                          (4 B/dim)
+#   int8   : scale f32 | dim * i8, value ~= code * scale        (1 B/dim)
+#   bits   : ceil(dim / 8) bytes of packed sign bits            (1 bit/dim)
+#   iris   : ceil(dim / 8) code bytes | same again for the mask  (2 bit/dim)
+#
+# "iris" holds a binary iris code and its validity mask (dim = code bits);
+# it is matched by Hamming distance, not cosine, so it has its own
+# encode/decode pair and is not one of the gallery FORMATS.
+#
+# Legacy templates (JSON text of Python floats) are still accepted by
+# decode_template so existing Redis data keeps loading.
+
+MAGIC = b"GZ"
+VERSION = 1
+HEADER = struct.Struct("<2sBBH")
+
+FORMAT_FLOAT32 = "float32"
+FORMAT_INT8 = "int8"
+FORMAT_BITS = "bits"
+FORMATS = (FORMAT_FLOAT32, FORMAT_INT8, FORMAT_BITS)
+_FORMAT_CODES = {name: code for code, name in enumerate(FORMATS)}
+_IRIS_CODE = 16   # outside FORMATS on purpose
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector scalar quantization. Returns (codes, scales)."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def pack_sign_bits(vectors: np.ndarray) -> np.ndarray:
+    """One bit per dimension (1 where the component is positive), packed big-endian."""
+    vectors = np.atleast_2d(np.asarray(vectors))
+    return np.packbits(vectors > 0, axis=1)
+
+
+def unpack_sign_bits(codes: np.ndarray, dim: int) -> np.ndarray:
+    """Inverse of pack_sign_bits as unit-norm +/-1 float32 vectors."""
+    bits = np.unpackbits(np.atleast_2d(codes), axis=1, count=dim)
+    return (bits.astype(np.float32) * 2.0 - 1.0) / np.sqrt(dim)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Per-element set-bit count for unsigned integer arrays."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words)
+    as_bytes = words.view(np.uint8).reshape(words.shape + (words.dtype.itemsize,))
+    return _POPCOUNT8[as_bytes].sum(axis=-1, dtype=np.uint32)
+
+
+def encode_template(vector, fmt: str = FORMAT_FLOAT32) -> bytes:
+    vec = np.asarray(vector, dtype=np.float32).ravel()
+    if fmt not in _FORMAT_CODES:
+        raise ValueError(f"Unknown template format: {fmt}")
+
+    header = HEADER.pack(MAGIC, VERSION, _FORMAT_CODES[fmt], vec.shape[0])
+    if fmt == FORMAT_FLOAT32:
+        return header + vec.astype("<f4").tobytes()
+    if fmt == FORMAT_INT8:
+        codes, scales = quantize_int8(vec)
+        return header + struct.pack("<f", scales[0]) + codes.tobytes()
+    return header + pack_sign_bits(vec).tobytes()
+
+
+def _payload_size(fmt: str, dim: int) -> int:
+    if fmt == FORMAT_FLOAT32:
+        return 4 * dim
+    if fmt == FORMAT_INT8:
+        return 4 + dim
+    return (dim + 7) // 8
+
+
+def decode_template(blob) -> np.ndarray:
+    """Decodes any supported template encoding to a float32 vector."""
+    if isinstance(blob, str):
+        blob = blob.encode()
+    if blob[:1] == b"[":
+        return np.asarray(json.loads(blob), dtype=np.float32)
+
+    if len(blob) < HEADER.size:
+        raise ValueError("Truncated template")
+    magic, version, code, dim = HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError("Not a template blob")
+    if version != VERSION:
+        raise ValueError(f"Unsupported template version {version}")
+    payload = memoryview(blob)[HEADER.size:]
+
+    fmt = FORMATS[code] if code < len(FORMATS) else None
+    if fmt is None:
+        raise ValueError(f"Unknown template format code {code}")
+    if len(payload) < _payload_size(fmt, dim):
+        raise ValueError("Truncated template")
+    if fmt == FORMAT_FLOAT32:
+        return np.frombuffer(payload, dtype="<f4", count=dim).astype(np.float32)
+    if fmt == FORMAT_INT8:
+        (scale,) = struct.unpack_from("<f", payload)
+        codes = np.frombuffer(payload, dtype=np.int8, count=dim, offset=4)
+        return codes.astype(np.float32) * scale
+    packed = np.frombuffer(payload, dtype=np.uint8, count=(dim + 7) // 8)
+    return unpack_sign_bits(packed, dim)[0]
+
+
+def encode_iris_code(code: bytes, mask: bytes) -> bytes:
+    if len(code) != len(mask):
+        raise ValueError("Iris code and mask differ in length")
+    if len(code) * 8 > 0xFFFF:
+        raise ValueError("Iris code too long")
+    return HEADER.pack(MAGIC, VERSION, _IRIS_CODE, len(code) * 8) + bytes(code) + bytes(mask)
+
+
+def decode_iris_code(blob: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """Returns (code, mask) as packed uint8 arrays."""
+    if len(blob) < HEADER.size:
+        raise ValueError("Truncated iris code")
+    magic, version, code, bits = HEADER.unpack_from(blob)
+    if magic != MAGIC or code != _IRIS_CODE:
+        raise ValueError("Not an iris code blob")
+    if version != VERSION:
+        raise ValueError(f"Unsupported template version {version}")
+    n = (bits + 7) // 8
+    if len(blob) != HEADER.size + 2 * n:
+        raise ValueError("Truncated iris code")
+    payload = np.frombuffer(blob, dtype=np.uint8, offset=HEADER.size)
+    return payload[:n], payload[n:]
@@ -0,0 +1,261 @@
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+from typing import Dict, List, Literal, Optional
+import asyncio
+import httpx
+from gabizap_common.config import BaseConfig
+from gabizap_common.logger import setup_logger
+from .sharding import HashRing, merge_nearest, merge_top_k, parse_shard_urls
+
+# Scatter-gather front for a sharded matcher.
+# Run N matcher shards (main.py with SHARD_NAME/SHARD_MEMBERS set) and one
+# coordinator, e.g. on one box:
+#   SHARD_NAME=shard-0 SHARD_MEMBERS=shard-0,shard-1 uvicorn main:app --port 8106
+#   SHARD_NAME=shard-1 SHARD_MEMBERS=shard-0,shard-1 uvicorn main:app --port 8107
+#   SHARD_URLS=shard-0=http://localhost:8106,shard-1=http://localhost:8107 \
+#       uvicorn coordinator:app --port 8016
+
+logger = setup_logger("matcher-coordinator")
+
+class Config(BaseConfig):
+    # "shard-0=http://matcher-0:8006,shard-1=http://matcher-1:8006"
+    SHARD_URLS: str
+    SHARD_TIMEOUT: float = 5.0
+    SHARD_MAX_CONNECTIONS: int = 100
+    # Same default as the shards' HAND_THRESHOLD
+    HAND_THRESHOLD: float = 0.10
+
+config = Config(SERVICE_NAME="matcher-coordinator")
+app = FastAPI(title="GABIZAP Matcher Coordinator")
+
+shard_urls: Dict[str, str] = parse_shard_urls(config.SHARD_URLS)
+ring = HashRing(list(shard_urls))
+client: Optional[httpx.AsyncClient] = None
+
+class MatchRequest(BaseModel):
+    embedding: List[float]
+    threshold: float = 0.85
+    top_k: int = 1
+    mode: Literal["exact", "ivf"] = "exact"
+    n_probe: Optional[int] = None
+
+class BatchMatchRequest(BaseModel):
+    embeddings: List[List[float]]
+    threshold: float = 0.85
+    top_k: int = 1
+
+class IrisCodeRegistration(BaseModel):
+    user_id: str
+    iris_code: str
+    iris_mask: str
+
+class IrisMatchRequest(BaseModel):
+    iris_code: str
+    iris_mask: str
+    threshold: float = 0.32
+    top_k: int = 1
+    max_shift: Optional[int] = None
+
+class HandRegistration(BaseModel):
+    user_id: str
+    descriptor: str
+
+class HandMatchRequest(BaseModel):
+    descriptor: str
+    threshold: Optional[float] = None
+    top_k: int = 1
+
+class FusionVerifyRequest(BaseModel):
+    user_id: str
+    iris_code: Optional[str] = None
+    iris_mask: Optional[str] = None
+    hand_descriptor: Optional[str] = None
+    max_shift: Optional[int] = None
+
+class RebalanceRequest(BaseModel):
+    # Full new membership as {name: url}
+    shards: Dict[str, str]
+
+@app.on_event("startup")
+async def open_client():
+    global client
+    client = httpx.AsyncClient(
+        timeout=config.SHARD_TIMEOUT,
+        limits=httpx.Limits(max_connections=config.SHARD_MAX_CONNECTIONS),
+    )
+
+@app.on_event("shutdown")
+async def close_client():
+    await client.aclose()
+
+def error_detail(resp: httpx.Response):
+    """A shard's error detail; proxies and crashed workers answer with plain text or HTML."""
+    if resp.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = resp.json()
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and "detail" in body:
+            return body["detail"]
+    return resp.text or resp.reason_phrase
+
+async def forward(user_id: str, path: str, **kwargs) -> dict:
+    """
+    POSTs to the shard owning user_id. Shards answer 421 for user_ids they
+    don't own, so per-user routes must go through the ring.
+    """
+    owner = ring.owner(user_id)
+    try:
+        resp = await client.post(f"{shard_urls[owner]}{path}", **kwargs)
+    except httpx.RequestError as exc:
+        logger.error(f"Shard {owner} unreachable: {exc}")
+        raise HTTPException(status_code=503, detail=f"Shard {owner} unavailable")
+    if resp.status_code != 200:
+        raise HTTPException(status_code=resp.status_code, detail=error_detail(resp))
+    return {**resp.json(), "shard": owner}
+
+async def scatter(payload: dict, path: str = "/shard/search",
+                  fields=("user_id", "score")) -> List[List[List[tuple]]]:
+    """POSTs payload to every shard's search path; returns per-shard hit lists."""
+    async def call(url):
+        resp = await client.post(f"{url}{path}", json=payload)
+        if resp.status_code == 400:
+            # Invalid probe (e.g. wrong dimension): the caller's fault, not the shard's
+            raise HTTPException(status_code=400, detail=error_detail(resp))
+        resp.raise_for_status()
+        return [[tuple(h[f] for f in fields) for h in hits] for hits in resp.json()["results"]]
+
+    names = list(shard_urls)
+    results = await asyncio.gather(*(call(shard_urls[n]) for n in names), return_exceptions=True)
+    for res in results:
+        if isinstance(res, HTTPException):
+            raise res
+    failed = [n for n, res in zip(names, results) if isinstance(res, Exception)]
+    if failed:
+        # A missing shard could turn a genuine match into a false reject
+        logger.error(f"Shard(s) unavailable during scatter: {failed}")
+        raise HTTPException(status_code=503, detail=f"Shards unavailable: {', '.join(failed)}")
+    return results
+
+def to_result(hits, threshold: float, top_k: int) -> dict:
+    if not hits:
+        return {"match": False, "score": -1.0}
+    best_user, best_score = hits[0]
+    result = {"match": best_score >= threshold, "score": best_score}
+    if result["match"]:
+        result["user_id"] = best_user
+    if top_k > 1:
+        result["candidates"] = [{"user_id": u, "score": s} for u, s in hits]
+    return result
+
+@app.post("/register")
+async def register_template(user_id: str, embedding: List[float]):
+    return await forward(user_id, "/register", params={"user_id": user_id}, json=embedding)
+
+@app.post("/match")
+async def match_identity(req: MatchRequest):
+    k = max(1, req.top_k)
+    partials = await scatter({"embeddings": [req.embedding], "top_k": k,
+                              "mode": req.mode, "n_probe": req.n_probe})
+    hits = merge_top_k((shard[0] for shard in partials), k)
+    return to_result(hits, req.threshold, req.top_k)
+
+@app.post("/match/batch")
+async def match_batch(req: BatchMatchRequest):
+    if not req.embeddings:
+        raise HTTPException(status_code=400, detail="No embeddings supplied")
+    k = max(1, req.top_k)
+    partials = await scatter({"embeddings": req.embeddings, "top_k": k})
+    results = []
+    for i in range(len(req.embeddings)):
+        hits = merge_top_k((shard[i] for shard in partials), k)
+        results.append(to_result(hits, req.threshold, req.top_k))
+    return {"results": results}
+
+@app.post("/register/iris")
+async def register_iris_code(req: IrisCodeRegistration):
+    return await forward(req.user_id, "/register/iris", json=req.model_dump())
+
+@app.post("/match/iris")
+async def match_iris_code(req: IrisMatchRequest):
+    k = max(1, req.top_k)
+    # Shards only return codes within threshold, so any merged hit is a match
+    partials = await scatter({**req.model_dump(), "top_k": k}, path="/shard/search/iris",
+                             fields=("user_id", "distance", "shift"))
+    hits = merge_nearest((shard[0] for shard in partials), k)
+    if not hits:
+        return {"match": False, "distance": None}
+    best_user, best_distance, best_shift = hits[0]
+    result = {"match": True, "user_id": best_user, "distance": best_distance, "shift": best_shift}
+    if req.top_k > 1:
+        result["candidates"] = [{"user_id": u, "distance": d, "shift": sh} for u, d, sh in hits]
+    return result
+
+@app.post("/register/hand")
+async def register_hand(req: HandRegistration):
+    return await forward(req.user_id, "/register/hand", json=req.model_dump())
+
+@app.post("/match/hand")
+async def match_hand(req: HandMatchRequest):
+    k = max(1, req.top_k)
+    partials = await scatter({"descriptor": req.descriptor, "top_k": k}, path="/shard/search/hand",
+                             fields=("user_id", "distance"))
+    hits = merge_nearest((shard[0] for shard in partials), k)
+    if not hits:
+        return {"match": False, "distance": None}
+    threshold = config.HAND_THRESHOLD if req.threshold is None else req.threshold
+    best_user, best_distance = hits[0]
+    result = {"match": best_distance <= threshold, "distance": best_distance}
+    if result["match"]:
+        result["user_id"] = best_user
+    if req.top_k > 1:
+        result["candidates"] = [{"user_id": u, "distance": d} for u, d in hits]
+    return result
+
+@app.post("/verify/fusion")
+async def verify_fusion(req: FusionVerifyRequest):
+    # 1:1 against the claimed user's templates, which live on its owner only
+    return await forward(req.user_id, "/verify/fusion", json=req.model_dump())
+
+@app.post("/shards/rebalance")
+async def rebalance(req: RebalanceRequest):
+    """
+    Switches to a new shard set in two phases so no template is ever missing
+    from the shards being queried:
+      1. every new member adopts the new ring and loads the templates it now
+         owns from Redis (nothing is evicted yet);
+      2. routing flips to the new set, then every old and new shard evicts
+         the templates it no longer owns.
+    """
+    global shard_urls, ring
+    if not req.shards:
+        raise HTTPException(status_code=400, detail="Empty shard set")
+
+    new_urls = {name: url.rstrip("/") for name, url in req.shards.items()}
+    new_ring = HashRing(list(new_urls))
+    targets = {**shard_urls, **new_urls}
+
+    async def notify(names, evict):
+        async def call(url):
+            resp = await client.post(f"{url}/shard/membership", timeout=None,
+                                     json={"members": new_ring.members, "evict": evict})
+            resp.raise_for_status()
+            return resp.json()
+
+        results = await asyncio.gather(*(call(targets[n]) for n in names), return_exceptions=True)
+        for name, res in zip(names, results):
+            if isinstance(res, Exception):
+                logger.error(f"Rebalance failed on {name}: {res}")
+                raise HTTPException(status_code=502, detail=f"Rebalance failed on shard {name}")
+        return dict(zip(names, results))
+
+    await notify(list(new_urls), evict=False)
+    shard_urls, ring = new_urls, new_ring
+    report = await notify(list(targets), evict=True)
+
+    logger.info(f"Matcher shards rebalanced: {ring.members}")
+    return {"members": ring.members, "shards": report}
+
+@app.get("/health")
+async def health_check():
+    return {"status": "healthy", "service": "matcher-coordinator", "shards": sorted(shard_urls)}
@@ -0,0 +1,49 @@
+import math
+from typing import Dict, Optional, Tuple
+
+# Score-level fusion of per-modality match distances for one identity.
+#
+# Each modality has its own distance scale (fractional Hamming distance for
+# iris codes, palm-relative Euclidean distance for hand geometry), so each
+# distance is first z-normalized against that modality's impostor
+# distribution: how many impostor standard deviations it lies below the
+# impostor mean. Impostor scores are the well-characterized side (a
+# different person's iris code sits near HD 0.46 whatever the capture), and
+# with this scale a score means the same false-accept risk in any modality.
+#
+# The fused score is sum(w * z) / sqrt(sum(w^2)): for independent modalities
+# an impostor's fused score is again ~N(0, 1), so one threshold keeps its
+# meaning whichever modalities a probe supplies. Weights should follow how
+# well each modality separates genuine from impostor (d'); the default
+# gives iris, the far stronger modality, most of the say.
+
+MODALITIES = ("iris", "hand")
+
+
+class FusionPolicy:
+    def __init__(self, impostor: Dict[str, Tuple[float, float]], weights: Optional[Dict[str, float]] = None,
+                 threshold: float = 3.0):
+        if set(impostor) != set(MODALITIES):
+            raise ValueError(f"Impostor statistics required for {', '.join(MODALITIES)}")
+        if any(std <= 0 for _, std in impostor.values()):
+            raise ValueError("Impostor standard deviations must be positive")
+        self.impostor = dict(impostor)
+        self.weights = {m: 1.0 for m in MODALITIES}
+        self.weights.update(weights or {})
+        self.threshold = threshold
+
+    def normalize(self, modality: str, distance: float) -> float:
+        mean, std = self.impostor[modality]
+        return (mean - distance) / std
+
+    def fuse(self, distances: Dict[str, float]) -> float:
+        """Fused z-score over the modalities supplied; higher is more likely genuine."""
+        if not distances:
+            raise ValueError("No modality to fuse")
+        norm = math.sqrt(sum(self.weights[m] ** 2 for m in distances))
+        if norm == 0:
+            raise ValueError("Fusion weights of the supplied modalities are all zero")
+        return sum(self.weights[m] * self.normalize(m, d) for m, d in distances.items()) / norm
+
+    def is_match(self, score: float) -> bool:
+        return score >= self.threshold
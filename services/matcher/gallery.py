@@ -0,0 +1,523 @@
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .codec import (FORMAT_BITS, FORMAT_FLOAT32, FORMAT_INT8, pack_sign_bits, popcount,
+                    quantize_int8, unpack_sign_bits)
+
+INT8_CHUNK = 1024
+
+
+class Float32Store:
+    """Unit-norm float32 rows; score = exact cosine."""
+
+    name = FORMAT_FLOAT32
+    block_rows = 65536
+    array_names = ("data",)
+
+    def __init__(self, dim: int, capacity: int):
+        self.dim = dim
+        self.data = np.zeros((capacity, dim), dtype=np.float32)
+
+    @property
+    def capacity(self) -> int:
+        return self.data.shape[0]
+
+    def grow(self, capacity: int, live: int):
+        grown = np.zeros((capacity, self.dim), dtype=np.float32)
+        grown[:live] = self.data[:live]
+        self.data = grown
+
+    def write(self, rows: np.ndarray, vectors: np.ndarray):
+        self.data[rows] = vectors
+
+    def move(self, src: int, dst: int):
+        self.data[dst] = self.data[src]
+
+    def scores(self, query: np.ndarray, n: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        block = self.data[:n] if rows is None else self.data[rows]
+        return block @ query
+
+    def block_scores(self, queries: np.ndarray, start: int, stop: int) -> np.ndarray:
+        return queries @ self.data[start:stop].T
+
+    def vectors(self, start: int, stop: int) -> np.ndarray:
+        return self.data[start:stop]
+
+    def nbytes(self, n: int) -> int:
+        return n * self.data.itemsize * self.dim
+
+
+class Int8Store:
+    """
+    Per-vector int8 codes plus 1/||code||; score = cosine against the
+    de-quantized template, computed in small float32 blocks.
+    """
+
+    name = FORMAT_INT8
+    block_rows = 8192
+    array_names = ("codes", "inv_norms")
+
+    def __init__(self, dim: int, capacity: int):
+        self.dim = dim
+        self.codes = np.zeros((capacity, dim), dtype=np.int8)
+        self.inv_norms = np.zeros(capacity, dtype=np.float32)
+
+    @property
+    def capacity(self) -> int:
+        return self.codes.shape[0]
+
+    def grow(self, capacity: int, live: int):
+        codes = np.zeros((capacity, self.dim), dtype=np.int8)
+        codes[:live] = self.codes[:live]
+        inv_norms = np.zeros(capacity, dtype=np.float32)
+        inv_norms[:live] = self.inv_norms[:live]
+        self.codes, self.inv_norms = codes, inv_norms
+
+    def write(self, rows: np.ndarray, vectors: np.ndarray):
+        codes, _ = quantize_int8(vectors)
+        self.codes[rows] = codes
+        norms = np.linalg.norm(codes.astype(np.float32), axis=1)
+        norms[norms == 0] = 1.0
+        self.inv_norms[rows] = 1.0 / norms
+
+    def move(self, src: int, dst: int):
+        self.codes[dst] = self.codes[src]
+        self.inv_norms[dst] = self.inv_norms[src]
+
+    def scores(self, query: np.ndarray, n: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        if rows is not None:
+            return (self.codes[rows].astype(np.float32) @ query) * self.inv_norms[rows]
+        # Widen small cache-resident blocks into a reused buffer rather than
+        # materializing a float32 copy of the whole gallery
+        out = np.empty(n, dtype=np.float32)
+        buf = np.empty((min(n, INT8_CHUNK), self.dim), dtype=np.float32)
+        for start in range(0, n, INT8_CHUNK):
+            stop = min(n, start + INT8_CHUNK)
+            block = buf[:stop - start]
+            block[...] = self.codes[start:stop]
+            np.matmul(block, query, out=out[start:stop])
+        return out * self.inv_norms[:n]
+
+    def block_scores(self, queries: np.ndarray, start: int, stop: int) -> np.ndarray:
+        block = self.codes[start:stop].astype(np.float32)
+        return (queries @ block.T) * self.inv_norms[start:stop]
+
+    def vectors(self, start: int, stop: int) -> np.ndarray:
+        return self.codes[start:stop].astype(np.float32) * self.inv_norms[start:stop, None]
+
+    def nbytes(self, n: int) -> int:
+        return n * (self.dim + self.inv_norms.itemsize)
+
+
+class BitStore:
+    """
+    Packed sign bits; score = 1 - 2 * fractional Hamming distance, i.e. the
+    agreement between sign patterns mapped onto the cosine range [-1, 1].
+    """
+
+    name = FORMAT_BITS
+    block_rows = 2048
+    array_names = ("codes",)
+
+    def __init__(self, dim: int, capacity: int):
+        self.dim = dim
+        self.n_bytes = (dim + 7) // 8
+        # Pad rows to whole uint64 words so XOR/popcount runs 8 bytes at a time
+        self.n_words = (self.n_bytes + 7) // 8
+        self.codes = np.zeros((capacity, self.n_words), dtype=np.uint64)
+
+    @property
+    def capacity(self) -> int:
+        return self.codes.shape[0]
+
+    def grow(self, capacity: int, live: int):
+        codes = np.zeros((capacity, self.n_words), dtype=np.uint64)
+        codes[:live] = self.codes[:live]
+        self.codes = codes
+
+    def pack(self, vectors: np.ndarray) -> np.ndarray:
+        packed = np.zeros((vectors.shape[0], self.n_words * 8), dtype=np.uint8)
+        packed[:, :self.n_bytes] = pack_sign_bits(vectors)
+        return packed.view(np.uint64)
+
+    def write(self, rows: np.ndarray, vectors: np.ndarray):
+        self.codes[rows] = self.pack(vectors)
+
+    def move(self, src: int, dst: int):
+        self.codes[dst] = self.codes[src]
+
+    def hamming(self, query_words: np.ndarray, n: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        block = self.codes[:n] if rows is None else self.codes[rows]
+        return popcount(block ^ query_words).sum(axis=1, dtype=np.int32)
+
+    def scores(self, query: np.ndarray, n: int, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        dist = self.hamming(self.pack(query[None, :])[0], n, rows)
+        return (1.0 - 2.0 * dist.astype(np.float32) / self.dim).astype(np.float32)
+
+    def block_scores(self, queries: np.ndarray, start: int, stop: int) -> np.ndarray:
+        words = self.pack(queries)
+        dist = popcount(words[:, None, :] ^ self.codes[None, start:stop]).sum(axis=2, dtype=np.int32)
+        return (1.0 - 2.0 * dist.astype(np.float32) / self.dim).astype(np.float32)
+
+    def vectors(self, start: int, stop: int) -> np.ndarray:
+        packed = self.codes[start:stop].view(np.uint8)[:, :self.n_bytes]
+        return unpack_sign_bits(packed, self.dim)
+
+    def nbytes(self, n: int) -> int:
+        return n * self.n_words * 8
+
+
+STORES = {store.name: store for store in (Float32Store, Int8Store, BitStore)}
+
+
+class IdTable:
+    """
+    Row -> user_id mapping with a lazily built reverse index.
+
+    It can be backed by a packed fixed-width byte array (e.g. memory-mapped
+    from a snapshot); the Python list and dict are only materialized on the
+    first mutation or reverse lookup, so a warm start does not pay for
+    building millions of strings before it can serve matches.
+    """
+
+    def __init__(self, ids: Sequence[str] = (), packed: Optional[np.ndarray] = None):
+        self._packed = packed
+        self._list: Optional[List[str]] = None if packed is not None else list(ids)
+        self._rows: Optional[Dict[str, int]] = None
+
+    def __len__(self):
+        return len(self._list) if self._list is not None else self._packed.shape[0]
+
+    def __getitem__(self, row: int) -> str:
+        if self._list is not None:
+            return self._list[row]
+        return self._packed[row].decode()
+
+    def _materialize(self) -> List[str]:
+        if self._list is None:
+            self._list = [b.decode() for b in self._packed.tolist()]
+            self._packed = None
+        return self._list
+
+    def _index(self) -> Dict[str, int]:
+        if self._rows is None:
+            self._rows = {user_id: row for row, user_id in enumerate(self._materialize())}
+        return self._rows
+
+    def row_of(self, user_id: str) -> Optional[int]:
+        return self._index().get(user_id)
+
+    def append(self, user_id: str) -> int:
+        rows = self._index()
+        row = len(self._list)
+        self._list.append(user_id)
+        rows[user_id] = row
+        return row
+
+    def swap_remove(self, user_id: str) -> Optional[Tuple[int, int]]:
+        """Removes user_id by moving the last id into its row; returns (row, last)."""
+        rows = self._index()
+        row = rows.pop(user_id, None)
+        if row is None:
+            return None
+        last = len(self._list) - 1
+        if row != last:
+            moved = self._list[last]
+            self._list[row] = moved
+            rows[moved] = row
+        self._list.pop()
+        return row, last
+
+    def tolist(self) -> List[str]:
+        return list(self._materialize())
+
+    def packed(self) -> np.ndarray:
+        """Fixed-width UTF-8 byte array of all ids (the snapshot form)."""
+        if self._list is None:
+            return self._packed
+        return np.array([u.encode() for u in self._list], dtype=np.bytes_)
+
+
+class TemplateGallery:
+    """
+    In-memory gallery of enrolled templates.
+
+    Templates are L2-normalized and kept in one contiguous row store so that a
+    1:N match is a single vectorized scoring pass followed by a top-k partial
+    sort, instead of a Redis SCAN + JSON decode of every template on each
+    request. The store format ("float32", "int8" or "bits") trades memory for
+    score precision; matching runs directly on the stored codes.
+    """
+
+    def __init__(self, dim: int = 512, initial_capacity: int = 1024, fmt: str = FORMAT_FLOAT32):
+        if fmt not in STORES:
+            raise ValueError(f"Unknown gallery format: {fmt}")
+        self.dim = dim
+        self.fmt = fmt
+        self._store = STORES[fmt](dim, max(1, initial_capacity))
+        self._ids = IdTable()
+        self._lock = threading.RLock()
+        self.index = None
+        # One training at a time; changes made while it runs, replayed onto the new index
+        self._train_lock = threading.Lock()
+        self._changes: Optional[List[tuple]] = None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, user_id: str):
+        with self._lock:
+            return self._ids.row_of(user_id) is not None
+
+    @property
+    def ids(self) -> List[str]:
+        """Copy of all enrolled user_ids in row order."""
+        with self._lock:
+            return self._ids.tolist()
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes used by the populated template rows."""
+        return self._store.nbytes(len(self._ids))
+
+    def vectors(self) -> np.ndarray:
+        """Float32 view (de-quantized for compact formats) of all templates."""
+        with self._lock:
+            return self._store.vectors(0, len(self._ids))
+
+    def attach_index(self, index):
+        """
+        Attaches an approximate index (e.g. IVFIndex) that is kept in sync with
+        every upsert/remove and used by search(mode="ivf").
+        """
+        with self._lock:
+            self.index = index
+
+    def train_index(self):
+        """
+        Re-trains the attached index. Clustering runs on a copy of the vectors
+        without holding the gallery lock, so matches and registrations go on
+        against the current index meanwhile; their upserts/removes are
+        replayed onto the new index before it is swapped in.
+        """
+        with self._train_lock:
+            with self._lock:
+                if self.index is None:
+                    raise ValueError("No index attached")
+                current = self.index
+                vectors = np.array(self._store.vectors(0, len(self._ids)))
+                self._changes = []
+            try:
+                index = current.empty_copy()
+                index.train(vectors)
+            except BaseException:
+                with self._lock:
+                    self._changes = None
+                raise
+            with self._lock:
+                changes, self._changes = self._changes, None
+                for change in changes:
+                    if change[0] == "upsert":
+                        index.on_upsert(*change[1:])
+                    else:
+                        index.on_remove(*change[1:])
+                # Detached or replaced while training: keep that one
+                if self.index is current:
+                    self.index = index
+
+    def export_state(self):
+        """
+        Point-in-time copy of the gallery (and trained index) as (meta, arrays),
+        taken under the lock so callers can persist it without blocking matches.
+        """
+        with self._lock:
+            n = len(self._ids)
+            arrays = {f"store.{name}": np.array(getattr(self._store, name)[:n])
+                      for name in self._store.array_names}
+            arrays["ids"] = np.array(self._ids.packed())
+            if self.index is not None and self.index.is_trained:
+                arrays.update({f"ivf.{k}": v for k, v in self.index.export_state(n).items()})
+            return {"dim": self.dim, "fmt": self.fmt, "count": n}, arrays
+
+    @classmethod
+    def from_state(cls, meta: dict, arrays: Dict[str, np.ndarray], index=None) -> "TemplateGallery":
+        """
+        Rebuilds a gallery around existing arrays (e.g. copy-on-write memory
+        maps). Store arrays may hold spare rows beyond meta["count"].
+        """
+        gallery = cls(dim=meta["dim"], initial_capacity=1, fmt=meta["fmt"])
+        for name in gallery._store.array_names:
+            setattr(gallery._store, name, arrays[f"store.{name}"])
+        gallery._ids = IdTable(packed=arrays["ids"][:meta["count"]])
+        if index is not None:
+            ivf = {k[4:]: v for k, v in arrays.items() if k.startswith("ivf.")}
+            if ivf:
+                index.load_state(ivf)
+            gallery.index = index
+        return gallery
+
+    def normalize(self, vectors) -> np.ndarray:
+        """
+        Casts to float32 and L2-normalizes row-wise.
+        Raises ValueError on dimension mismatch or zero vectors.
+        """
+        arr = np.asarray(vectors, dtype=np.float32)
+        if arr.ndim == 1:
+            arr = arr[None, :]
+        if arr.ndim != 2 or arr.shape[1] != self.dim:
+            raise ValueError(f"Expected embeddings of dimension {self.dim}")
+
+        norms = np.linalg.norm(arr, axis=1, keepdims=True)
+        if np.any(norms == 0) or not np.all(np.isfinite(norms)):
+            raise ValueError("Invalid embedding vector")
+        return arr / norms
+
+    def _reserve(self, size: int):
+        capacity = self._store.capacity
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        self._store.grow(capacity, len(self._ids))
+
+    def upsert(self, user_id: str, embedding: Sequence[float]):
+        self.upsert_many([user_id], [embedding])
+
+    def upsert_many(self, user_ids: Sequence[str], embeddings):
+        vectors = self.normalize(embeddings)
+        if len(user_ids) != vectors.shape[0]:
+            raise ValueError("user_ids and embeddings length mismatch")
+
+        with self._lock:
+            self._reserve(len(self._ids) + len(user_ids))
+            rows = np.empty(len(user_ids), dtype=np.int64)
+            for i, user_id in enumerate(user_ids):
+                row = self._ids.row_of(user_id)
+                if row is None:
+                    row = self._ids.append(user_id)
+                rows[i] = row
+            self._store.write(rows, vectors)
+            if self.index is not None:
+                self.index.on_upsert(rows, vectors)
+            if self._changes is not None:
+                self._changes.append(("upsert", rows, vectors))
+
+    def remove(self, user_id: str) -> bool:
+        with self._lock:
+            removed = self._ids.swap_remove(user_id)
+            if removed is None:
+                return False
+            # Swap the last row into the hole to keep the store contiguous
+            row, last = removed
+            if row != last:
+                self._store.move(last, row)
+            if self.index is not None:
+                self.index.on_remove(row, last)
+            if self._changes is not None:
+                self._changes.append(("remove", row, last))
+            return True
+
+    def search(self, embedding: Sequence[float], k: int = 1, mode: str = "exact",
+               n_probe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Returns up to k (user_id, score) pairs, best first.
+
+        mode="exact" scores every template; mode="ivf" only scores the cells
+        probed by the attached index and falls back to exact until it is trained.
+        """
+        query = self.normalize(embedding)[0]
+
+        with self._lock:
+            n = len(self._ids)
+            if n == 0:
+                return []
+            if mode == "ivf" and self.index is not None and self.index.is_trained:
+                rows = self.index.candidates(query, n_probe)
+                if rows.size == 0:
+                    return []
+                scores = self._store.scores(query, n, rows)
+                top = top_k_indices(scores, k)
+                return [(self._ids[rows[i]], float(scores[i])) for i in top]
+            scores = self._store.scores(query, n)
+            top = top_k_indices(scores, k)
+            return [(self._ids[i], float(scores[i])) for i in top]
+
+    def search_many(self, embeddings, k: int = 1) -> List[List[Tuple[str, float]]]:
+        """
+        Batch 1:N search. Scores all probes against one gallery block at a time
+        (a matrix-matrix product) and merges a running per-probe top-k, so the
+        score buffer is bounded by probes x block rows rather than the gallery size.
+        """
+        queries = self.normalize(embeddings)
+        m = queries.shape[0]
+
+        with self._lock:
+            n = len(self._ids)
+            if n == 0:
+                return [[] for _ in range(m)]
+            k = max(1, min(k, n))
+            best_scores = np.full((m, 0), -np.inf, dtype=np.float32)
+            best_rows = np.zeros((m, 0), dtype=np.int64)
+            step = self._store.block_rows
+            for start in range(0, n, step):
+                stop = min(n, start + step)
+                scores = self._store.block_scores(queries, start, stop)
+                best_scores = np.concatenate([best_scores, scores], axis=1)
+                best_rows = np.concatenate([best_rows, np.broadcast_to(
+                    np.arange(start, stop), (m, stop - start))], axis=1)
+                if best_scores.shape[1] > k:
+                    keep = np.argpartition(best_scores, -k, axis=1)[:, -k:]
+                    best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                    best_rows = np.take_along_axis(best_rows, keep, axis=1)
+
+            order = np.argsort(-best_scores, axis=1, kind="stable")
+            best_scores = np.take_along_axis(best_scores, order, axis=1)
+            best_rows = np.take_along_axis(best_rows, order, axis=1)
+            return [[(self._ids[r], float(sc)) for r, sc in zip(rows, scores)]
+                    for rows, scores in zip(best_rows, best_scores)]
+
+    def iter_duplicates(self, threshold: float, block: int = 4096):
+        """
+        Yields (pairs, done, total) per block of the gallery where pairs is a
+        list of (user_a, user_b, score) with score >= threshold. Each block is
+        compared to itself and every later block (upper triangle only), so peak
+        memory is one block x block score matrix. The lock is held per block
+        pair only; concurrent enrollment changes are picked up best-effort.
+        """
+        total = len(self._ids)
+        for i in range(0, total, block):
+            found = []
+            with self._lock:
+                n = len(self._ids)
+                if i >= n:
+                    break
+                i_stop = min(n, i + block)
+                queries = np.array(self._store.vectors(i, i_stop), dtype=np.float32)
+
+            for j in range(i, total, block):
+                with self._lock:
+                    n = len(self._ids)
+                    if j >= n:
+                        break
+                    j_stop = min(n, j + block)
+                    scores = self._store.block_scores(queries, j, j_stop)
+                    if i == j:
+                        # Only count each pair once and skip self-matches
+                        scores[np.tri(*scores.shape, dtype=bool)] = -np.inf
+                    qi, gj = np.nonzero(scores >= threshold)
+                    found.extend((self._ids[i + a], self._ids[j + b], float(scores[a, b]))
+                                 for a, b in zip(qi, gj))
+            yield found, min(i + block, total), total
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, using a partial sort."""
+    n = scores.shape[0]
+    k = max(1, min(k, n))
+    if k < n:
+        candidates = np.argpartition(scores, n - k)[n - k:]
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
@@ -0,0 +1,120 @@
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .gallery import IdTable, top_k_indices
+
+
+class HandGallery:
+    """
+    In-memory gallery of hand geometry descriptors (gabizap_common.handgeo),
+    matched by Euclidean distance.
+
+    Descriptors are not unit vectors (the palm-relative lengths are the
+    signal), so cosine would discard information. Rows are float32 with their
+    squared norms cached, so a 1:N search is one matrix-vector product:
+    |g - q|^2 = |g|^2 - 2 g.q + |q|^2.
+    """
+
+    def __init__(self, dim: int, initial_capacity: int = 1024):
+        self.dim = dim
+        capacity = max(1, initial_capacity)
+        self.data = np.zeros((capacity, dim), dtype=np.float32)
+        self.sq_norms = np.zeros(capacity, dtype=np.float32)
+        self._ids = IdTable()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, user_id: str):
+        with self._lock:
+            return self._ids.row_of(user_id) is not None
+
+    @property
+    def ids(self) -> List[str]:
+        with self._lock:
+            return self._ids.tolist()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._ids) * (self.dim + 1) * 4
+
+    def validate(self, descriptors) -> np.ndarray:
+        arr = np.asarray(descriptors, dtype=np.float32)
+        if arr.ndim == 1:
+            arr = arr[None, :]
+        if arr.ndim != 2 or arr.shape[1] != self.dim:
+            raise ValueError(f"Expected hand descriptors of dimension {self.dim}")
+        if not np.all(np.isfinite(arr)):
+            raise ValueError("Invalid hand descriptor")
+        return arr
+
+    def _reserve(self, size: int):
+        capacity = self.data.shape[0]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        live = len(self._ids)
+        data = np.zeros((capacity, self.dim), dtype=np.float32)
+        data[:live] = self.data[:live]
+        sq_norms = np.zeros(capacity, dtype=np.float32)
+        sq_norms[:live] = self.sq_norms[:live]
+        self.data, self.sq_norms = data, sq_norms
+
+    def upsert(self, user_id: str, descriptor: Sequence[float]):
+        self.upsert_many([user_id], [descriptor])
+
+    def upsert_many(self, user_ids: Sequence[str], descriptors):
+        if not len(user_ids):
+            return
+        vectors = self.validate(descriptors)
+        if len(user_ids) != vectors.shape[0]:
+            raise ValueError("user_ids and descriptors length mismatch")
+
+        with self._lock:
+            self._reserve(len(self._ids) + len(user_ids))
+            rows = np.empty(len(user_ids), dtype=np.int64)
+            for i, user_id in enumerate(user_ids):
+                row = self._ids.row_of(user_id)
+                rows[i] = self._ids.append(user_id) if row is None else row
+            self.data[rows] = vectors
+            self.sq_norms[rows] = np.einsum("ij,ij->i", vectors, vectors)
+
+    def remove(self, user_id: str) -> bool:
+        with self._lock:
+            removed = self._ids.swap_remove(user_id)
+            if removed is None:
+                return False
+            row, last = removed
+            if row != last:
+                self.data[row] = self.data[last]
+                self.sq_norms[row] = self.sq_norms[last]
+            return True
+
+    def distance(self, user_id: str, descriptor: Sequence[float]) -> Optional[float]:
+        """1:1 distance to user_id's enrolled descriptor (None when not enrolled)."""
+        query = self.validate(descriptor)[0]
+        with self._lock:
+            row = self._ids.row_of(user_id)
+            if row is None:
+                return None
+            return float(np.linalg.norm(self.data[row] - query))
+
+    def search(self, descriptor: Sequence[float], k: int = 1,
+               max_distance: Optional[float] = None) -> List[Tuple[str, float]]:
+        """Returns up to k (user_id, distance) pairs, closest first, optionally within max_distance."""
+        query = self.validate(descriptor)[0]
+        q_sq = float(query @ query)
+
+        with self._lock:
+            n = len(self._ids)
+            if n == 0:
+                return []
+            sq = self.sq_norms[:n] - 2.0 * (self.data[:n] @ query) + q_sq
+            top = top_k_indices(-sq, k)
+            dist = np.sqrt(np.maximum(sq[top], 0.0))
+            return [(self._ids[i], float(d)) for i, d in zip(top, dist)
+                    if max_distance is None or d <= max_distance]
@@ -0,0 +1,238 @@
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .codec import popcount
+from .gallery import IdTable
+
+_LOW_BYTES = np.uint64(0x00FF00FF00FF00FF)
+_SUM_LANES = np.uint64(0x0001000100010001)
+
+
+def row_popcount(words: np.ndarray) -> np.ndarray:
+    """
+    Set bits per row of a (..., w) uint64 array. The per-word counts (uint8)
+    are summed eight at a time inside a uint64 (SWAR: fold bytes into 16-bit
+    lanes, then add the lanes with one multiply), which is several times
+    faster than numpy's reduction over a short last axis.
+    """
+    counts = popcount(words)
+    if counts.dtype != np.uint8 or words.shape[-1] % 8:
+        return counts.sum(axis=-1, dtype=np.int64)
+    lanes = np.ascontiguousarray(counts).view(np.uint64)
+    lanes = (lanes & _LOW_BYTES) + ((lanes >> np.uint64(8)) & _LOW_BYTES)
+    totals = (lanes * _SUM_LANES) >> np.uint64(48)
+    return totals.sum(axis=-1, dtype=np.int64) if totals.shape[-1] > 1 else totals[..., 0].astype(np.int64)
+
+
+class IrisCodeGallery:
+    """
+    In-memory gallery of binary iris codes, matched by masked fractional
+    Hamming distance (differing bits / bits valid in both masks).
+
+    Codes and masks are packed uint64 rows. Head-tilt compensation rotates
+    the probe rather than the gallery: the 2 * max_shift + 1 rotated probes
+    are built once per search and XOR/AND/popcounted against whole blocks of
+    rows. Each block is scanned in word stages; after every stage a row's
+    best possible final distance is bounded from below, and rows that can no
+    longer beat the current k-th best (or max_distance) are dropped before
+    their remaining words are read.
+
+    The code layout must match the producer's (services/iris-engine): the
+    angular axis is the outer one, `columns` columns of whole bytes each, so
+    a rotation is a roll of byte groups.
+    """
+
+    def __init__(self, bits: int = 4096, columns: int = 128, initial_capacity: int = 1024,
+                 stages: int = 8, block_rows: int = 512):
+        if bits % 64 or bits % columns or (bits // columns) % 8:
+            raise ValueError("Iris code must be whole uint64 words and whole bytes per column")
+        self.bits = bits
+        self.columns = columns
+        self.n_bytes = bits // 8
+        self.n_words = bits // 64
+        self.block_rows = block_rows
+        bounds = np.linspace(0, self.n_words, min(stages, self.n_words) + 1).astype(int)
+        self._stages = list(zip(bounds[:-1], bounds[1:]))
+        capacity = max(1, initial_capacity)
+        self.codes = np.zeros((capacity, self.n_words), dtype=np.uint64)
+        self.masks = np.zeros((capacity, self.n_words), dtype=np.uint64)
+        self._ids = IdTable()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, user_id: str):
+        with self._lock:
+            return self._ids.row_of(user_id) is not None
+
+    @property
+    def ids(self) -> List[str]:
+        with self._lock:
+            return self._ids.tolist()
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._ids) * self.n_words * 8 * 2
+
+    def validate(self, code, mask) -> Tuple[np.ndarray, np.ndarray]:
+        """Packed code/mask (bytes or uint8 arrays) -> contiguous uint8 arrays."""
+        code = np.frombuffer(bytes(code), dtype=np.uint8)
+        mask = np.frombuffer(bytes(mask), dtype=np.uint8)
+        if code.size != self.n_bytes or mask.size != self.n_bytes:
+            raise ValueError(f"Expected {self.n_bytes}-byte iris code and mask")
+        return code, mask
+
+    def _reserve(self, size: int):
+        capacity = self.codes.shape[0]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        live = len(self._ids)
+        for name in ("codes", "masks"):
+            grown = np.zeros((capacity, self.n_words), dtype=np.uint64)
+            grown[:live] = getattr(self, name)[:live]
+            setattr(self, name, grown)
+
+    def upsert(self, user_id: str, code, mask):
+        self.upsert_many([user_id], [code], [mask])
+
+    def upsert_many(self, user_ids: Sequence[str], codes, masks):
+        if not len(user_ids) == len(codes) == len(masks):
+            raise ValueError("user_ids, codes and masks length mismatch")
+        pairs = [self.validate(c, m) for c, m in zip(codes, masks)]
+        if not pairs:
+            return
+        packed_codes = np.stack([c for c, _ in pairs]).view(np.uint64)
+        packed_masks = np.stack([m for _, m in pairs]).view(np.uint64)
+
+        with self._lock:
+            self._reserve(len(self._ids) + len(user_ids))
+            rows = np.empty(len(user_ids), dtype=np.int64)
+            for i, user_id in enumerate(user_ids):
+                row = self._ids.row_of(user_id)
+                rows[i] = self._ids.append(user_id) if row is None else row
+            self.codes[rows] = packed_codes
+            self.masks[rows] = packed_masks
+
+    def remove(self, user_id: str) -> bool:
+        with self._lock:
+            removed = self._ids.swap_remove(user_id)
+            if removed is None:
+                return False
+            row, last = removed
+            if row != last:
+                self.codes[row] = self.codes[last]
+                self.masks[row] = self.masks[last]
+            return True
+
+    def rotations(self, packed: np.ndarray, max_shift: int) -> np.ndarray:
+        """Probe rotated by -max_shift..max_shift columns, as (2 * max_shift + 1, n_words) uint64."""
+        cols = packed.reshape(self.columns, -1)
+        shifts = np.arange(-max_shift, max_shift + 1)
+        idx = (np.arange(self.columns)[None, :] - shifts[:, None]) % self.columns
+        return np.ascontiguousarray(cols[idx].reshape(len(shifts), -1)).view(np.uint64)
+
+    def search(self, code, mask, k: int = 1, max_shift: int = 8,
+               max_distance: Optional[float] = None) -> List[Tuple[str, float, int]]:
+        """
+        Returns up to k (user_id, distance, shift) triples, closest first,
+        where shift is the probe rotation (in columns) that matched best.
+        With max_distance set only rows within it are returned, which also
+        lets the scan prune from the first block on.
+        """
+        if not 0 <= max_shift < self.columns // 2:
+            raise ValueError(f"max_shift must be in [0, {self.columns // 2})")
+        code, mask = self.validate(code, mask)
+        probe_codes = self.rotations(code, max_shift)
+        probe_masks = self.rotations(mask, max_shift)
+        bound = 1.0 if max_distance is None else float(max_distance)
+
+        with self._lock:
+            n = len(self._ids)
+            if n == 0:
+                return []
+            k = max(1, min(k, n))
+            best_dist = np.empty(0)
+            best_rows = np.empty(0, dtype=np.int64)
+            best_shift = np.empty(0, dtype=np.int64)
+
+            for start in range(0, n, self.block_rows):
+                rows, dist, shift = self._scan_block(start, min(n, start + self.block_rows),
+                                                     probe_codes, probe_masks, bound)
+                if rows.size == 0:
+                    continue
+                best_dist = np.concatenate([best_dist, dist])
+                best_rows = np.concatenate([best_rows, rows])
+                best_shift = np.concatenate([best_shift, shift])
+                if best_dist.size > k:
+                    keep = np.argpartition(best_dist, k - 1)[:k]
+                    best_dist, best_rows, best_shift = best_dist[keep], best_rows[keep], best_shift[keep]
+                if best_dist.size == k:
+                    # Nothing worse than the current k-th best can enter the result
+                    bound = min(bound, float(best_dist.max()))
+
+            order = np.argsort(best_dist, kind="stable")
+            return [(self._ids[best_rows[i]], float(best_dist[i]), int(best_shift[i]) - max_shift)
+                    for i in order]
+
+    def distance(self, user_id: str, code, mask, max_shift: int = 8) -> Optional[Tuple[float, int]]:
+        """1:1 (distance, shift) against user_id's enrolled code (None when not enrolled)."""
+        if not 0 <= max_shift < self.columns // 2:
+            raise ValueError(f"max_shift must be in [0, {self.columns // 2})")
+        code, mask = self.validate(code, mask)
+        probe_codes = self.rotations(code, max_shift)
+        probe_masks = self.rotations(mask, max_shift)
+        with self._lock:
+            row = self._ids.row_of(user_id)
+            if row is None:
+                return None
+            _, dist, shift = self._scan_block(row, row + 1, probe_codes, probe_masks, 1.0)
+            return float(dist[0]), int(shift[0]) - max_shift
+
+    def _scan_block(self, start: int, stop: int, probe_codes: np.ndarray, probe_masks: np.ndarray,
+                    bound: float):
+        """
+        Staged scan of rows [start, stop). After each word stage, a row's
+        final distance over any shift is at least
+            differing_so_far / (valid_so_far + bits_not_yet_read),
+        since unread bits can at best all be valid and agree. Rows whose
+        bound exceeds `bound` are dropped. Returns (rows, distance, shift
+        index) for the rows within bound.
+        """
+        rows = np.arange(start, stop)
+        n_shifts = probe_codes.shape[0]
+        differing = np.zeros((n_shifts, rows.size), dtype=np.int64)
+        valid = np.zeros((n_shifts, rows.size), dtype=np.int64)
+        full = True   # rows is still the contiguous range: slice instead of gather
+
+        for w0, w1 in self._stages:
+            if full:
+                codes, masks = self.codes[start:stop, w0:w1], self.masks[start:stop, w0:w1]
+            else:
+                codes, masks = self.codes[rows, w0:w1], self.masks[rows, w0:w1]
+            both = masks[None, :, :] & probe_masks[:, None, w0:w1]
+            diff = (codes[None, :, :] ^ probe_codes[:, None, w0:w1]) & both
+            differing += row_popcount(diff)
+            valid += row_popcount(both)
+
+            unread = (self.n_words - w1) * 64
+            if unread and bound < 1.0:
+                lower = (differing / (valid + unread)).min(axis=0)
+                keep = lower <= bound
+                if not keep.all():
+                    rows, differing, valid = rows[keep], differing[:, keep], valid[:, keep]
+                    full = False
+                    if rows.size == 0:
+                        break
+
+        if rows.size == 0:
+            return rows, np.empty(0), rows
+        dist = np.where(valid > 0, differing / np.maximum(valid, 1), 1.0)
+        shift = dist.argmin(axis=0)
+        dist = dist[shift, np.arange(rows.size)]
+        within = dist <= bound
+        return rows[within], dist[within], shift[within]
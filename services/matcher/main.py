@@ -1,30 +1,386 @@
-from fastapi import FastAPI, Body, HTTPException
+from fastapi import FastAPI, Body, HTTPException, BackgroundTasks
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Literal, Optional
+import os
+import threading
+import time
+import base64
+import binascii
+import uuid
 import numpy as np
 import redis
-import json
 from gabizap_common.config import BaseConfig
+from gabizap_common.handgeo import DESCRIPTOR_DIM
 from gabizap_common.logger import setup_logger
+from .gallery import TemplateGallery
+from .ann import IVFIndex
+from .codec import FORMAT_FLOAT32, decode_iris_code, decode_template, encode_iris_code, encode_template
+from .fusion import FusionPolicy
+from .handgallery import HandGallery
+from .iriscode import IrisCodeGallery
+from .sharding import HashRing, parse_members
+from .snapshot import load_snapshot, save_snapshot
 
 logger = setup_logger("matcher-service")
 
 class Config(BaseConfig):
     REDIS_URL: str
+    EMBEDDING_DIM: int = 512
+    GALLERY_LOAD_BATCH: int = 1000
+    # Template encodings: "float32" (lossless), "int8" (4x smaller) or "bits" (32x smaller)
+    TEMPLATE_FORMAT: str = FORMAT_FLOAT32   # Redis blobs
+    GALLERY_FORMAT: str = FORMAT_FLOAT32    # in-memory match store
+    # Approximate (IVF) search
+    IVF_LISTS: int = 1024
+    IVF_PROBE: int = 8
+    IVF_MIN_TRAIN: int = 50000
+    # Batch limits
+    MAX_BATCH_PROBES: int = 1024
+    DUPLICATE_BLOCK: int = 4096
+    # Sharding: when SHARD_NAME is set this process only holds the templates
+    # the consistent-hash ring over SHARD_MEMBERS assigns to it
+    SHARD_NAME: Optional[str] = None
+    SHARD_MEMBERS: str = ""
+    # Warm start: memory-mapped gallery snapshot + Redis stream of registrations
+    SNAPSHOT_PATH: Optional[str] = None
+    SNAPSHOT_INTERVAL: int = 0   # seconds, 0 = only on demand / shutdown
+    REGISTRATION_LOG: str = "template_log"
+    REGISTRATION_LOG_MAXLEN: int = 1000000
+    # Binary iris codes (iris-engine v2), matched by fractional Hamming distance
+    IRIS_CODE_BITS: int = 4096
+    IRIS_CODE_COLUMNS: int = 128
+    IRIS_MAX_SHIFT: int = 8
+    # Hand geometry descriptors (hand-engine v2), matched by Euclidean distance
+    HAND_THRESHOLD: float = 0.10
+    # Multimodal verification: each distance is z-normalized against the
+    # modality's impostor distribution (mean, std), the z-scores are combined
+    # with these weights and a fused z >= FUSION_THRESHOLD is a match
+    FUSION_IRIS_IMPOSTOR_MEAN: float = 0.46
+    FUSION_IRIS_IMPOSTOR_STD: float = 0.018
+    FUSION_HAND_IMPOSTOR_MEAN: float = 0.175
+    FUSION_HAND_IMPOSTOR_STD: float = 0.043
+    FUSION_IRIS_WEIGHT: float = 4.0
+    FUSION_HAND_WEIGHT: float = 1.5
+    FUSION_THRESHOLD: float = 3.0
 
 config = Config(SERVICE_NAME="matcher-service")
 app = FastAPI(title="GABIZAP Distributed Matcher")
 
 # Sync redis for simplicity in match loop, async is better for high scale
 try:
-    r = redis.from_url(config.REDIS_URL, decode_responses=True)
+    # Binary-safe client: templates are stored as versioned codec blobs
+    r = redis.from_url(config.REDIS_URL, decode_responses=False)
 except Exception as e:
     logger.error(f"Failed to connect to Redis: {e}")
     r = None
 
+# Redis stays the source of truth; the gallery is the in-process search index
+gallery = TemplateGallery(dim=config.EMBEDDING_DIM, fmt=config.GALLERY_FORMAT)
+gallery.attach_index(IVFIndex(n_lists=config.IVF_LISTS, n_probe=config.IVF_PROBE))
+iris_gallery = IrisCodeGallery(bits=config.IRIS_CODE_BITS, columns=config.IRIS_CODE_COLUMNS)
+hand_gallery = HandGallery(dim=DESCRIPTOR_DIM)
+fusion = FusionPolicy(
+    impostor={"iris": (config.FUSION_IRIS_IMPOSTOR_MEAN, config.FUSION_IRIS_IMPOSTOR_STD),
+              "hand": (config.FUSION_HAND_IMPOSTOR_MEAN, config.FUSION_HAND_IMPOSTOR_STD)},
+    weights={"iris": config.FUSION_IRIS_WEIGHT, "hand": config.FUSION_HAND_WEIGHT},
+    threshold=config.FUSION_THRESHOLD,
+)
+
+ring: Optional[HashRing] = None
+if config.SHARD_NAME:
+    ring = HashRing(parse_members(config.SHARD_MEMBERS) or [config.SHARD_NAME])
+
+def owns(user_id: str) -> bool:
+    return ring is None or ring.owns(config.SHARD_NAME, user_id)
+
 class MatchRequest(BaseModel):
     embedding: List[float]
     threshold: float = 0.85
+    top_k: int = 1
+    # "exact" scans every template; "ivf" probes n_probe coarse cells only
+    mode: Literal["exact", "ivf"] = "exact"
+    n_probe: Optional[int] = None
+
+class BatchMatchRequest(BaseModel):
+    embeddings: List[List[float]]
+    threshold: float = 0.85
+    top_k: int = 1
+
+class IrisCodeRegistration(BaseModel):
+    user_id: str
+    # base64 of the packed code/mask bytes, as returned by iris-engine /embed
+    iris_code: str
+    iris_mask: str
+
+class IrisMatchRequest(BaseModel):
+    iris_code: str
+    iris_mask: str
+    # Fractional Hamming distance; lower is closer
+    threshold: float = 0.32
+    top_k: int = 1
+    max_shift: Optional[int] = None
+
+class HandRegistration(BaseModel):
+    user_id: str
+    # base64 of the float32 descriptor, as returned by hand-engine /process
+    descriptor: str
+
+class HandMatchRequest(BaseModel):
+    descriptor: str
+    # Euclidean distance; lower is closer
+    threshold: Optional[float] = None
+    top_k: int = 1
+
+class FusionVerifyRequest(BaseModel):
+    user_id: str
+    iris_code: Optional[str] = None
+    iris_mask: Optional[str] = None
+    hand_descriptor: Optional[str] = None
+    max_shift: Optional[int] = None
+
+class DuplicateScanRequest(BaseModel):
+    threshold: float = 0.95
+    max_pairs: int = 10000
+
+class ShardSearchRequest(BaseModel):
+    embeddings: List[List[float]]
+    top_k: int = 1
+    mode: Literal["exact", "ivf"] = "exact"
+    n_probe: Optional[int] = None
+
+class MembershipRequest(BaseModel):
+    members: List[str]
+    # False during the first rebalance phase: adopt new templates, keep old ones
+    evict: bool = True
+
+# In-process registry of duplicate-detection jobs (job_id -> status dict)
+duplicate_jobs: Dict[str, dict] = {}
+
+def ingest_templates(keys, values, only_missing: bool = False) -> int:
+    """Decodes template blobs fetched from Redis and upserts the owned ones."""
+    user_ids, vectors = [], []
+    for key, val in zip(keys, values):
+        if not val:
+            continue
+        key = key.decode() if isinstance(key, bytes) else key
+        try:
+            # Accepts codec blobs and legacy JSON templates alike
+            vec = decode_template(val)
+        except ValueError as e:
+            logger.warning(f"Skipping template {key}: {e}")
+            continue
+        if vec.shape[0] != gallery.dim:
+            logger.warning(f"Skipping template {key}: dimension {vec.shape[0]}")
+            continue
+        user_id = key.split(":", 1)[1]
+        if not owns(user_id) or (only_missing and user_id in gallery):
+            continue
+        user_ids.append(user_id)
+        vectors.append(vec)
+    if not user_ids:
+        return 0
+    try:
+        gallery.upsert_many(user_ids, vectors)
+        return len(user_ids)
+    except ValueError:
+        # Fall back to one-by-one so a single bad template doesn't drop the batch
+        loaded = 0
+        for user_id, vec in zip(user_ids, vectors):
+            try:
+                gallery.upsert(user_id, vec)
+                loaded += 1
+            except ValueError:
+                logger.warning(f"Skipping invalid template for {user_id}")
+        return loaded
+
+def load_gallery(only_missing: bool = False):
+    # One SCAN of the keyspace at boot instead of one per /match
+    cursor = '0'
+    loaded = 0
+    while cursor != 0:
+        cursor, keys = r.scan(cursor=cursor, match="template:*", count=config.GALLERY_LOAD_BATCH)
+        if keys:
+            loaded += ingest_templates(keys, r.mget(keys), only_missing)
+    return loaded
+
+def load_iris_codes(only_missing: bool = False) -> int:
+    cursor = '0'
+    loaded = 0
+    while cursor != 0:
+        cursor, keys = r.scan(cursor=cursor, match="iris_code:*", count=config.GALLERY_LOAD_BATCH)
+        if not keys:
+            continue
+        user_ids, codes, masks = [], [], []
+        for key, val in zip(keys, r.mget(keys)):
+            user_id = key.decode().split(":", 1)[1]
+            if not val or not owns(user_id) or (only_missing and user_id in iris_gallery):
+                continue
+            try:
+                code, mask = iris_gallery.validate(*decode_iris_code(val))
+            except ValueError as e:
+                logger.warning(f"Skipping iris code {user_id}: {e}")
+                continue
+            user_ids.append(user_id)
+            codes.append(code)
+            masks.append(mask)
+        iris_gallery.upsert_many(user_ids, codes, masks)
+        loaded += len(user_ids)
+    return loaded
+
+def load_hand_descriptors(only_missing: bool = False) -> int:
+    cursor = '0'
+    loaded = 0
+    while cursor != 0:
+        cursor, keys = r.scan(cursor=cursor, match="hand:*", count=config.GALLERY_LOAD_BATCH)
+        if not keys:
+            continue
+        user_ids, descriptors = [], []
+        for key, val in zip(keys, r.mget(keys)):
+            user_id = key.decode().split(":", 1)[1]
+            if not val or not owns(user_id) or (only_missing and user_id in hand_gallery):
+                continue
+            try:
+                descriptor = decode_template(val)
+            except ValueError as e:
+                logger.warning(f"Skipping hand descriptor {user_id}: {e}")
+                continue
+            if descriptor.shape[0] != hand_gallery.dim:
+                logger.warning(f"Skipping hand descriptor {user_id}: dimension {descriptor.shape[0]}")
+                continue
+            user_ids.append(user_id)
+            descriptors.append(descriptor)
+        hand_gallery.upsert_many(user_ids, descriptors)
+        loaded += len(user_ids)
+    return loaded
+
+def decode_b64_descriptor(descriptor: str) -> np.ndarray:
+    try:
+        raw = base64.b64decode(descriptor, validate=True)
+        if len(raw) != hand_gallery.dim * 4:
+            raise ValueError(f"Expected {hand_gallery.dim} float32 values")
+        return hand_gallery.validate(np.frombuffer(raw, dtype="<f4"))[0]
+    except (binascii.Error, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid hand descriptor: {e}")
+
+def decode_b64_code(code: str, mask: str):
+    try:
+        return iris_gallery.validate(base64.b64decode(code, validate=True),
+                                     base64.b64decode(mask, validate=True))
+    except (binascii.Error, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid iris code: {e}")
+
+def parse_log_id(log_id) -> tuple:
+    log_id = log_id.decode() if isinstance(log_id, bytes) else log_id
+    ms, _, seq = log_id.partition("-")
+    return int(ms), int(seq or 0)
+
+def log_tail_id() -> str:
+    """Id of the newest registration-log entry ("0-0" when the log is empty)."""
+    last = r.xrevrange(config.REGISTRATION_LOG, count=1)
+    return last[0][0].decode() if last else "0-0"
+
+def replay_registrations(since: str) -> Optional[int]:
+    """
+    Re-applies registrations logged after `since`. Returns None when the log
+    has been trimmed past that point and a full reload is required.
+    """
+    first = r.xrange(config.REGISTRATION_LOG, count=1)
+    if first and since != "0-0" and parse_log_id(first[0][0]) > parse_log_id(since):
+        return None
+
+    replayed, cursor = 0, since
+    while True:
+        entries = r.xrange(config.REGISTRATION_LOG, min=f"({cursor}", count=config.GALLERY_LOAD_BATCH)
+        if not entries:
+            return replayed
+        cursor = entries[-1][0].decode()
+        user_ids = list(dict.fromkeys(fields[b"user_id"].decode() for _, fields in entries))
+        keys = [f"template:{u}" for u in user_ids]
+        replayed += ingest_templates(keys, r.mget(keys))
+
+def restore_snapshot() -> bool:
+    """Warm start: map the snapshot, then catch up from the registration log."""
+    global gallery
+    index = IVFIndex(n_lists=config.IVF_LISTS, n_probe=config.IVF_PROBE)
+    restored, header = load_snapshot(config.SNAPSHOT_PATH, index=index)
+    if restored.dim != config.EMBEDDING_DIM or restored.fmt != config.GALLERY_FORMAT:
+        logger.warning("Snapshot format/dimension differs from config, ignoring it")
+        return False
+    if header.get("shard_members") != (ring.members if ring else None):
+        logger.warning("Snapshot was taken with a different shard membership, ignoring it")
+        return False
+
+    previous, gallery = gallery, restored
+    replayed = replay_registrations(header.get("log_id", "0-0"))
+    if replayed is None:
+        logger.warning("Registration log trimmed past snapshot, falling back to full load")
+        gallery = previous
+        return False
+    logger.info(f"Gallery restored from snapshot: {len(gallery)} templates, {replayed} replayed")
+    return True
+
+def write_snapshot() -> dict:
+    # Read the log position *before* copying the gallery: /register upserts
+    # before appending to the log, so every entry up to log_id is in the copy
+    log_id = log_tail_id()
+    header = save_snapshot(gallery, config.SNAPSHOT_PATH, meta={
+        "log_id": log_id,
+        "shard_members": ring.members if ring else None,
+    })
+    logger.info(f"Gallery snapshot written: {header['count']} templates at log id {log_id}")
+    return header
+
+def snapshot_loop():
+    while True:
+        time.sleep(config.SNAPSHOT_INTERVAL)
+        try:
+            write_snapshot()
+        except Exception as e:
+            logger.error(f"Periodic snapshot failed: {e}")
+
+def train_if_large(retrain: bool = True):
+    # Small galleries are faster to scan exactly than to cluster
+    if len(gallery) < config.IVF_MIN_TRAIN or (not retrain and gallery.index.is_trained):
+        return
+    gallery.train_index()
+    logger.info(f"IVF index trained: {config.IVF_LISTS} lists")
+
+@app.on_event("startup")
+def warm_gallery():
+    if not r:
+        return
+    if config.SNAPSHOT_PATH and config.SNAPSHOT_INTERVAL > 0:
+        threading.Thread(target=snapshot_loop, daemon=True).start()
+
+    try:
+        loaded = load_iris_codes()
+        logger.info(f"Iris code gallery loaded: {loaded} codes")
+    except redis.RedisError as e:
+        logger.error(f"Failed to load iris code gallery: {e}")
+
+    try:
+        loaded = load_hand_descriptors()
+        logger.info(f"Hand gallery loaded: {loaded} descriptors")
+    except redis.RedisError as e:
+        logger.error(f"Failed to load hand gallery: {e}")
+
+    restored = False
+    try:
+        restored = bool(config.SNAPSHOT_PATH) and os.path.exists(config.SNAPSHOT_PATH) and restore_snapshot()
+    except (ValueError, OSError, redis.RedisError) as e:
+        logger.error(f"Failed to restore gallery snapshot: {e}")
+    if restored:
+        # Snapshots taken below IVF_MIN_TRAIN (or replayed past it) carry no trained index
+        train_if_large(retrain=False)
+        return
+
+    try:
+        loaded = load_gallery()
+        logger.info(f"Template gallery loaded: {loaded} templates")
+    except redis.RedisError as e:
+        logger.error(f"Failed to load template gallery: {e}")
+        return
+    train_if_large()
 
 @app.post("/register")
 def register_template(user_id: str, embedding: List[float]):
@@ -32,52 +388,350 @@ def register_template(user_id: str, embedding: List[float]):
     # Key: "template:{user_id}"
     if not r:
         raise HTTPException(status_code=503, detail="Matcher backend unavailable")
-    
+
+    if not owns(user_id):
+        # The coordinator routes by the same ring; a miss means stale membership
+        raise HTTPException(status_code=421, detail=f"user_id not owned by shard {config.SHARD_NAME}")
+
+    try:
+        gallery.normalize(embedding)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     key = f"template:{user_id}"
-    r.set(key, json.dumps(embedding))
+    r.set(key, encode_template(embedding, config.TEMPLATE_FORMAT))
+    # Keep the in-memory index in sync with the store, then log the
+    # registration so a snapshot-restored process can replay it
+    gallery.upsert(user_id, embedding)
+    r.xadd(config.REGISTRATION_LOG, {"user_id": user_id},
+           maxlen=config.REGISTRATION_LOG_MAXLEN, approximate=True)
     return {"status": "registered", "user_id": user_id}
 
 @app.post("/match")
 def match_identity(req: MatchRequest):
     if not r:
         raise HTTPException(status_code=503, detail="Matcher backend unavailable")
-    
-    input_vec = np.array(req.embedding)
-    input_norm = np.linalg.norm(input_vec)
-    
-    if input_norm == 0:
-        raise HTTPException(status_code=400, detail="Invalid embedding vector")
-
-    # SCAN for all templates (Naive Linear Search - O(N))
-    # In production: Use RediSearch for vector similarity KNN
-    best_score = -1.0
-    best_user = None
-    
-    cursor = '0'
-    while cursor != 0:
-        cursor, keys = r.scan(cursor=cursor, match="template:*", count=100)
-        if keys:
-            values = r.mget(keys)
-            for i, val in enumerate(values):
-                if val:
-                    stored_vec = np.array(json.loads(val))
-                    stored_norm = np.linalg.norm(stored_vec)
-                    
-                    if stored_norm > 0:
-                        # Cosine Similarity
-                        score = np.dot(input_vec, stored_vec) / (input_norm * stored_norm)
-                        
-                        if score > best_score:
-                            best_score = score
-                            best_user = keys[i].split(":")[1]
-    
+
+    try:
+        # Single matrix-vector product over the pre-normalized gallery + partial sort
+        candidates = gallery.search(req.embedding, k=max(1, req.top_k),
+                                    mode=req.mode, n_probe=req.n_probe)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not candidates:
+        return {"match": False, "score": -1.0}
+
+    best_user, best_score = candidates[0]
     logger.info(f"Match result: Best={best_score}, User={best_user}")
 
-    if best_score >= req.threshold:
-        return {"match": True, "user_id": best_user, "score": float(best_score)}
-    else:
-        return {"match": False, "score": float(best_score)}
+    result = {"match": best_score >= req.threshold, "score": best_score}
+    if result["match"]:
+        result["user_id"] = best_user
+    if req.top_k > 1:
+        result["candidates"] = [{"user_id": u, "score": s} for u, s in candidates]
+    return result
+
+@app.post("/match/batch")
+def match_batch(req: BatchMatchRequest):
+    if not r:
+        raise HTTPException(status_code=503, detail="Matcher backend unavailable")
+    if not req.embeddings:
+        raise HTTPException(status_code=400, detail="No embeddings supplied")
+    if len(req.embeddings) > config.MAX_BATCH_PROBES:
+        raise HTTPException(status_code=413, detail=f"At most {config.MAX_BATCH_PROBES} probes per batch")
+
+    try:
+        # One matrix-matrix product per gallery block for all probes
+        batch = gallery.search_many(req.embeddings, k=max(1, req.top_k))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    results = []
+    for candidates in batch:
+        if not candidates:
+            results.append({"match": False, "score": -1.0})
+            continue
+        best_user, best_score = candidates[0]
+        result = {"match": best_score >= req.threshold, "score": best_score}
+        if result["match"]:
+            result["user_id"] = best_user
+        if req.top_k > 1:
+            result["candidates"] = [{"user_id": u, "score": s} for u, s in candidates]
+        results.append(result)
+
+    logger.info(f"Batch match: {len(results)} probes, {sum(x['match'] for x in results)} matched")
+    return {"results": results}
+
+@app.post("/register/iris")
+def register_iris_code(req: IrisCodeRegistration):
+    if not r:
+        raise HTTPException(status_code=503, detail="Matcher backend unavailable")
+    if not owns(req.user_id):
+        raise HTTPException(status_code=421, detail=f"user_id not owned by shard {config.SHARD_NAME}")
+
+    code, mask = decode_b64_code(req.iris_code, req.iris_mask)
+    r.set(f"iris_code:{req.user_id}", encode_iris_code(code, mask))
+    iris_gallery.upsert(req.user_id, code, mask)
+    return {"status": "registered", "user_id": req.user_id}
+
+@app.post("/match/iris")
+def match_iris_code(req: IrisMatchRequest):
+    if not r:
+        raise HTTPException(status_code=503, detail="Matcher backend unavailable")
+
+    code, mask = decode_b64_code(req.iris_code, req.iris_mask)
+    max_shift = config.IRIS_MAX_SHIFT if req.max_shift is None else req.max_shift
+    try:
+        # XOR/AND/popcount over the packed gallery for every probe rotation;
+        # rows that can no longer get within threshold are dropped early
+        candidates = iris_gallery.search(code, mask, k=max(1, req.top_k), max_shift=max_shift,
+                                         max_distance=req.threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if not candidates:
+        return {"match": False, "distance": None}
+
+    best_user, best_distance, best_shift = candidates[0]
+    logger.info(f"Iris match result: Best={best_distance}, User={best_user}, Shift={best_shift}")
+    result = {"match": True, "user_id": best_user, "distance": best_distance, "shift": best_shift}
+    if req.top_k > 1:
+        result["candidates"] = [{"user_id": u, "distance": d, "shift": sh} for u, d, sh in candidates]
+    return result
+
+@app.post("/register/hand")
+def register_hand(req: HandRegistration):
+    if not r:
+        raise HTTPException(status_code=503, detail="Matcher backend unavailable")
+    if not owns(req.user_id):
+        raise HTTPException(status_code=421, detail=f"user_id not owned by shard {config.SHARD_NAME}")
+
+    descriptor = decode_b64_descriptor(req.descriptor)
+    r.set(f"hand:{req.user_id}", encode_template(descriptor, FORMAT_FLOAT32))
+    hand_gallery.upsert(req.user_id, descriptor)
+    return {"status": "registered", "user_id": req.user_id}
+
+@app.post("/match/hand")
+def match_hand(req: HandMatchRequest):
+    if not r:
+        raise HTTPException(status_code=503, detail="Matcher backend unavailable")
+
+    descriptor = decode_b64_descriptor(req.descriptor)
+    threshold = config.HAND_THRESHOLD if req.threshold is None else req.threshold
+    candidates = hand_gallery.search(descriptor, k=max(1, req.top_k))
+    if not candidates:
+        return {"match": False, "distance": None}
+
+    best_user, best_distance = candidates[0]
+    logger.info(f"Hand match result: Best={best_distance}, User={best_user}")
+    result = {"match": best_distance <= threshold, "distance": best_distance}
+    if result["match"]:
+        result["user_id"] = best_user
+    if req.top_k > 1:
+        result["candidates"] = [{"user_id": u, "distance": d} for u, d in candidates]
+    return result
+
+@app.post("/verify/fusion")
+def verify_fusion(req: FusionVerifyRequest):
+    """
+    1:1 multimodal verification of a claimed user_id: iris Hamming distance
+    and hand geometry distance against that user's enrolled templates,
+    fused into one score (see fusion.FusionPolicy). Modalities the probe
+    doesn't supply are left out of the fusion; a supplied modality the user
+    never enrolled fails the verification.
+    """
+    if not r:
+        raise HTTPException(status_code=503, detail="Matcher backend unavailable")
+    if (req.iris_code is None) != (req.iris_mask is None):
+        raise HTTPException(status_code=400, detail="iris_code and iris_mask go together")
+    if req.iris_code is None and req.hand_descriptor is None:
+        raise HTTPException(status_code=400, detail="No modality supplied")
+
+    modalities, distances = {}, {}
+    if req.iris_code is not None:
+        code, mask = decode_b64_code(req.iris_code, req.iris_mask)
+        max_shift = config.IRIS_MAX_SHIFT if req.max_shift is None else req.max_shift
+        try:
+            found = iris_gallery.distance(req.user_id, code, mask, max_shift=max_shift)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if found is None:
+            modalities["iris"] = {"enrolled": False}
+        else:
+            distances["iris"], shift = found
+            modalities["iris"] = {"enrolled": True, "distance": distances["iris"], "shift": shift}
+    if req.hand_descriptor is not None:
+        distance = hand_gallery.distance(req.user_id, decode_b64_descriptor(req.hand_descriptor))
+        if distance is None:
+            modalities["hand"] = {"enrolled": False}
+        else:
+            distances["hand"] = distance
+            modalities["hand"] = {"enrolled": True, "distance": distance}
+
+    for name, distance in distances.items():
+        modalities[name]["z"] = fusion.normalize(name, distance)
+    missing = [name for name, m in modalities.items() if not m["enrolled"]]
+    if len(missing) == len(modalities):
+        raise HTTPException(status_code=404, detail="No enrolled template for the supplied modalities")
+
+    score = fusion.fuse(distances)
+    match = not missing and fusion.is_match(score)
+    logger.info(f"Fusion verify: User={req.user_id}, Score={score}, Match={match}")
+    return {"user_id": req.user_id, "match": match, "score": score, "modalities": modalities}
+
+def run_duplicate_scan(job_id: str, threshold: float, max_pairs: int):
+    job = duplicate_jobs[job_id]
+    job["status"] = "running"
+    try:
+        for pairs, done, total in gallery.iter_duplicates(threshold, block=config.DUPLICATE_BLOCK):
+            job["pairs"].extend({"user_a": a, "user_b": b, "score": sc} for a, b, sc in pairs)
+            job["progress"] = round(done / total, 4) if total else 1.0
+            if len(job["pairs"]) >= max_pairs:
+                job["pairs"] = job["pairs"][:max_pairs]
+                job["truncated"] = True
+                break
+        job["status"] = "completed"
+        logger.info(f"Duplicate scan {job_id}: {len(job['pairs'])} pairs >= {threshold}")
+    except Exception as e:
+        logger.error(f"Duplicate scan {job_id} failed: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+
+@app.post("/identify/duplicates", status_code=202)
+def start_duplicate_scan(req: DuplicateScanRequest, background_tasks: BackgroundTasks):
+    # Enrollment hygiene: all template pairs scoring above threshold, computed block by block
+    job_id = uuid.uuid4().hex
+    duplicate_jobs[job_id] = {
+        "job_id": job_id,
+        "status": "queued",
+        "threshold": req.threshold,
+        "progress": 0.0,
+        "truncated": False,
+        "pairs": [],
+    }
+    background_tasks.add_task(run_duplicate_scan, job_id, req.threshold, req.max_pairs)
+    return {"job_id": job_id, "status": "queued"}
+
+@app.get("/identify/duplicates/{job_id}")
+def get_duplicate_scan(job_id: str):
+    job = duplicate_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.post("/shard/search")
+def shard_search(req: ShardSearchRequest):
+    # Local top-k for the coordinator's scatter-gather; no thresholding here
+    try:
+        if len(req.embeddings) == 1:
+            batch = [gallery.search(req.embeddings[0], k=max(1, req.top_k),
+                                    mode=req.mode, n_probe=req.n_probe)]
+        else:
+            batch = gallery.search_many(req.embeddings, k=max(1, req.top_k))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "shard": config.SHARD_NAME,
+        "results": [[{"user_id": u, "score": s} for u, s in hits] for hits in batch],
+    }
+
+@app.post("/shard/search/iris")
+def shard_search_iris(req: IrisMatchRequest):
+    # Local nearest iris codes within threshold; the coordinator merges shards
+    if not r:
+        raise HTTPException(status_code=503, detail="Matcher backend unavailable")
+    code, mask = decode_b64_code(req.iris_code, req.iris_mask)
+    max_shift = config.IRIS_MAX_SHIFT if req.max_shift is None else req.max_shift
+    try:
+        hits = iris_gallery.search(code, mask, k=max(1, req.top_k), max_shift=max_shift,
+                                   max_distance=req.threshold)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "shard": config.SHARD_NAME,
+        "results": [[{"user_id": u, "distance": d, "shift": sh} for u, d, sh in hits]],
+    }
+
+@app.post("/shard/search/hand")
+def shard_search_hand(req: HandMatchRequest):
+    # Local nearest hand descriptors for the coordinator; it applies the threshold
+    if not r:
+        raise HTTPException(status_code=503, detail="Matcher backend unavailable")
+    descriptor = decode_b64_descriptor(req.descriptor)
+    hits = hand_gallery.search(descriptor, k=max(1, req.top_k))
+    return {
+        "shard": config.SHARD_NAME,
+        "results": [[{"user_id": u, "distance": d} for u, d in hits]],
+    }
+
+@app.post("/shard/membership")
+def update_membership(req: MembershipRequest):
+    """
+    Rebalance hook: adopt a new ring, pull newly owned templates from Redis
+    (the source of truth) and, if evict is set, drop the ones that moved away.
+    """
+    global ring
+    if not config.SHARD_NAME:
+        raise HTTPException(status_code=400, detail="Not running as a shard")
+    if not req.members:
+        raise HTTPException(status_code=400, detail="Empty membership")
+    if not r:
+        raise HTTPException(status_code=503, detail="Matcher backend unavailable")
+
+    ring = HashRing(req.members)
+    evicted = [u for u in list(gallery.ids) if not owns(u)] if req.evict else []
+    for user_id in evicted:
+        gallery.remove(user_id)
+    if req.evict:
+        for user_id in [u for u in iris_gallery.ids if not owns(u)]:
+            iris_gallery.remove(user_id)
+        for user_id in [u for u in hand_gallery.ids if not owns(u)]:
+            hand_gallery.remove(user_id)
+    adopted = load_gallery(only_missing=True) if config.SHARD_NAME in ring.members else 0
+    if config.SHARD_NAME in ring.members:
+        load_iris_codes(only_missing=True)
+        load_hand_descriptors(only_missing=True)
+
+    logger.info(f"Shard {config.SHARD_NAME} rebalanced: -{len(evicted)} +{adopted}, members={ring.members}")
+    return {"shard": config.SHARD_NAME, "evicted": len(evicted), "adopted": adopted, "templates": len(gallery)}
+
+@app.post("/snapshot")
+def create_snapshot():
+    if not config.SNAPSHOT_PATH:
+        raise HTTPException(status_code=400, detail="SNAPSHOT_PATH not configured")
+    header = write_snapshot()
+    return {"status": "written", "templates": header["count"], "log_id": header["log_id"]}
+
+@app.on_event("shutdown")
+def snapshot_on_shutdown():
+    # An empty gallery here means loading failed; keep the last good snapshot
+    if r and config.SNAPSHOT_PATH and len(gallery):
+        try:
+            write_snapshot()
+        except Exception as e:
+            logger.error(f"Shutdown snapshot failed: {e}")
+
+@app.post("/index/train")
+def train_index():
+    # Re-cluster after large enrollment waves; registrations between trainings
+    # are assigned to their nearest existing cell
+    try:
+        gallery.train_index()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "trained", "templates": len(gallery), "lists": len(gallery.index.lists)}
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "matcher-service"}
+    return {
+        "status": "healthy",
+        "service": "matcher-service",
+        "templates": len(gallery),
+        "iris_codes": len(iris_gallery),
+        "hand_templates": len(hand_gallery),
+        "shard": config.SHARD_NAME,
+        "gallery_format": gallery.fmt,
+        "gallery_bytes": gallery.nbytes,
+        "ivf_trained": gallery.index.is_trained,
+    }
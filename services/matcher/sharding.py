@@ -0,0 +1,88 @@
+import bisect
+import hashlib
+import heapq
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+
+def stable_hash(key: str) -> int:
+    """Process-independent 64-bit hash (Python's hash() is salted per process)."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring mapping user_ids to shard names.
+
+    Each shard owns `vnodes` points on the ring, so adding or removing one
+    shard only moves ~1/N of the templates instead of reshuffling everything
+    as `hash % N` would.
+    """
+
+    def __init__(self, members: Sequence[str], vnodes: int = 64):
+        if not members:
+            raise ValueError("A hash ring needs at least one member")
+        self.members = sorted(set(members))
+        self.vnodes = vnodes
+        points = sorted((stable_hash(f"{m}#{i}"), m) for m in self.members for i in range(vnodes))
+        self._points = [p for p, _ in points]
+        self._owners = [m for _, m in points]
+
+    def owner(self, user_id: str) -> str:
+        idx = bisect.bisect(self._points, stable_hash(user_id)) % len(self._points)
+        return self._owners[idx]
+
+    def owns(self, member: str, user_id: str) -> bool:
+        return self.owner(user_id) == member
+
+
+def rebalance_moves(old: HashRing, new: HashRing, user_ids: Iterable[str]) -> Dict[str, Tuple[str, str]]:
+    """user_id -> (old_owner, new_owner) for every template that changes shard."""
+    moves = {}
+    for user_id in user_ids:
+        src, dst = old.owner(user_id), new.owner(user_id)
+        if src != dst:
+            moves[user_id] = (src, dst)
+    return moves
+
+
+def merge_top_k(partials: Iterable[List[Tuple[str, float]]], k: int) -> List[Tuple[str, float]]:
+    """
+    Merges per-shard top-k lists into the global top-k, best first. A user
+    held by two shards mid-rebalance is only reported once.
+    """
+    best: Dict[str, float] = {}
+    for part in partials:
+        for user_id, score in part:
+            if score > best.get(user_id, float("-inf")):
+                best[user_id] = score
+    return heapq.nlargest(k, best.items(), key=lambda hit: hit[1])
+
+
+
+def merge_nearest(partials: Iterable[List[tuple]], k: int) -> List[tuple]:
+    """
+    merge_top_k for distance hits (user_id, distance, *extra): the global k
+    nearest, closest first, each user once with its smallest distance.
+    """
+    best: Dict[str, tuple] = {}
+    for part in partials:
+        for hit in part:
+            if hit[0] not in best or hit[1] < best[hit[0]][1]:
+                best[hit[0]] = hit
+    return heapq.nsmallest(k, best.values(), key=lambda hit: hit[1])
+
+
+def parse_members(spec: str) -> List[str]:
+    """'shard-0,shard-1' -> ['shard-0', 'shard-1']"""
+    return [m.strip() for m in spec.split(",") if m.strip()]
+
+
+def parse_shard_urls(spec: str) -> Dict[str, str]:
+    """'shard-0=http://matcher-0:8006,shard-1=http://matcher-1:8006' -> {name: url}"""
+    urls = {}
+    for item in parse_members(spec):
+        name, _, url = item.partition("=")
+        if not url:
+            raise ValueError(f"Invalid shard entry '{item}', expected name=url")
+        urls[name.strip()] = url.strip().rstrip("/")
+    return urls
@@ -0,0 +1,98 @@
+import json
+import os
+import struct
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .gallery import TemplateGallery
+
+# Memory-mappable gallery snapshot.
+#
+#   magic "GZSNAP\0\0" | version u32 | header_len u32 | header JSON | arrays
+#
+# The header JSON holds free-form meta (template count, format, Redis
+# registration-log position, ...) and, per array, its dtype, shape and byte
+# offset relative to the 64-byte aligned start of the data section. Store
+# arrays are written with spare zero rows so a warm-started gallery can take
+# new registrations without first copying the whole mapping into RAM.
+
+MAGIC = b"GZSNAP\x00\x00"
+VERSION = 1
+PREFIX = struct.Struct("<8sII")
+ALIGN = 64
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def save_snapshot(gallery: TemplateGallery, path: str, meta: Optional[dict] = None,
+                  headroom: float = 0.125) -> dict:
+    """
+    Writes the gallery to `path` atomically (temp file + rename). The gallery
+    is copied under its lock first, so matching continues while the file is
+    written. Returns the header meta.
+    """
+    state, arrays = gallery.export_state()
+    spare = max(1024, int(state["count"] * headroom))
+    header = {**(meta or {}), **state, "created_at": time.time(), "arrays": {}}
+
+    layout, offset = [], 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        shape = list(arr.shape)
+        if name.startswith("store."):
+            shape[0] += spare
+        nbytes = int(np.prod(shape)) * arr.dtype.itemsize
+        header["arrays"][name] = {"dtype": arr.dtype.str, "shape": shape, "offset": offset}
+        layout.append((offset, arr))
+        offset = _align(offset + nbytes)
+
+    blob = json.dumps(header).encode()
+    data_start = _align(PREFIX.size + len(blob))
+
+    tmp = f"{path}.tmp"
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, VERSION, len(blob)))
+        f.write(blob)
+        for rel, arr in layout:
+            f.seek(data_start + rel)
+            arr.tofile(f)
+        # Extend to full size; spare rows stay sparse zeros on most filesystems
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return header
+
+
+def read_header(path: str) -> Tuple[dict, int]:
+    with open(path, "rb") as f:
+        magic, version, header_len = PREFIX.unpack(f.read(PREFIX.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a gallery snapshot")
+        if version != VERSION:
+            raise ValueError(f"Unsupported snapshot version {version}")
+        header = json.loads(f.read(header_len))
+    return header, _align(PREFIX.size + header_len)
+
+
+def load_snapshot(path: str, index=None) -> Tuple[TemplateGallery, dict]:
+    """
+    Maps every array copy-on-write (pages are shared with the page cache and
+    only copied when the gallery mutates them), so load time is independent
+    of gallery size. Returns (gallery, header).
+    """
+    header, data_start = read_header(path)
+    arrays: Dict[str, np.ndarray] = {}
+    for name, spec in header["arrays"].items():
+        shape = tuple(spec["shape"])
+        if 0 in shape:
+            arrays[name] = np.zeros(shape, dtype=np.dtype(spec["dtype"]))
+            continue
+        arrays[name] = np.memmap(path, dtype=np.dtype(spec["dtype"]), mode="c",
+                                 offset=data_start + spec["offset"], shape=shape)
+    return TemplateGallery.from_state(header, arrays, index=index), header
@@ -0,0 +1,138 @@
+import math
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+# Per-user behavioural baselines, updated online from the scored events.
+#
+# One row per user in fixed-width numpy arrays (a dict maps user_id -> row):
+#   hours      uint16[24]  login-hour histogram; halved when a bin saturates,
+#                          which keeps the proportions. Hour statistics are
+#                          circular (23:00 and 01:00 are two hours apart)
+#   n/mean/var per value   Welford running mean and variance, updated as
+#                          var += (delta * (x - mean') - var) / n so float32
+#                          stays well-conditioned at any n
+#   rate/last  decayed     event counter with time constant tau, decayed
+#                          lazily on update and query: rate * 60 / tau is
+#                          events per minute over roughly the last tau
+# observe() and profile() are O(1) (the hour statistics are a 24-bin dot
+# product). Baselines live in the worker's memory: they are only complete
+# when a user's events reach the same worker, i.e. one worker or routing
+# by user.
+
+HOURS = 24
+_ANGLES = 2 * np.pi * np.arange(HOURS) / HOURS
+_COS, _SIN = np.cos(_ANGLES), np.sin(_ANGLES)
+# Circular std of a uniform hour distribution: "no pattern"
+MAX_HOUR_STD = HOURS / math.sqrt(12)
+_BIN_MAX = np.iinfo(np.uint16).max
+
+
+class UserBaselines:
+    def __init__(self, values: Sequence[str] = ("geo_dist", "volume"), tau_s: float = 300.0,
+                 initial_capacity: int = 1024):
+        self.values = tuple(values)
+        self.tau_s = tau_s
+        capacity = max(1, initial_capacity)
+        k = len(self.values)
+        self.events = np.zeros(capacity, dtype=np.uint32)
+        self.hours = np.zeros((capacity, HOURS), dtype=np.uint16)
+        self.n = np.zeros((capacity, k), dtype=np.uint32)
+        self.mean = np.zeros((capacity, k), dtype=np.float32)
+        self.var = np.zeros((capacity, k), dtype=np.float32)
+        self.rate = np.zeros(capacity, dtype=np.float32)
+        self.last = np.zeros(capacity, dtype=np.float64)
+        self._rows: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, user_id: str):
+        return user_id in self._rows
+
+    @property
+    def nbytes(self) -> int:
+        """Array bytes per user row times users (excludes the id dict)."""
+        per_row = sum(a.itemsize * (a.size // a.shape[0])
+                      for a in (self.events, self.hours, self.n, self.mean, self.var, self.rate, self.last))
+        return per_row * len(self._rows)
+
+    def _reserve(self, size: int):
+        capacity = self.rate.shape[0]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        live = len(self._rows)
+        for name in ("events", "hours", "n", "mean", "var", "rate", "last"):
+            old = getattr(self, name)
+            grown = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            grown[:live] = old[:live]
+            setattr(self, name, grown)
+
+    def _row(self, user_id: str) -> int:
+        row = self._rows.get(user_id)
+        if row is None:
+            row = len(self._rows)
+            self._reserve(row + 1)
+            self._rows[user_id] = row
+        return row
+
+    def observe(self, user_id: str, hour: int, values: Optional[Dict[str, float]] = None,
+                ts: Optional[float] = None):
+        """Records one event; values missing from `values` (or NaN) are skipped."""
+        ts = time.time() if ts is None else ts
+        row = self._row(user_id)
+        self.events[row] += 1
+
+        hours, h = self.hours[row], hour % HOURS
+        if hours[h] == _BIN_MAX:
+            hours >>= 1
+        hours[h] += 1
+
+        values = values or {}
+        for i, name in enumerate(self.values):
+            x = values.get(name)
+            if x is None or x != x:
+                continue
+            n = int(self.n[row, i]) + 1
+            mean = float(self.mean[row, i])
+            delta = x - mean
+            mean += delta / n
+            self.n[row, i] = n
+            self.mean[row, i] = mean
+            self.var[row, i] += (delta * (x - mean) - float(self.var[row, i])) / n
+
+        last = self.last[row]
+        decay = math.exp(-(ts - last) / self.tau_s) if last else 0.0
+        self.rate[row] = float(self.rate[row]) * decay + 1.0
+        self.last[row] = ts
+
+    def profile(self, user_id: str, hour: Optional[int] = None, ts: Optional[float] = None) -> Optional[dict]:
+        """Baseline of user_id (None if never seen); with `hour`, how usual that hour is."""
+        row = self._rows.get(user_id)
+        if row is None:
+            return None
+        ts = time.time() if ts is None else ts
+
+        hist = self.hours[row].astype(np.float64)
+        total = hist.sum()
+        r = min(1.0, math.hypot(hist @ _COS, hist @ _SIN) / total)
+        hour_std = min(MAX_HOUR_STD, math.sqrt(max(0.0, -2.0 * math.log(max(r, 1e-12)))) * HOURS / (2 * math.pi))
+        mean_hour = (math.degrees(math.atan2(hist @ _SIN, hist @ _COS)) % 360.0) * HOURS / 360.0
+
+        result = {
+            "events": int(self.events[row]),
+            "mean_login_hour": round(mean_hour, 2),
+            "login_hour_std": round(hour_std, 3),
+            "login_hour_variance": round(hour_std ** 2, 3),
+            "velocity": round(float(self.rate[row]) * math.exp(-(ts - self.last[row]) / self.tau_s) * 60.0 / self.tau_s, 3),
+        }
+        if hour is not None:
+            result["hour_share"] = float(hist[hour % HOURS] / total)
+        for i, name in enumerate(self.values):
+            n = int(self.n[row, i])
+            result[f"{name}_mean"] = float(self.mean[row, i]) if n else None
+            result[f"{name}_std"] = math.sqrt(max(float(self.var[row, i]), 0.0)) if n else None
+        return result
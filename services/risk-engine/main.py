@@ -1,21 +1,40 @@
-from fastapi import FastAPI, Body, BackgroundTasks
+from fastapi import FastAPI, Body, BackgroundTasks, HTTPException
 from pydantic import BaseModel
+from typing import List, Optional
+from gabizap_common.config import BaseConfig
 from gabizap_common.logger import setup_logger
-import random
+import asyncio
 import numpy as np
-import joblib
-import os
 from sklearn.ensemble import IsolationForest
+from .baselines import UserBaselines
+from .model_store import ModelStore
+from .scoring import FEATURES, MicroBatcher, score_rows
 
 logger = setup_logger("risk-engine")
+
+class Config(BaseConfig):
+    MODEL_FILE: str = "risk_model.joblib"
+    # Seconds between checks for a newly published model file
+    MODEL_POLL_S: float = 2.0
+    # Sliding-window refit of the live model; 0 disables. Enable on one worker:
+    # its refits are published to MODEL_FILE and picked up by the others
+    REFIT_INTERVAL_S: float = 0.0
+    REFIT_WINDOW: int = 5000
+    REFIT_MIN_ROWS: int = 1000
+    # Time constant of the per-user decayed request velocity
+    BASELINE_VELOCITY_TAU_S: float = 300.0
+
+config = Config(SERVICE_NAME="risk-engine")
 app = FastAPI(title="GABIZAP Risk Engine")
 
-MODEL_FILE = "risk_model.joblib"
-model = None
+store = ModelStore(config.MODEL_FILE, n_features=len(FEATURES), poll_s=config.MODEL_POLL_S,
+                   window=config.REFIT_WINDOW, refit_interval_s=config.REFIT_INTERVAL_S,
+                   min_refit_rows=config.REFIT_MIN_ROWS)
+# Per-user behavioural history, updated by every scored event
+baselines = UserBaselines(values=("geo_dist", "volume"), tau_s=config.BASELINE_VELOCITY_TAU_S)
 
 # Mock training data for anomaly detection
 def train_dummy_model():
-    global model
     logger.info("Training initial risk model...")
     # Generate "normal" usage patterns
     # Features: [hour_of_day, device_trust_score, geo_distance, login_velocity]
@@ -24,18 +43,15 @@ def train_dummy_model():
     clf = IsolationForest(random_state=42, contamination=0.05)
     clf.fit(X_train)
     
-    joblib.dump(clf, MODEL_FILE)
-    model = clf
+    store.publish(clf)
     logger.info("Risk model trained and saved.")
 
-# Load model on startup
+# Load model on startup, then follow new versions of the file
 @app.on_event("startup")
-def load_model():
-    global model
-    if os.path.exists(MODEL_FILE):
-        model = joblib.load(MODEL_FILE)
-    else:
-        train_dummy_model()
+async def load_model():
+    if not await asyncio.to_thread(store.load):
+        await asyncio.to_thread(train_dummy_model)
+    store.start()
 
 class RiskContext(BaseModel):
     user_id: str
@@ -43,48 +59,74 @@ class RiskContext(BaseModel):
     device_trust: float # 0 to 1
     geo_dist: float     # km from last location
     velocity: float     # plugins per minute
+    volume: Optional[float] = None  # records accessed, when the caller knows
+
+    def features(self):
+        return [self.hour, self.device_trust, self.geo_dist, self.velocity]
+
+class RiskBatch(BaseModel):
+    contexts: List[RiskContext]
+
+MODEL_UNAVAILABLE = {"risk_score": 50, "reason": "model_unavailable"}
+
+def score_with_current_model(X):
+    # One read of the live model per batch: a hot swap never splits a batch
+    results = score_rows(store.model, X)
+    store.record(X)
+    return results
+
+# Concurrent /score requests share one model call
+batcher = MicroBatcher(score_with_current_model, width=len(FEATURES))
+
+@app.on_event("shutdown")
+async def stop_batcher():
+    await batcher.close()
+    await store.stop()
+
+def with_baseline(context: RiskContext, result: dict) -> dict:
+    # Compared against the history before this event, then recorded
+    result = dict(result, baseline=baselines.profile(context.user_id, context.hour))
+    baselines.observe(context.user_id, context.hour, {"geo_dist": context.geo_dist, "volume": context.volume})
+    return result
+
+def log_result(context: RiskContext, result: dict):
+    if result["anomaly"]:
+        logger.warning(f"Risk analysis for {context.user_id}: {result['risk_score']} (Behavioral Anomaly Detected)")
+    else:
+        logger.debug(f"Risk analysis for {context.user_id}: {result['risk_score']} (Normal Activity)")
 
 @app.post("/score")
 async def calculate_risk(context: RiskContext):
-    if not model:
+    if store.model is None:
         # Fallback if model loading failed
-        return {"risk_score": 50, "reason": "model_unavailable"}
-    
-    features = [[context.hour, context.device_trust, context.geo_dist, context.velocity]]
-    
-    # Predict anomaly: 1 for normal, -1 for anomaly
-    prediction = model.predict(features)[0]
-    score_raw = model.score_samples(features)[0]
-    
-    # Convert to 0-100 risk score
-    # score_samples returns negative values, lower = more anomalous
-    # Normal range roughly -0.5 to -0.8
-    
-    # Normalize heavily for demo
-    # If prediction is -1 (anomaly), risk > 70
-    
-    if prediction == -1:
-        risk_score = 85 + random.randint(0, 15)
-        reason = "Behavioral Anomaly Detected"
-    else:
-        # Normal behavior
-        risk_score = max(0, 100 * (0.5 - abs(score_raw))) # Crude normalization
-        reason = "Normal Activity"
-        
-    logger.info(f"Risk analysis for {context.user_id}: {risk_score} ({reason})")
-    
-    action = "allow"
-    if risk_score > 80:
-        action = "block"
-    elif risk_score > 50:
-        action = "step_up"
-        
-    return {
-        "risk_score": int(risk_score), 
-        "action": action, 
-        "anomaly": bool(prediction == -1)
-    }
+        return MODEL_UNAVAILABLE
+    result = with_baseline(context, await batcher.submit(context.features()))
+    log_result(context, result)
+    return result
+
+@app.post("/score/batch")
+async def calculate_risk_batch(batch: RiskBatch):
+    if store.model is None:
+        return {"results": [MODEL_UNAVAILABLE] * len(batch.contexts)}
+    if not batch.contexts:
+        return {"results": []}
+    X = np.array([c.features() for c in batch.contexts], dtype=np.float64)
+    results = await asyncio.to_thread(score_with_current_model, X)
+    results = [with_baseline(context, result) for context, result in zip(batch.contexts, results)]
+    for context, result in zip(batch.contexts, results):
+        log_result(context, result)
+    return {"results": results}
+
+@app.get("/baseline/{user_id}")
+async def get_baseline(user_id: str):
+    profile = baselines.profile(user_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No history for this user")
+    # Field names used by the insider-threat model (scripts/pre-crime)
+    profile["historical_avg"] = profile["volume_mean"]
+    return profile
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "risk-engine"}
+    return {"status": "healthy", "service": "risk-engine", "batcher": batcher.stats(), "model": store.stats(),
+            "baseline_users": len(baselines)}
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import joblib
+import numpy as np
+from sklearn.ensemble import IsolationForest
+from gabizap_common.logger import setup_logger
+
+logger = setup_logger("risk-engine")
+
+# The live risk model, replaced without a restart.
+#
+# Models are published by writing a new joblib file next to the live one and
+# renaming it over it (publish_model), so readers only ever see a complete
+# file. Every worker polls the file and, when it changes, loads it in a
+# thread and swaps the reference: requests in flight finish on the model
+# they started with, new ones get the new model. Files are written
+# uncompressed and loaded with mmap_mode="r", so large numpy arrays are
+# mapped from the page cache and shared by the workers instead of copied
+# into each one (sklearn's tree nodes are still copied on unpickling).
+#
+# Incremental refit: recently scored rows are kept in a sliding window, and
+# every refit_interval seconds a forest with the live model's parameters is
+# fitted on that window, following drift in normal behaviour without an
+# offline retrain. Anomalous rows stay in the window: the forest's
+# contamination setting already expects them, and refitting on only the
+# rows it accepted would shrink the model onto its own core (each refit
+# would flag a further contamination share of what is left). The refit
+# model is published like any other, so with publish_refits every worker
+# picks it up; enable refits on one worker only.
+
+
+def publish_model(model, path: str):
+    """Atomically replaces the model file at `path`."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".risk_model-", suffix=".joblib")
+    os.close(fd)
+    try:
+        joblib.dump(model, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_model_file(path: str, n_features: int):
+    model = joblib.load(path, mmap_mode="r")
+    if not hasattr(model, "score_samples") or not hasattr(model, "offset_"):
+        raise ValueError(f"{path} is not a fitted anomaly model")
+    if getattr(model, "n_features_in_", n_features) != n_features:
+        raise ValueError(f"{path} expects {model.n_features_in_} features, not {n_features}")
+    return model
+
+
+def _signature(path: str):
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+class ModelStore:
+    def __init__(self, path: str, n_features: int, poll_s: float = 2.0, window: int = 5000,
+                 refit_interval_s: float = 0.0, min_refit_rows: int = 1000, publish_refits: bool = True):
+        self.path = path
+        self.n_features = n_features
+        self.poll_s = poll_s
+        self.refit_interval_s = refit_interval_s
+        self.min_refit_rows = min_refit_rows
+        self.publish_refits = publish_refits
+        self.model = None
+        self.version: Optional[str] = None
+        self._signature = None
+        # Ring buffer of recently scored rows
+        self._window = np.empty((window, n_features), dtype=np.float64)
+        self._window_pos = 0
+        self._window_len = 0
+        # record() runs on the scoring threads, refit() on another
+        self._window_lock = threading.Lock()
+        self._tasks = []
+        self.swaps = 0
+        self.refits = 0
+        self.load_errors = 0
+
+    def stats(self) -> dict:
+        return {"version": self.version, "swaps": self.swaps, "refits": self.refits,
+                "load_errors": self.load_errors, "window_rows": self._window_len}
+
+    def _install(self, model, version: str):
+        # A single reference assignment: scoring calls read self.model once
+        self.model = model
+        self.version = version
+        self.swaps += 1
+        logger.info(f"Risk model {version} in service")
+
+    def load(self) -> bool:
+        """Loads the model file if it exists and differs from the live one."""
+        try:
+            signature = _signature(self.path)
+        except FileNotFoundError:
+            return False
+        if signature == self._signature:
+            return False
+        try:
+            model = load_model_file(self.path, self.n_features)
+        except Exception as e:
+            self.load_errors += 1
+            logger.error(f"Keeping risk model {self.version}, failed to load {self.path}: {e!r}")
+            # Don't retry a broken file until it changes again
+            self._signature = signature
+            return False
+        self._signature = signature
+        self._install(model, datetime.fromtimestamp(signature[1] / 1e9, timezone.utc).isoformat())
+        return True
+
+    def publish(self, model):
+        publish_model(model, self.path)
+        self._signature = _signature(self.path)
+        self._install(model, datetime.fromtimestamp(self._signature[1] / 1e9, timezone.utc).isoformat())
+
+    def record(self, X: np.ndarray) -> None:
+        """Adds scored rows to the refit window."""
+        if not self.refit_interval_s:
+            return
+        capacity = len(self._window)
+        rows = X[-capacity:]
+        with self._window_lock:
+            self._window[(self._window_pos + np.arange(len(rows))) % capacity] = rows
+            self._window_pos = (self._window_pos + len(rows)) % capacity
+            self._window_len = min(capacity, self._window_len + len(rows))
+
+    def refit(self) -> bool:
+        live = self.model
+        with self._window_lock:
+            if live is None or self._window_len < self.min_refit_rows:
+                return False
+            X = self._window[:self._window_len].copy()
+        model = IsolationForest(**live.get_params()).fit(X)
+        self.refits += 1
+        if self.publish_refits:
+            self.publish(model)
+        else:
+            self._install(model, f"refit-{self.refits}")
+        return True
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll_s)
+            try:
+                await asyncio.to_thread(self.load)
+            except OSError as e:
+                logger.error(f"Risk model watch failed: {e!r}")
+
+    async def _refit_loop(self):
+        while True:
+            await asyncio.sleep(self.refit_interval_s)
+            started = time.perf_counter()
+            try:
+                if await asyncio.to_thread(self.refit):
+                    logger.info(f"Risk model refit on {self._window_len} recent rows "
+                                f"in {time.perf_counter() - started:.2f}s")
+            except Exception as e:
+                logger.error(f"Risk model refit failed: {e!r}")
+
+    def start(self):
+        if not self._tasks:
+            loop = asyncio.get_running_loop()
+            self._tasks.append(loop.create_task(self._watch()))
+            if self.refit_interval_s:
+                self._tasks.append(loop.create_task(self._refit_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
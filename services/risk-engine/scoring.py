@@ -0,0 +1,108 @@
+import asyncio
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+
+# Vectorized risk scoring.
+#
+# IsolationForest.predict() is decision_function() < 0, and
+# decision_function() is score_samples() - offset_, so calling both predict
+# and score_samples walks every tree twice. score_rows() walks them once for
+# the whole batch and derives the anomaly decision from the same scores.
+#
+# MicroBatcher merges concurrent single-row requests into one model call:
+# rows queue up while a batch is being scored (off the event loop), and the
+# next batch takes everything queued, up to max_batch. Under no load a row
+# is scored alone and immediately; under load the per-call overhead of the
+# forest is shared by the whole batch.
+
+FEATURES = ("hour", "device_trust", "geo_dist", "velocity")
+
+
+def score_rows(model, X: np.ndarray, rng: Optional[np.random.Generator] = None) -> List[dict]:
+    """Risk results for the rows of X (n, len(FEATURES)), one forest traversal."""
+    rng = rng or np.random.default_rng()
+    raw = model.score_samples(X)
+    anomaly = raw - model.offset_ < 0
+    # Anomalies: 85-100; normal rows: crude normalization of the raw score
+    risk = np.where(anomaly, 85 + rng.integers(0, 16, size=len(raw)), np.maximum(0, 100 * (0.5 - np.abs(raw))))
+    results = []
+    for score, is_anomaly in zip(risk.astype(int).tolist(), anomaly.tolist()):
+        action = "allow"
+        if score > 80:
+            action = "block"
+        elif score > 50:
+            action = "step_up"
+        results.append({"risk_score": score, "action": action, "anomaly": is_anomaly})
+    return results
+
+
+class MicroBatcher:
+    def __init__(self, fn: Callable[[np.ndarray], list], width: int, max_batch: int = 256,
+                 max_wait: float = 0.0):
+        self.fn = fn
+        self.width = width
+        self.max_batch = max_batch
+        # Optional linger before scoring a partial batch; 0 relies on load alone
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.rows = 0
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "rows": self.rows,
+                "mean_batch": round(self.rows / self.batches, 2) if self.batches else None,
+                "queued": self._queue.qsize() if self._queue else 0}
+
+    async def submit(self, row) -> dict:
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((row, future))
+        return await future
+
+    async def _collect(self) -> list:
+        items = [await self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch:
+            if not self._queue.empty():
+                items.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return items
+
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            X = np.array([row for row, _ in items], dtype=np.float64).reshape(len(items), self.width)
+            try:
+                results = await asyncio.to_thread(self.fn, X)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += len(items)
+            for (_, future), result in zip(items, results):
+                # The caller may have gone away (client disconnect)
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
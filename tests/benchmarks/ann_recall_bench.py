@@ -0,0 +1,67 @@
+"""
+Recall-vs-exact harness for the matcher IVF index.
+
+Builds a gallery of synthetic iris-like 512-d embeddings, computes exact
+top-k ground truth, then sweeps n_probe and reports recall@1, recall@k and
+per-query latency for each setting.
+
+Usage:
+    python tests/benchmarks/ann_recall_bench.py --size 100000 --lists 1024
+"""
+import argparse
+import logging
+
+import numpy as np
+
+from bench_utils import load_service_module, iris_like_embeddings, noisy_copies, timed, summarize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("ann-bench")
+
+gallery_mod = load_service_module("matcher", "gallery")
+ann_mod = load_service_module("matcher", "ann")
+
+
+def run(size, dim, lists, probes, queries, k, noise):
+    templates = iris_like_embeddings(size, dim)
+    gallery = gallery_mod.TemplateGallery(dim=dim, initial_capacity=size)
+    gallery.upsert_many([f"user_{i}" for i in range(size)], templates)
+
+    gallery.attach_index(ann_mod.IVFIndex(n_lists=lists))
+    _, train_ms = timed(gallery.train_index)
+    logger.info(f"Trained IVF: n={size} lists={lists} in {train_ms[0]:.0f}ms")
+
+    rows = np.random.default_rng(3).integers(0, size, size=queries)
+    query_vecs = noisy_copies(templates[rows], noise=noise)
+
+    truth, exact_lat = [], []
+    for q in query_vecs:
+        res, lat = timed(gallery.search, q, k=k)
+        truth.append([u for u, _ in res])
+        exact_lat.extend(lat)
+    logger.info(f"[exact ] {summarize(exact_lat)}")
+
+    for n_probe in probes:
+        r1 = rk = 0.0
+        lat_all = []
+        for q, gt in zip(query_vecs, truth):
+            res, lat = timed(gallery.search, q, k=k, mode="ivf", n_probe=n_probe)
+            lat_all.extend(lat)
+            got = [u for u, _ in res]
+            r1 += bool(got) and got[0] == gt[0]
+            rk += len(set(got) & set(gt)) / len(gt)
+        logger.info(f"[ivf   ] n_probe={n_probe:>4} recall@1={r1 / queries:.3f} "
+                    f"recall@{k}={rk / queries:.3f} {summarize(lat_all)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--lists", type=int, default=1024)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--noise", type=float, default=0.3)
+    args = parser.parse_args()
+    run(args.size, args.dim, args.lists, args.probes, args.queries, args.k, args.noise)
@@ -0,0 +1,221 @@
+"""
+auth-service /token: the legacy login (sync SQLAlchemy session and an
+inline bcrypt verify inside the async handler) vs the async engine with
+bcrypt in a bounded process pool and the unknown-email negative cache.
+
+Both run in-process against the same sqlite file through httpx's ASGI
+transport, with users seeded from one precomputed hash.
+
+  checks (exit status 1 if any fails)
+    - right password -> token, wrong password -> 401, unknown email -> 401
+      and cached; registering that email clears it and the login succeeds
+    - hashes from gabizap_common.passwords verify like passlib's did
+      ($2b$, first 72 bytes significant)
+  load
+    - login RPS at 1, 16 and 64 concurrent clients, divided by the cores
+      the bcrypt pool uses (nothing else running, so both handlers get the
+      same CPU)
+    - /health latency while logins run at the highest concurrency (the
+      event loop's responsiveness), in a separate pass: the probes cost CPU
+      that would otherwise show up as lower async RPS on a single core
+    - a credential-stuffing burst of unknown emails, repeated over a
+      small list: rejections per second with and without the cache, and
+      latency of the first attempt per address (database lookup) vs repeats
+
+Usage:
+    python tests/benchmarks/auth_login_bench.py --concurrency 1 16 64 --requests 64 --rounds 12
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench_utils import load_service_module, summarize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("auth-login-bench")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+TMP = tempfile.mkdtemp(prefix="auth-login-bench-")
+DB_PATH = os.path.join(TMP, "auth.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+os.environ.setdefault("HASH_MAX_PENDING", "1024")
+
+import bcrypt  # noqa: E402
+from fastapi import FastAPI, HTTPException  # noqa: E402
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from gabizap_common.passwords import hash_password, verify_password  # noqa: E402
+
+auth = load_service_module("auth-service", "main")
+models = load_service_module("auth-service", "models")
+schemas = load_service_module("auth-service", "schemas")
+NegativeCache = load_service_module("auth-service", "negative_cache").NegativeCache
+
+PASSWORD = "correct horse battery staple"
+
+
+def legacy_app():
+    engine = create_engine(os.environ["DATABASE_URL"])
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    app = FastAPI()
+
+    @app.post("/token")
+    async def login_for_access_token(form_data: schemas.UserLogin):
+        # The original handler: a pooled sync session and pwd_context.verify on the event loop
+        db = SessionLocal()
+        try:
+            user = db.query(models.User).filter(models.User.email == form_data.email).first()
+            if not user or not bcrypt.checkpw(form_data.password.encode(), user.hashed_password.encode()):
+                raise HTTPException(status_code=401, detail="Incorrect username or password")
+            return {"access_token": auth.create_access_token({"sub": user.email}), "token_type": "bearer"}
+        finally:
+            db.close()
+
+    @app.get("/health")
+    def health_check():
+        return {"status": "healthy"}
+
+    return app
+
+
+def seed(users: int, rounds: int):
+    hashed = hash_password(PASSWORD, rounds=rounds)
+    engine = create_engine(os.environ["DATABASE_URL"])
+    with engine.begin() as conn:
+        conn.execute(models.User.__table__.insert(),
+                     [{"email": f"user{i}@example.com", "hashed_password": hashed} for i in range(users)])
+    engine.dispose()
+
+
+def checks_passwords() -> bool:
+    long_password = "x" * 100
+    hashed = hash_password(long_password, rounds=4)
+    ok = (hashed.startswith("$2b$04$") and verify_password(long_password, hashed)
+          and verify_password("x" * 72 + "different tail", hashed) and not verify_password("x" * 71, hashed)
+          and not verify_password("anything", "not-a-bcrypt-hash"))
+    logger.info(f"[{'PASS' if ok else 'FAIL'}] bcrypt via gabizap_common.passwords: $2b$ hashes, 72-byte limit, "
+                f"malformed hash rejected")
+    return ok
+
+
+async def checks_login(client) -> bool:
+    results = []
+
+    def check(name, ok, detail=""):
+        results.append(ok)
+        logger.info(f"[{'PASS' if ok else 'FAIL'}] {name}{': ' + detail if detail else ''}")
+
+    resp = await client.post("/token", json={"email": "user0@example.com", "password": PASSWORD})
+    check("right password", resp.status_code == 200 and "access_token" in resp.json(), str(resp.status_code))
+    resp = await client.post("/token", json={"email": "user0@example.com", "password": "wrong"})
+    check("wrong password", resp.status_code == 401, str(resp.status_code))
+
+    email = "newcomer@example.com"
+    hits = auth.unknown_emails.hits
+    first = await client.post("/token", json={"email": email, "password": PASSWORD})
+    second = await client.post("/token", json={"email": email, "password": PASSWORD})
+    check("unknown email cached", first.status_code == second.status_code == 401
+          and auth.unknown_emails.hits == hits + 1)
+    created = await client.post("/users/", json={"email": email, "password": PASSWORD})
+    resp = await client.post("/token", json={"email": email, "password": PASSWORD})
+    check("registration clears the cache", created.status_code == 200 and resp.status_code == 200,
+          f"register {created.status_code}, login {resp.status_code}")
+    return all(results)
+
+
+async def load(client, concurrency: int, total: int, body, expect: int, probe_health: bool = False):
+    # Indexed by request number, so callers can split first attempts from repeats
+    latencies, health = [0.0] * total, []
+    counter = iter(range(total))
+    done = asyncio.Event()
+
+    async def worker():
+        for i in counter:
+            t0 = time.perf_counter()
+            resp = await client.post("/token", json=body(i))
+            latencies[i] = (time.perf_counter() - t0) * 1000.0
+            assert resp.status_code == expect, resp.text
+            # A request that never suspends (a cache hit through the in-process
+            # transport) would otherwise keep the loop from the other clients;
+            # over sockets every request is a separate wakeup
+            await asyncio.sleep(0)
+
+    async def probe():
+        while not done.is_set():
+            t0 = time.perf_counter()
+            await client.get("/health")
+            health.append((time.perf_counter() - t0) * 1000.0)
+            await asyncio.sleep(0.02)
+
+    prober = asyncio.create_task(probe()) if probe_health else None
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    took = time.perf_counter() - t0
+    done.set()
+    if prober is not None:
+        await prober
+    return total / took, latencies, health
+
+
+async def run(args) -> bool:
+    await auth.startup()
+    seed(args.users, args.rounds)
+    cores = auth.hasher.workers
+    logger.info(f"[setup] {args.users} users, bcrypt cost {args.rounds}, {cores} hash worker(s), "
+                f"{os.cpu_count()} core(s)")
+    apps = (("legacy", legacy_app()), ("async ", auth.app))
+    passed = checks_passwords()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=auth.app), base_url="http://auth") as client:
+        passed = await checks_login(client) and passed
+
+    login = lambda i: {"email": f"user{i % args.users}@example.com", "password": PASSWORD}  # noqa: E731
+    for concurrency in args.concurrency:
+        for name, app in apps:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://auth") as client:
+                rps, latencies, _ = await load(client, concurrency, args.requests, login, 200)
+            logger.info(f"[login {name}] concurrency={concurrency:>3} rps={rps:6.1f} "
+                        f"rps/core={rps / cores:6.1f} {summarize(latencies)}")
+    for name, app in apps:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://auth") as client:
+            _, _, health = await load(client, max(args.concurrency), args.requests, login, 200, probe_health=True)
+        logger.info(f"[login {name}] /health during logins: {summarize(health)} over {len(health)} probes")
+
+    # Stuffing: many attempts over a short list of addresses that don't exist
+    addresses = 200
+    stuffing = lambda i: {"email": f"leaked{i % addresses}@example.org", "password": "hunter2"}  # noqa: E731
+    cache = auth.unknown_emails
+    for name, negative_cache in (("no cache", NegativeCache(b"bench", ttl=0.0)), ("cached  ", cache)):
+        auth.unknown_emails = negative_cache
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=auth.app), base_url="http://auth") as client:
+            rps, latencies, _ = await load(client, 64, args.stuffing, stuffing, 401)
+        logger.info(f"[stuffing {name}] {args.stuffing} unknown-email attempts: rps={rps:7.1f} "
+                    f"{summarize(latencies)}")
+        logger.info(f"[stuffing {name}]   first per address: {summarize(latencies[:addresses])}, "
+                    f"repeats: {summarize(latencies[addresses:])}")
+    auth.unknown_emails = cache
+    await auth.shutdown()
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--stuffing", type=int, default=5000)
+    args = parser.parse_args()
+    try:
+        passed = asyncio.run(run(args))
+    finally:
+        for name in os.listdir(TMP):
+            os.unlink(os.path.join(TMP, name))
+        os.rmdir(TMP)
+    sys.exit(0 if passed else 1)
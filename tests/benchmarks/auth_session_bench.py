@@ -0,0 +1,130 @@
+"""
+auth-service session latency, against a temporary sqlite database and an
+in-process fake Redis (fakeredis). Rotation, reuse detection and revocation
+are covered by tests/unit/test_auth_sessions.py.
+
+  latency
+    - /validate with the session in memory, in Redis only, and loaded from
+      the database on every call (the layer the cache replaces)
+    - re-authentication: /token/refresh vs a bcrypt /token login
+
+Usage:
+    python tests/benchmarks/auth_session_bench.py --sessions 200 --requests 5000 --rounds 12
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+import fakeredis
+import httpx
+from sqlalchemy import event
+
+from bench_utils import load_service_module, summarize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("auth-session-bench")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+TMP = tempfile.mkdtemp(prefix="auth-session-bench-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP, 'auth.db')}"
+os.environ.pop("REDIS_URL", None)
+
+from gabizap_common.passwords import hash_password  # noqa: E402
+from gabizap_common.revocation import RevocationFeed  # noqa: E402
+
+auth = load_service_module("auth-service", "main")
+models = load_service_module("auth-service", "models")
+
+PASSWORD = "correct horse battery staple"
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+async def seed(users, rounds: int):
+    async with auth.SessionLocal() as db:
+        for email, role in users:
+            db.add(models.User(email=email, hashed_password=hash_password(PASSWORD, rounds=rounds), role=role))
+        await db.commit()
+
+
+async def login(client, email):
+    resp = await client.post("/token", json={"email": email, "password": PASSWORD})
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def bearer(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+async def validate_load(client, tokens, total):
+    latencies = []
+    for i in range(total):
+        t0 = time.perf_counter()
+        resp = await client.get("/validate", headers=bearer(tokens[i % len(tokens)]))
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+        assert resp.status_code == 200, resp.text
+    return latencies
+
+
+async def run(args):
+    server = fakeredis.FakeServer()
+    auth.revocation_redis = fakeredis.FakeAsyncRedis(server=server)
+    auth.revocation_feed = RevocationFeed(fakeredis.FakeAsyncRedis(server=server), auth.revocations)
+    auth.sessions.redis = fakeredis.FakeAsyncRedis(server=server)
+    await auth.startup()
+    await seed([(f"load{i}@example.com", "user") for i in range(args.sessions)], 4)
+    await seed([("slow@example.com", "user")], args.rounds)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=auth.app), base_url="http://auth") as client:
+        tokens = [await login(client, f"load{i}@example.com") for i in range(args.sessions)]
+        counter = QueryCounter(auth.engine)
+        store, local_ttl = auth.sessions, auth.sessions.local_ttl_s
+        for name, redis_client, ttl in (("memory  ", store.redis, local_ttl), ("redis   ", store.redis, 0.0),
+                                        ("database", None, 0.0)):
+            store.redis, store.local_ttl_s = redis_client, ttl
+            store._local.clear()
+            before = counter.count
+            latencies = await validate_load(client, tokens, args.requests)
+            logger.info(f"[validate {name}] {summarize(latencies)} "
+                        f"{(counter.count - before) / args.requests:.2f} db queries/call")
+        store.redis, store.local_ttl_s = auth.revocation_redis, local_ttl
+
+        refresh_token = (await login(client, "slow@example.com"))["refresh_token"]
+        logins, refreshes = [], []
+        for _ in range(args.reauth):
+            t0 = time.perf_counter()
+            await login(client, "slow@example.com")
+            logins.append((time.perf_counter() - t0) * 1000.0)
+            t0 = time.perf_counter()
+            resp = await client.post("/token/refresh", json={"refresh_token": refresh_token})
+            refreshes.append((time.perf_counter() - t0) * 1000.0)
+            refresh_token = resp.json()["refresh_token"]
+        logger.info(f"[re-auth] /token (bcrypt cost {args.rounds}): {summarize(logins)}")
+        logger.info(f"[re-auth] /token/refresh:             {summarize(refreshes)}")
+    await auth.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--reauth", type=int, default=10)
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    finally:
+        for name in os.listdir(TMP):
+            os.unlink(os.path.join(TMP, name))
+        os.rmdir(TMP)
@@ -0,0 +1,115 @@
+"""
+risk-engine per-user baselines (UserBaselines): memory per user, update and
+query rate at a few million users, plus accuracy checks.
+
+  checks (exit status 1 if any fails)
+    - Welford mean/std match numpy over a long stream (float32 state)
+    - circular hour statistics: a user logging in around midnight has a
+      mean hour near 0 and a small std, not a ~10h linear std
+    - the decayed velocity converges on the true events-per-minute rate
+  scale
+    - users created with one event each, then random updates and queries;
+      memory per user split into the numpy rows and the user_id dict
+
+Usage:
+    python tests/benchmarks/baselines_bench.py --users 3000000 --updates 1000000
+"""
+import argparse
+import logging
+import sys
+import time
+
+import numpy as np
+
+from bench_utils import load_service_module
+
+UserBaselines = load_service_module("risk-engine", "baselines").UserBaselines
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("baselines-bench")
+
+
+def checks() -> bool:
+    results = []
+
+    def check(name, ok, detail):
+        results.append(ok)
+        logger.info(f"[{'PASS' if ok else 'FAIL'}] {name}: {detail}")
+
+    rng = np.random.default_rng(0)
+    b = UserBaselines(values=("geo_dist", "volume"))
+    xs = rng.normal(1200.0, 35.0, size=100000)
+    t = 1.7e9
+    for x in xs:
+        b.observe("welford", 9, {"volume": float(x)}, ts=t)
+    p = b.profile("welford", ts=t)
+    ok = abs(p["volume_mean"] - xs.mean()) < 0.05 and abs(p["volume_std"] - xs.std()) < 0.05
+    check("Welford vs numpy", ok, f"mean {p['volume_mean']:.3f} vs {xs.mean():.3f}, "
+                                  f"std {p['volume_std']:.3f} vs {xs.std():.3f} over {len(xs)} events; "
+                                  f"geo_dist untouched: {p['geo_dist_mean']}")
+
+    hours = np.round(rng.normal(0.0, 1.0, size=2000)).astype(int) % 24
+    for h in hours:
+        b.observe("night", int(h), ts=t)
+    p = b.profile("night", hour=23, ts=t)
+    mean_ok = min(p["mean_login_hour"], 24 - p["mean_login_hour"]) < 0.3
+    check("circular hours", mean_ok and p["login_hour_std"] < 1.3,
+          f"mean {p['mean_login_hour']}h std {p['login_hour_std']}h (linear std {hours.std():.1f}h), "
+          f"share of 23:00 {p['hour_share']:.2f}")
+
+    rate_per_min = 12.0
+    ts, seen = t, []
+    for i in range(5000):
+        ts += rng.exponential(60.0 / rate_per_min)
+        b.observe("steady", 10, ts=ts)
+        if ts - t > 3 * b.tau_s:
+            seen.append(b.profile("steady", ts=ts + rng.uniform(0, 60.0 / rate_per_min))["velocity"])
+    v = float(np.mean(seen))
+    check("decayed velocity", abs(v - rate_per_min) < 0.05 * rate_per_min,
+          f"{v:.2f}/min on average (spread {np.std(seen):.1f}) for a true {rate_per_min}/min "
+          f"(tau {b.tau_s:.0f}s)")
+    return all(results)
+
+
+def scale(users: int, updates: int, queries: int):
+    rng = np.random.default_rng(1)
+    ids = [f"user{i:08d}" for i in range(users)]
+    hours = rng.integers(0, 24, size=max(users, updates))
+    volume = rng.gamma(2.0, 100.0, size=max(users, updates))
+
+    b = UserBaselines(values=("geo_dist", "volume"), initial_capacity=1024)
+    t0 = time.perf_counter()
+    now = time.time()
+    for i, user_id in enumerate(ids):
+        b.observe(user_id, int(hours[i]), {"geo_dist": 0.0, "volume": float(volume[i])}, ts=now)
+    create = time.perf_counter() - t0
+    id_strings = sum(sys.getsizeof(s) for s in ids)
+    logger.info(f"[scale] {users} users created in {create:.1f}s ({users / create:,.0f}/s)")
+    logger.info(f"[scale] memory per user: {b.nbytes / users:.0f} B arrays "
+                f"(capacity {b.rate.shape[0]} rows allocated) + {sys.getsizeof(b._rows) / users:.0f} B id dict "
+                f"+ {id_strings / users:.0f} B id strings (shared with the caller)")
+
+    picks = rng.integers(0, users, size=updates)
+    t0 = time.perf_counter()
+    for j, i in enumerate(picks):
+        b.observe(ids[i], int(hours[j]), {"geo_dist": 1.0, "volume": float(volume[j])}, ts=now + j * 1e-3)
+    took = time.perf_counter() - t0
+    logger.info(f"[scale] {updates} updates: {updates / took:,.0f}/s ({took / updates * 1e6:.2f} us each)")
+
+    picks = rng.integers(0, users, size=queries)
+    t0 = time.perf_counter()
+    for j, i in enumerate(picks):
+        b.profile(ids[i], hour=int(hours[j % len(hours)]))
+    took = time.perf_counter() - t0
+    logger.info(f"[scale] {queries} profile queries: {queries / took:,.0f}/s ({took / queries * 1e6:.2f} us each)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=3000000)
+    parser.add_argument("--updates", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200000)
+    args = parser.parse_args()
+    passed = checks()
+    scale(args.users, args.updates, args.queries)
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,329 @@
+import importlib
+import os
+import sys
+import time
+import types
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+# gabizap_common is pip-installed from services/common in the service images
+sys.path.insert(0, os.path.join(ROOT, "services", "common"))
+
+
+def load_service_module(service: str, module: str):
+    """
+    Imports services/<service>/<module>.py as '<pkg>.<module>' so that the
+    relative imports used inside the service directories resolve, even though
+    the directory names (e.g. 'iris-engine') are not valid package names.
+    """
+    pkg_name = "svc_" + service.replace("-", "_")
+    if pkg_name not in sys.modules:
+        pkg = types.ModuleType(pkg_name)
+        pkg.__path__ = [os.path.join(ROOT, "services", service)]
+        sys.modules[pkg_name] = pkg
+    return importlib.import_module(f"{pkg_name}.{module}")
+
+
+def synthetic_embeddings(n: int, dim: int = 512, seed: int = 0) -> np.ndarray:
+    """Unit-norm float32 vectors, generated in chunks to bound peak memory."""
+    rng = np.random.default_rng(seed)
+    out = np.empty((n, dim), dtype=np.float32)
+    chunk = 65536
+    for start in range(0, n, chunk):
+        block = rng.standard_normal((min(chunk, n - start), dim), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        out[start:start + block.shape[0]] = block
+    return out
+
+
+def iris_like_embeddings(n: int, dim: int = 512, seed: int = 0) -> np.ndarray:
+    """
+    Vectors shaped like IrisModel.get_embedding output: the first `dim`
+    row-major DCT coefficients of a 64x64 crop, L2-normalized. Energy decays
+    with spatial frequency and the DC term dominates, so the vectors are far
+    more concentrated than isotropic noise (the hard case for coarse quantizers).
+    """
+    rng = np.random.default_rng(seed)
+    u, v = np.divmod(np.arange(dim), 64)
+    scale = (1.0 / (1.0 + u + v)).astype(np.float32)
+    mean = np.zeros(dim, dtype=np.float32)
+    mean[0] = 4.0
+    out = np.empty((n, dim), dtype=np.float32)
+    chunk = 65536
+    for start in range(0, n, chunk):
+        block = mean + scale * rng.standard_normal((min(chunk, n - start), dim), dtype=np.float32)
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        out[start:start + block.shape[0]] = block
+    return out
+
+
+def synthetic_eye_images(n: int, size=(480, 640), seed: int = 0):
+    """JPEG-encoded grayscale eye-like frames: textured iris ring around a dark pupil."""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    h, w = size
+    images = []
+    for _ in range(n):
+        img = rng.normal(170, 12, (h, w)).clip(0, 255).astype(np.uint8)
+        cx, cy = w // 2 + int(rng.integers(-40, 40)), h // 2 + int(rng.integers(-30, 30))
+        iris_r = int(rng.integers(90, 120))
+        cv2.circle(img, (cx, cy), iris_r, int(rng.integers(70, 110)), -1)
+        # Radial texture so each synthetic iris is distinct
+        for _ in range(60):
+            angle = rng.uniform(0, 2 * np.pi)
+            r0, r1 = rng.uniform(0.35, 0.6) * iris_r, rng.uniform(0.7, 0.98) * iris_r
+            p0 = (int(cx + r0 * np.cos(angle)), int(cy + r0 * np.sin(angle)))
+            p1 = (int(cx + r1 * np.cos(angle)), int(cy + r1 * np.sin(angle)))
+            cv2.line(img, p0, p1, int(rng.integers(40, 140)), 1)
+        cv2.circle(img, (cx, cy), int(iris_r * rng.uniform(0.3, 0.45)), 15, -1)
+        img = cv2.GaussianBlur(img, (3, 3), 0)
+        _, buf = cv2.imencode(".jpg", img)
+        images.append(buf.tobytes())
+    return images
+
+
+def eye_recaptures(images, max_angle: float = 6.0, noise: float = 6.0, seed: int = 2):
+    """Genuine re-captures of synthetic_eye_images: small head tilt plus sensor noise."""
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    out = []
+    for buf in images:
+        img = cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_GRAYSCALE)
+        h, w = img.shape
+        rot = cv2.getRotationMatrix2D((w / 2, h / 2), rng.uniform(-max_angle, max_angle), 1.0)
+        img = cv2.warpAffine(img, rot, (w, h), borderMode=cv2.BORDER_REFLECT)
+        img = np.clip(img + rng.normal(0, noise, img.shape), 0, 255).astype(np.uint8)
+        out.append(cv2.imencode(".jpg", img)[1].tobytes())
+    return out
+
+
+LIVENESS_KINDS = ("live", "print", "screen", "noise", "blur")
+
+
+def synthetic_liveness_frames(n: int, size=(480, 640), seed: int = 0):
+    """
+    JPEG frames with liveness labels (1 = live), as (images, labels, kinds).
+    Live frames are synthetic eyes with sensor noise. Spoofs are:
+    - print: blurred, low-contrast re-photographs with paper grain;
+    - screen: replays with a moire grating and display blur;
+    - noise and blur: the two vectors of tests/red-team/attack_sim.py.
+    Half the frames are live; the spoof kinds share the other half.
+    """
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    h, w = size
+    eyes = [cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_GRAYSCALE)
+            for buf in synthetic_eye_images(n, size=size, seed=seed)]
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    images, labels, kinds = [], [], []
+    for i, eye in enumerate(eyes):
+        kind = "live" if i % 2 == 0 else LIVENESS_KINDS[1 + (i // 2) % 4]
+        eye = eye.astype(np.float32)
+        if kind == "live":
+            img = eye + rng.normal(0, rng.uniform(5, 14), eye.shape)
+        elif kind == "print":
+            img = cv2.GaussianBlur(eye, (0, 0), rng.uniform(1.2, 2.5))
+            img = 90 + (img - 90) * rng.uniform(0.5, 0.8) + rng.normal(0, 2, eye.shape)
+        elif kind == "screen":
+            angle, freq = rng.uniform(0, np.pi), rng.uniform(0.12, 0.4)
+            grating = np.sin(2 * np.pi * freq * (xx * np.cos(angle) + yy * np.sin(angle)))
+            img = cv2.GaussianBlur(eye, (0, 0), rng.uniform(0.6, 1.2)) * (1 + rng.uniform(0.06, 0.2) * grating)
+            img += rng.normal(0, 3, eye.shape)
+        elif kind == "noise":
+            img = rng.integers(0, 255, eye.shape).astype(np.float32)
+        else:
+            img = np.zeros(eye.shape, dtype=np.uint8)
+            cv2.putText(img, "FAKE FACE", (w // 6, h // 2), cv2.FONT_HERSHEY_SIMPLEX, 2 * w / 320, 255, 4)
+            img = cv2.blur(img, (20, 20)).astype(np.float32)
+        img = img.clip(0, 255).astype(np.uint8)
+        quality = int(rng.integers(80, 96))
+        images.append(cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+        labels.append(int(kind == "live"))
+        kinds.append(kind)
+    return images, np.asarray(labels), kinds
+
+
+CLIP_KINDS = ("live", "photo", "handheld", "replay")
+
+
+def synthetic_eye_clip(kind: str, frames: int = 30, size=(480, 640), seed: int = 0):
+    """
+    JPEG frames of one synthetic eye capture, for streaming liveness.
+    - live: pupil radius oscillates (hippus), one blink, small non-rigid
+      jitter and fresh sensor noise every frame;
+    - photo: one print (blurred, flattened) held still in front of the camera;
+    - handheld: the same print moved rigidly by a shaking hand;
+    - replay: the live clip shown on a screen (moire grating, display blur).
+    """
+    import cv2
+
+    rng = np.random.default_rng(seed)
+    h, w = size
+    cx, cy = w // 2 + int(rng.integers(-30, 30)), h // 2 + int(rng.integers(-20, 20))
+    iris_r = int(rng.integers(90, 120))
+    base = rng.normal(170, 12, (h, w)).clip(0, 255).astype(np.uint8)
+    cv2.circle(base, (cx, cy), iris_r, int(rng.integers(70, 110)), -1)
+    for _ in range(60):
+        angle = rng.uniform(0, 2 * np.pi)
+        r0, r1 = rng.uniform(0.35, 0.6) * iris_r, rng.uniform(0.7, 0.98) * iris_r
+        cv2.line(base, (int(cx + r0 * np.cos(angle)), int(cy + r0 * np.sin(angle))),
+                 (int(cx + r1 * np.cos(angle)), int(cy + r1 * np.sin(angle))), int(rng.integers(40, 140)), 1)
+    pupil_r = iris_r * rng.uniform(0.3, 0.4)
+    blink_at = int(rng.integers(frames // 4, frames // 2 + 1))
+    yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+    angle, freq = rng.uniform(0, np.pi), rng.uniform(0.12, 0.4)
+    grating = np.sin(2 * np.pi * freq * (xx * np.cos(angle) + yy * np.sin(angle)))
+
+    def live_frame(t):
+        img = base.copy()
+        radius = pupil_r * (1 + 0.12 * np.sin(2 * np.pi * t / rng.uniform(8, 14)))
+        cv2.circle(img, (cx, cy), int(radius), 15, -1)
+        if abs(t - blink_at) <= 1:
+            lid = int(iris_r * (1.2 if t == blink_at else 0.6))
+            cv2.rectangle(img, (0, 0), (w, cy - iris_r + 2 * lid), 150, -1)
+        # Non-rigid: independent small shifts of the eye region and the background
+        m = np.float32([[1, 0, rng.normal(0, 0.8)], [0, 1, rng.normal(0, 0.8)]])
+        eye = cv2.warpAffine(img, m, (w, h), borderMode=cv2.BORDER_REFLECT)
+        mask = np.hypot(xx - cx, yy - cy) < iris_r * 1.3
+        img = np.where(mask, eye, img).astype(np.float32)
+        return cv2.GaussianBlur(img, (3, 3), 0)
+
+    if kind in ("photo", "handheld"):
+        printed = cv2.GaussianBlur(live_frame(0), (0, 0), rng.uniform(1.2, 2.0))
+        printed = 90 + (printed - 90) * rng.uniform(0.5, 0.8)
+    out = []
+    for t in range(frames):
+        if kind == "live":
+            img = live_frame(t) + rng.normal(0, rng.uniform(5, 10), (h, w))
+        elif kind == "replay":
+            img = cv2.GaussianBlur(live_frame(t), (0, 0), 0.8) * (1 + 0.12 * grating) + rng.normal(0, 3, (h, w))
+        else:
+            img = printed
+            if kind == "handheld":
+                dx, dy = 6 * np.sin(t / 3.0) + rng.normal(0, 1), 4 * np.cos(t / 4.0) + rng.normal(0, 1)
+                img = cv2.warpAffine(img, np.float32([[1, 0, dx], [0, 1, dy]]), (w, h),
+                                     borderMode=cv2.BORDER_REFLECT)
+            img = img + rng.normal(0, 2, (h, w))
+        out.append(cv2.imencode(".jpg", img.clip(0, 255).astype(np.uint8))[1].tobytes())
+    return out
+
+
+def synthetic_iris_codes(n: int, bits: int = 4096, columns: int = 128, masked: float = 0.05, seed: int = 0):
+    """Random packed iris codes and masks (uint8 rows) in the iris-engine column layout."""
+    rng = np.random.default_rng(seed)
+    codes = np.packbits(rng.random((n, bits)) < 0.5, axis=1)
+    # Occlusions come in angular runs (eyelids), not scattered bits
+    per_col = bits // columns
+    cols = rng.random((n, columns)) >= masked
+    masks = np.packbits(np.repeat(cols, per_col, axis=1), axis=1)
+    return codes, masks
+
+
+def iris_code_probes(codes, masks, flip: float = 0.2, max_shift: int = 6, columns: int = 128, seed: int = 1):
+    """Genuine re-reads: rotated by up to max_shift columns with a fraction of bits flipped."""
+    rng = np.random.default_rng(seed)
+    n, n_bytes = codes.shape
+    shifts = rng.integers(-max_shift, max_shift + 1, size=n)
+    noise = np.packbits(rng.random((n, n_bytes * 8)) < flip, axis=1)
+    noisy = codes ^ noise
+    rot_codes = np.stack([np.roll(c.reshape(columns, -1), s, axis=0).ravel() for c, s in zip(noisy, shifts)])
+    rot_masks = np.stack([np.roll(m.reshape(columns, -1), s, axis=0).ravel() for m, s in zip(masks, shifts)])
+    return rot_codes, rot_masks, shifts
+
+
+def noisy_copies(base: np.ndarray, noise: float = 0.3, seed: int = 1) -> np.ndarray:
+    """Probes that are perturbed re-captures of gallery templates."""
+    rng = np.random.default_rng(seed)
+    probes = base + noise * rng.standard_normal(base.shape, dtype=np.float32) / np.sqrt(base.shape[1])
+    return (probes / np.linalg.norm(probes, axis=1, keepdims=True)).astype(np.float32)
+
+
+def timed(fn, *args, repeat: int = 1, **kwargs):
+    """Runs fn repeat times; returns (last_result, list_of_latencies_ms)."""
+    latencies = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args, **kwargs)
+        latencies.append((time.perf_counter() - t0) * 1000.0)
+    return result, latencies
+
+
+def summarize(latencies_ms) -> str:
+    arr = np.asarray(latencies_ms)
+    return (f"p50={np.percentile(arr, 50):.2f}ms p99={np.percentile(arr, 99):.2f}ms "
+            f"mean={arr.mean():.2f}ms")
+
+
+# (direction in degrees from wrist->middle towards the index side,
+#  wrist->base length, segment lengths) in palm units; the thumb chain
+#  starts at the wrist, the fingers at their MCP joint
+_HAND_CHAINS = (
+    (50.0, 0.0, (0.45, 0.40, 0.33, 0.30)),
+    (14.0, 1.00, (0.45, 0.27, 0.22)),
+    (0.0, 1.02, (0.50, 0.30, 0.24)),
+    (-13.0, 0.96, (0.46, 0.29, 0.23)),
+    (-26.0, 0.86, (0.36, 0.21, 0.20)),
+)
+
+
+def synthetic_hand_identities(n: int, spread: float = 0.07, seed: int = 0):
+    """Per-identity hand proportions: (angles, base lengths, segment lengths) jittered around _HAND_CHAINS."""
+    rng = np.random.default_rng(seed)
+    identities = []
+    for _ in range(n):
+        palm = 1.0 + spread * rng.standard_normal()
+        chains = []
+        for angle, base, segments in _HAND_CHAINS:
+            finger = 1.0 + spread * rng.standard_normal()
+            chains.append((angle + 2.0 * rng.standard_normal(), base * palm,
+                           [s * finger * (1.0 + 0.5 * spread * rng.standard_normal()) for s in segments]))
+        identities.append(chains)
+    return identities
+
+
+def _rotation(rx: float, ry: float, rz: float) -> np.ndarray:
+    cx, sx, cy, sy, cz, sz = np.cos(rx), np.sin(rx), np.cos(ry), np.sin(ry), np.cos(rz), np.sin(rz)
+    return (np.array([[cz, -sz, 0], [sz, cz, 0], [0, 0, 1]])
+            @ np.array([[cy, 0, sy], [0, 1, 0], [-sy, 0, cy]])
+            @ np.array([[1, 0, 0], [0, cx, -sx], [0, sx, cx]]))
+
+
+def synthetic_hand_landmarks(identity, size=(480, 640), flex: float = 25.0, tilt: float = 15.0,
+                             noise_px: float = 1.5, rng=None):
+    """
+    One capture of an identity as mediapipe-style flattened (x, y, z)
+    landmarks normalized by the image size: random finger flexion, palm
+    size, position, in-plane rotation, tilt and per-landmark noise.
+    """
+    rng = rng or np.random.default_rng()
+    h, w = size
+    points = np.zeros((21, 3))
+    for c, (angle, base, segments) in enumerate(identity):
+        # Joint bases are fixed by the palm; splay only turns the finger itself
+        base_dir = np.radians(angle)
+        start = np.array([np.sin(base_dir), -np.cos(base_dir), 0.0]) * base
+        direction = base_dir + np.radians(rng.normal(0, 3.0))
+        heading = np.array([np.sin(direction), -np.cos(direction), 0.0])
+        index = 1 if c == 0 else 4 * c + 1
+        if c:
+            points[index] = start
+            index += 1
+        bend = 0.0
+        position = start
+        for length in segments:
+            bend += np.radians(rng.uniform(0, flex))
+            step = heading * np.cos(bend) + np.array([0, 0, -np.sin(bend)])
+            position = position + length * step
+            points[index] = position
+            index += 1
+    palm_px = rng.uniform(60, 140)
+    rot = _rotation(*np.radians(rng.uniform(-tilt, tilt, 2)), np.radians(rng.uniform(-40, 40)))
+    points = points @ rot.T * palm_px
+    points[:, :2] += (rng.uniform(0.35, 0.65) * w, rng.uniform(0.55, 0.75) * h)
+    points += rng.normal(0, noise_px, points.shape) * (1, 1, 2)
+    return (points / (w, h, w)).ravel().tolist()
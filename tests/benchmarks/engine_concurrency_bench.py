@@ -0,0 +1,117 @@
+"""
+Event-loop responsiveness of a CPU-bound engine endpoint under load: the
+legacy inline handler vs the same work offloaded through
+gabizap_common.executor.BoundedExecutor. Heavy clients hammer /work with
+full-size eye images (the real iris pipeline) while a prober times /health
+and a light client times a cheap request.
+
+Usage:
+    python tests/benchmarks/engine_concurrency_bench.py --heavy-clients 8 --seconds 5
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import httpx
+import numpy as np
+from fastapi import FastAPI, UploadFile, File
+
+from bench_utils import load_service_module, synthetic_eye_images, summarize
+
+from gabizap_common.executor import BoundedExecutor, register_overload_handler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("engine-concurrency-bench")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+model_mod = load_service_module("iris-engine", "model")
+_model = None
+
+
+def heavy_work(contents: bytes):
+    global _model
+    if _model is None:
+        _model = model_mod.IrisModel()
+    # Several passes so one request costs what a large upload would
+    for _ in range(4):
+        template = _model.analyze(contents)
+    return len(template.code)
+
+
+def build_app(offload: bool, workers: int, max_pending: int):
+    app = FastAPI()
+    executor = BoundedExecutor("bench", kind="process", workers=workers, max_pending=max_pending)
+    register_overload_handler(app)
+
+    @app.post("/work")
+    async def work(file: UploadFile = File(...)):
+        contents = await file.read()
+        if offload:
+            return {"bytes": await executor.run(heavy_work, contents)}
+        return {"bytes": heavy_work(contents)}
+
+    @app.get("/user/{user_id}")
+    async def small(user_id: str):
+        return {"user_id": user_id}
+
+    @app.get("/health")
+    def health():
+        return {"status": "healthy"}
+
+    return app, executor
+
+
+async def drive(app, images, heavy_clients: int, seconds: float):
+    transport = httpx.ASGITransport(app=app)
+    stats = {"ok": 0, "busy": 0, "health": [], "small": []}
+    start = time.perf_counter()
+    deadline = start + seconds
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def heavy(i):
+            while time.perf_counter() < deadline:
+                resp = await client.post("/work", files={"file": ("eye.jpg", images[i % len(images)])})
+                if resp.status_code == 503:
+                    stats["busy"] += 1
+                    await asyncio.sleep(0.05)
+                else:
+                    stats["ok"] += 1
+
+        async def probe(path, key):
+            # One probe due every 10ms; latency counts from when it was due, so
+            # time the probe spent unable to even start (blocked loop) is included
+            due = start
+            while due < deadline:
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                await client.get(path)
+                done = time.perf_counter()
+                stats[key].append((done - due) * 1000.0)
+                due = max(due + 0.01, done)
+
+        await asyncio.gather(*(heavy(i) for i in range(heavy_clients)),
+                             probe("/health", "health"), probe("/user/u1", "small"))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heavy-clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--max-pending", type=int, default=0)
+    args = parser.parse_args()
+
+    images = synthetic_eye_images(8, size=(960, 1280))
+    for label, offload in (("inline ", False), ("offload", True)):
+        app, executor = build_app(offload, args.workers, args.max_pending or None)
+        executor.start()
+        stats = asyncio.run(drive(app, images, args.heavy_clients, args.seconds))
+        executor.shutdown()
+        logger.info(f"[{label}] heavy ok={stats['ok']} 503={stats['busy']} | "
+                    f"/health n={len(stats['health'])} {summarize(stats['health'])} | "
+                    f"small n={len(stats['small'])} {summarize(stats['small'])}")
+
+
+if __name__ == "__main__":
+    main()
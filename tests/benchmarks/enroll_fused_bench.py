@@ -0,0 +1,116 @@
+"""
+Per-scan CPU of multimodal enrollment: the legacy three-call path (each
+engine decoding the upload itself: PIL for liveness and hand, cv2 for iris)
+vs the fused iris-engine enroll_image (one decode, shared gray/RGB views,
+iris and hand stages run concurrently). Both run in-process, single worker,
+so the numbers are compute only; the legacy path also pays two extra HTTP
+round trips and uploads in production.
+
+The hand stage is included when mediapipe is installed.
+
+Usage:
+    python tests/benchmarks/enroll_fused_bench.py --scans 50 --size 960 1280 --format png
+"""
+import argparse
+import io
+import logging
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from bench_utils import load_service_module, summarize, synthetic_eye_images
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("enroll-bench")
+
+pipeline = load_service_module("iris-engine", "pipeline")
+
+from gabizap_common.liveness import check_liveness  # noqa: E402
+
+try:
+    import mediapipe  # noqa: F401
+    HAVE_HANDS = True
+except ImportError:
+    HAVE_HANDS = False
+
+
+def live_scans(n, size, fmt, seed=0):
+    """Synthetic eye frames re-encoded with sensor noise and colour, so they pass the liveness gate."""
+    rng = np.random.default_rng(seed)
+    scans = []
+    for buf in synthetic_eye_images(n, size=size, seed=seed):
+        gray = cv2.imdecode(np.frombuffer(buf, np.uint8), cv2.IMREAD_GRAYSCALE)
+        gray = np.clip(gray + rng.normal(0, 12, gray.shape), 0, 255).astype(np.uint8)
+        bgr = cv2.merge([gray, (gray * 0.9).astype(np.uint8), gray])
+        scans.append(cv2.imencode(f".{fmt}", bgr)[1].tobytes())
+    return scans
+
+
+def legacy_scan(contents, hands):
+    """What three separate uploads cost: every engine decodes and converts on its own."""
+    timings = {}
+    t0 = time.perf_counter()
+    # liveness-engine /check
+    rgb = np.array(Image.open(io.BytesIO(contents)))
+    check_liveness(cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY))
+    t1 = time.perf_counter()
+    # iris-engine /embed
+    pipeline._worker_model.analyze(contents)
+    t2 = time.perf_counter()
+    # hand-engine /process
+    rgb = np.array(Image.open(io.BytesIO(contents)))
+    if hands is not None:
+        hands.process(rgb)
+    t3 = time.perf_counter()
+    timings.update(liveness=(t1 - t0) * 1000.0, iris=(t2 - t1) * 1000.0, hand=(t3 - t2) * 1000.0)
+    return timings
+
+
+def main(scans, size, fmt):
+    pipeline._init_worker(None, hands=HAVE_HANDS)
+    hands = pipeline._worker_hands
+    images = live_scans(min(scans, 16), tuple(size), fmt)
+    logger.info(f"{len(images)} distinct {size[1]}x{size[0]} {fmt} scans, "
+                f"avg {np.mean([len(i) for i in images]) / 1024:.0f} KiB, hand stage: {HAVE_HANDS}")
+
+    for image in images[:2]:  # warm caches (Gabor bank, rubber-sheet maps)
+        legacy_scan(image, hands)
+        pipeline.enroll_image(image)
+
+    legacy, fused, stages = [], [], {}
+    cpu_legacy = cpu_fused = 0.0
+    for i in range(scans):
+        image = images[i % len(images)]
+        c0 = time.process_time()
+        t0 = time.perf_counter()
+        legacy_scan(image, hands)
+        t1 = time.perf_counter()
+        c1 = time.process_time()
+        result = pipeline.enroll_image(image)
+        t2 = time.perf_counter()
+        c2 = time.process_time()
+        legacy.append((t1 - t0) * 1000.0)
+        fused.append((t2 - t1) * 1000.0)
+        cpu_legacy += c1 - c0
+        cpu_fused += c2 - c1
+        if not result.is_live:
+            logger.warning("Scan rejected as spoof; fused timings exclude iris/hand")
+        for stage, ms in result.timings.items():
+            stages.setdefault(stage, []).append(ms)
+
+    logger.info(f"[legacy] wall {summarize(legacy)}  cpu/scan={cpu_legacy / scans * 1000:.1f}ms")
+    logger.info(f"[fused ] wall {summarize(fused)}  cpu/scan={cpu_fused / scans * 1000:.1f}ms")
+    logger.info("[fused ] stages " + " ".join(f"{s}={np.mean(v):.1f}ms" for s, v in stages.items()))
+    logger.info(f"speedup p50: {np.percentile(legacy, 50) / np.percentile(fused, 50):.2f}x, "
+                f"requests per scan: 3 -> 1")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scans", type=int, default=50)
+    parser.add_argument("--size", type=int, nargs=2, default=[960, 1280], metavar=("H", "W"))
+    parser.add_argument("--format", default="png", choices=["png", "jpg"])
+    args = parser.parse_args()
+    main(args.scans, args.size, args.format)
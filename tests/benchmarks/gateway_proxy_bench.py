@@ -0,0 +1,179 @@
+"""
+api-gateway proxy throughput: the legacy forward_request (new httpx client
+per request, buffered body, resp.json()) vs the pooled, streaming
+UpstreamPool. An upstream app, both gateways and the load generator talk
+over real localhost sockets (uvicorn servers in background threads), so
+connection setup costs are included.
+
+Workloads: small JSON GET, image-sized POST upload, binary GET download.
+The legacy path cannot relay binary bodies or non-200 statuses; the
+correctness section shows what each path returns.
+
+Usage:
+    python tests/benchmarks/gateway_proxy_bench.py --concurrency 1 16 64 --requests 2000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+from bench_utils import load_service_module, summarize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("gateway-proxy-bench")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+proxy = load_service_module("api-gateway", "proxy")
+
+BLOB = os.urandom(1 << 20)
+
+
+def upstream_app():
+    app = FastAPI()
+
+    @app.get("/users/{user_id}")
+    async def user(user_id: str):
+        return {"user_id": user_id, "status": "active"}
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+        return {"bytes": size}
+
+    @app.get("/blob")
+    async def blob(size: int = 256 * 1024):
+        return Response(BLOB[:size], media_type="application/octet-stream", headers={"x-upstream": "blob"})
+
+    @app.get("/missing")
+    async def missing():
+        raise HTTPException(status_code=404, detail="no such user")
+
+    return app
+
+
+def legacy_gateway(upstream: str):
+    app = FastAPI()
+
+    @app.api_route("/{path:path}", methods=["GET", "POST"])
+    async def forward(path: str, request: Request):
+        # The original forward_request body
+        async with httpx.AsyncClient() as client:
+            url = f"{upstream}/{path}"
+            try:
+                resp = await client.request(method=request.method, url=url, headers=request.headers,
+                                            params=request.query_params, content=await request.body())
+                return resp.json()
+            except httpx.RequestError:
+                raise HTTPException(status_code=503, detail="Service unavailable")
+
+    return app
+
+
+def pooled_gateway(upstream: str, max_connections: int, max_keepalive: int):
+    app = FastAPI()
+    pool = proxy.UpstreamPool(max_connections=max_connections, max_keepalive=max_keepalive)
+
+    @app.on_event("shutdown")
+    async def close():
+        await pool.close()
+
+    @app.api_route("/{path:path}", methods=["GET", "POST"])
+    async def forward(path: str, request: Request):
+        return await pool.forward(upstream, request, path)
+
+    return app
+
+
+def serve(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="critical",
+                                           access_log=False))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.02)
+    return server
+
+
+async def load(client: httpx.AsyncClient, base: str, workload: str, concurrency: int, total: int):
+    latencies, errors = [], 0
+    counter = iter(range(total))
+    body = BLOB[:256 * 1024]
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            t0 = time.perf_counter()
+            if workload == "json":
+                resp = await client.get(f"{base}/users/{i}")
+            elif workload == "upload":
+                resp = await client.post(f"{base}/upload", content=body,
+                                         headers={"content-type": "image/jpeg"})
+            else:
+                resp = await client.get(f"{base}/blob")
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            errors += resp.status_code != 200
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return total / (time.perf_counter() - t0), latencies, errors
+
+
+async def probe(client, url):
+    try:
+        resp = await client.get(url)
+        return f"{resp.status_code} {len(resp.content)}B x-upstream={resp.headers.get('x-upstream')}"
+    except httpx.HTTPError as exc:
+        return f"failed ({type(exc).__name__})"
+
+
+async def correctness(client, gateways):
+    for name, base in gateways:
+        logger.info(f"[{name:>6}] binary GET -> {await probe(client, f'{base}/blob?size=4096')}; "
+                    f"upstream 404 -> {await probe(client, f'{base}/missing')}")
+
+
+async def run(args, gateways):
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await correctness(client, gateways)
+        for workload in args.workloads:
+            for concurrency in args.concurrency:
+                for name, base in gateways:
+                    if name == "legacy" and workload == "download":
+                        continue   # resp.json() on a binary body: every request fails
+                    total = args.requests if workload == "json" else args.requests // 4
+                    rps, latencies, errors = await load(client, base, workload, concurrency, total)
+                    logger.info(f"[{workload:>8} {name:>6}] concurrency={concurrency:>3} rps={rps:7.1f} "
+                                f"{summarize(latencies)} errors={errors}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workloads", nargs="+", default=["json", "upload", "download"])
+    parser.add_argument("--port", type=int, default=18400)
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument("--max-keepalive", type=int, default=20)
+    args = parser.parse_args()
+
+    upstream = f"http://127.0.0.1:{args.port}"
+    servers = [
+        serve(upstream_app(), args.port),
+        serve(legacy_gateway(upstream), args.port + 1),
+        serve(pooled_gateway(upstream, args.max_connections, args.max_keepalive), args.port + 2),
+    ]
+    gateways = [("legacy", f"http://127.0.0.1:{args.port + 1}"), ("pooled", f"http://127.0.0.1:{args.port + 2}")]
+    try:
+        asyncio.run(run(args, gateways))
+    finally:
+        for server in servers:
+            server.should_exit = True
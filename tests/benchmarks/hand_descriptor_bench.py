@@ -0,0 +1,150 @@
+"""
+Hand geometry matching:
+  - verification quality of raw mediapipe landmarks vs the normalized
+    descriptor (EER, FRR at 1% FAR, 1:N top-1), on synthetic captures that
+    vary position, palm size, rotation, tilt and finger flexion;
+  - payload size of the landmark JSON vs the base64 float32 descriptor;
+  - HandGallery 1:N latency at several gallery sizes;
+  - iris + hand fusion (matcher FusionPolicy) against each modality alone.
+
+Usage:
+    python tests/benchmarks/hand_descriptor_bench.py --identities 500 --sizes 10000 100000 1000000
+"""
+import argparse
+import base64
+import json
+import logging
+
+import numpy as np
+
+from bench_utils import (load_service_module, synthetic_hand_identities, synthetic_hand_landmarks,
+                         synthetic_iris_codes, iris_code_probes, timed, summarize)
+
+from gabizap_common.handgeo import DESCRIPTOR_DIM, hand_descriptor  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("hand-descriptor-bench")
+
+handgallery = load_service_module("matcher", "handgallery")
+iriscode = load_service_module("matcher", "iriscode")
+fusion = load_service_module("matcher", "fusion")
+
+SIZE = (480, 640)
+
+
+def error_rates(genuine, impostor, far_target=0.01):
+    """(EER, threshold at EER, FRR at far_target) for distances (lower = closer)."""
+    thresholds = np.quantile(np.concatenate([genuine, impostor]), np.linspace(0, 1, 4001))
+    frr = (genuine[None, :] > thresholds[:, None]).mean(axis=1)
+    far = (impostor[None, :] <= thresholds[:, None]).mean(axis=1)
+    i = np.argmin(np.abs(frr - far))
+    frr_at = frr[far <= far_target].min() if (far <= far_target).any() else 1.0
+    return (frr[i] + far[i]) / 2, thresholds[i], frr_at
+
+
+def pairwise(probes, gallery):
+    sq = (probes ** 2).sum(1)[:, None] - 2 * probes @ gallery.T + (gallery ** 2).sum(1)[None, :]
+    return np.sqrt(np.maximum(sq, 0))
+
+
+def split(distances):
+    off = ~np.eye(len(distances), dtype=bool)
+    return np.diag(distances), distances[off]
+
+
+def quality(n_ids, seed):
+    identities = synthetic_hand_identities(n_ids, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    enrolled = [synthetic_hand_landmarks(i, SIZE, rng=rng) for i in identities]
+    probes = [synthetic_hand_landmarks(i, SIZE, rng=rng) for i in identities]
+    h, w = SIZE
+
+    results = {}
+    for name, encode in (("raw landmarks", lambda lm: np.asarray(lm, dtype=np.float32)),
+                         ("descriptor   ", lambda lm: hand_descriptor(lm, w, h))):
+        g = np.stack([encode(lm) for lm in enrolled])
+        p = np.stack([encode(lm) for lm in probes])
+        distances = pairwise(p, g)
+        genuine, impostor = split(distances)
+        eer, threshold, frr = error_rates(genuine, impostor)
+        top1 = (distances.argmin(axis=1) == np.arange(n_ids)).mean()
+        logger.info(f"[{name}] ids={n_ids} EER={eer:.3f} (at d={threshold:.3f}) "
+                    f"FRR@FAR1%={frr:.3f} top1={top1:.3f}")
+        results[name.strip()] = distances
+
+    _, latencies = timed(lambda: [hand_descriptor(lm, w, h) for lm in probes])
+    logger.info(f"[descriptor   ] {latencies[0] * 1000 / n_ids:.1f}us per hand")
+    raw_json = len(json.dumps({"embedding": enrolled[0]}))
+    packed = len(json.dumps({"descriptor": base64.b64encode(hand_descriptor(enrolled[0], w, h).tobytes()).decode()}))
+    logger.info(f"[payload      ] landmark JSON={raw_json}B descriptor={packed}B "
+                f"(float32 {DESCRIPTOR_DIM * 4}B stored)")
+    return results["descriptor"]
+
+
+def fused(hand_distances, flip, seed):
+    n = hand_distances.shape[0]
+    codes, masks = synthetic_iris_codes(n, seed=seed)
+    probe_codes, probe_masks, _ = iris_code_probes(codes, masks, flip=flip, seed=seed + 1)
+    gallery = iriscode.IrisCodeGallery(initial_capacity=n)
+    ids = [f"user_{i}" for i in range(n)]
+    gallery.upsert_many(ids, list(codes), list(masks))
+    iris = np.empty((n, n))
+    for i, (c, m) in enumerate(zip(probe_codes, probe_masks)):
+        for user_id, distance, _ in gallery.search(c, m, k=n):
+            iris[i, int(user_id[5:])] = distance
+
+    # Calibrate the impostor statistics and d' weights on one half of the
+    # identities, evaluate on the other
+    half = n // 2
+    impostor, weights = {}, {}
+    for name, distances in (("iris", iris), ("hand", hand_distances)):
+        genuine, other = split(distances[:half, :half])
+        impostor[name] = (float(other.mean()), float(other.std()))
+        weights[name] = float((other.mean() - genuine.mean()) / other.std())
+    policy = fusion.FusionPolicy(impostor=impostor, weights=weights)
+    logger.info(f"[fusion] impostor={ {k: tuple(round(x, 4) for x in v) for k, v in impostor.items()} } "
+                f"weights={ {k: round(v, 2) for k, v in weights.items()} }")
+
+    test = slice(half, n)
+    iris, hand_distances = iris[test, test], hand_distances[test, test]
+    # Scores are similarities: negate them so error_rates() sees distances
+    combined = -np.vectorize(lambda i, hd: policy.fuse({"iris": i, "hand": hd}))(iris, hand_distances)
+    for name, distances in (("iris ", iris), ("hand ", hand_distances), ("fused", combined)):
+        eer, threshold, frr = error_rates(*split(distances))
+        logger.info(f"[fusion {name}] iris flip={flip} EER={eer:.4f} (at {threshold:.3f}) FRR@FAR1%={frr:.4f}")
+    genuine, other = split(-combined)
+    frr = (genuine < policy.threshold).mean()
+    far = (other >= policy.threshold).mean()
+    logger.info(f"[fusion fused] at z >= {policy.threshold}: FRR={frr:.4f} FAR={far:.5f}")
+
+
+def latency(sizes, queries):
+    rng = np.random.default_rng(0)
+    for n in sizes:
+        data = rng.normal(0, 0.1, (n, DESCRIPTOR_DIM)).astype(np.float32)
+        gallery = handgallery.HandGallery(dim=DESCRIPTOR_DIM, initial_capacity=n)
+        ids = [f"user_{i}" for i in range(n)]
+        _, load_ms = timed(gallery.upsert_many, ids, data)
+        rows = rng.integers(0, n, queries)
+        latencies, hits = [], 0
+        for row in rows:
+            probe = data[row] + rng.normal(0, 0.01, DESCRIPTOR_DIM).astype(np.float32)
+            result, lat = timed(gallery.search, probe, k=5)
+            latencies.extend(lat)
+            hits += result[0][0] == ids[row]
+        logger.info(f"[gallery] n={n:>8} mem={gallery.nbytes / 2**20:.0f}MiB load={load_ms[0]:.0f}ms "
+                    f"{summarize(latencies)} top1={hits / queries:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--identities", type=int, default=500)
+    parser.add_argument("--iris-flip", type=float, default=0.46,
+                        help="bit noise of iris re-reads; high values make iris alone unreliable")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    hand = quality(args.identities, args.seed)
+    fused(hand, args.iris_flip, args.seed)
+    latency(args.sizes, args.queries)
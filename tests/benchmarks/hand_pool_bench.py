@@ -0,0 +1,151 @@
+"""
+hand-engine mediapipe throughput and latency:
+  - single images under concurrent clients: one shared static Hands graph
+    behind a lock (the only safe way to share the old module global) vs the
+    HandsPool checkout on the hand-engine thread executor;
+  - frame streams: every frame through a static graph (full palm detection
+    each time) vs a per-session tracking graph (HandsPool.session).
+
+Palm detection is only skipped while a hand is being tracked, so the stream
+comparison needs real hand footage: pass --frames-dir with the frames of one
+capture (sorted by file name). Without it, synthetic frames are used and
+both stream modes run detection on every frame.
+
+Usage:
+    python tests/benchmarks/hand_pool_bench.py --clients 1 4 8 --requests 64
+    python tests/benchmarks/hand_pool_bench.py --frames-dir ./capture --sessions 4
+"""
+import argparse
+import asyncio
+import glob
+import logging
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from bench_utils import load_service_module, summarize
+
+from gabizap_common.executor import BoundedExecutor
+from gabizap_common.hands import create_hands, extract_landmarks
+from gabizap_common.imaging import DecodedImage
+
+HandsPool = load_service_module("hand-engine", "pool").HandsPool
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("hand-bench")
+
+
+def load_frames(frames_dir, n, size=(480, 640), seed=0):
+    if frames_dir:
+        paths = sorted(glob.glob(os.path.join(frames_dir, "*")))[:n]
+        return [open(p, "rb").read() for p in paths]
+    # Skin-toned blobs on a textured background, drifting slowly like a real capture
+    rng = np.random.default_rng(seed)
+    h, w = size
+    background = rng.normal(110, 25, (h, w, 3)).clip(0, 255).astype(np.uint8)
+    frames = []
+    for t in range(n):
+        img = background.copy()
+        cx, cy = int(w / 2 + 40 * np.sin(t / 10)), int(h / 2 + 20 * np.cos(t / 12))
+        cv2.ellipse(img, (cx, cy), (80, 100), 0, 0, 360, (120, 150, 200), -1)
+        frames.append(cv2.imencode(".jpg", img)[1].tobytes())
+    return frames
+
+
+async def drive(handler, images, clients, total):
+    latencies = []
+    counter = iter(range(total))
+
+    async def client():
+        for i in counter:
+            t0 = time.perf_counter()
+            await handler(images[i % len(images)])
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return total / (time.perf_counter() - t0), latencies
+
+
+async def single_images(images, clients_list, total, workers):
+    shared = create_hands()
+    shared_lock = threading.Lock()
+    executor = BoundedExecutor("hand-bench", kind="thread", workers=workers, max_pending=10 ** 6)
+    pool = HandsPool(executor.workers)
+
+    def legacy(contents):
+        rgb = DecodedImage.from_bytes(contents).rgb
+        with shared_lock:
+            return extract_landmarks(shared, rgb)
+
+    def pooled(contents):
+        rgb = DecodedImage.from_bytes(contents).rgb
+        with pool.checkout() as hands:
+            return extract_landmarks(hands, rgb)
+
+    async def legacy_handler(contents):
+        return await executor.run(legacy, contents)
+
+    async def pooled_handler(contents):
+        return await executor.run(pooled, contents)
+
+    await drive(pooled_handler, images, executor.workers, executor.workers)   # create the graphs
+    for clients in clients_list:
+        for name, handler in (("shared", legacy_handler), ("pool", pooled_handler)):
+            rps, latencies = await drive(handler, images, clients, total)
+            logger.info(f"[single {name:>6}] clients={clients:>2} rps={rps:6.1f} {summarize(latencies)} "
+                        f"(workers={executor.workers})")
+    executor.shutdown()
+    pool.close()
+    shared.close()
+
+
+def streams(frames, sessions):
+    pool = HandsPool(sessions, max_sessions=sessions)
+    static = [create_hands() for _ in range(sessions)]
+
+    def run(mode, index, out):
+        for contents in frames:
+            rgb = DecodedImage.from_bytes(contents).rgb
+            t0 = time.perf_counter()
+            if mode == "static":
+                found = extract_landmarks(static[index], rgb)
+            else:
+                with pool.session(f"device-{index}") as hands:
+                    found = extract_landmarks(hands, rgb)
+            out.append(((time.perf_counter() - t0) * 1000.0, found is not None))
+
+    for mode in ("static", "tracking"):
+        results = []
+        threads = [threading.Thread(target=run, args=(mode, i, results)) for i in range(sessions)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - t0
+        latencies = [ms for ms, _ in results]
+        detected = np.mean([found for _, found in results])
+        logger.info(f"[stream {mode:>8}] sessions={sessions} frames/s={len(results) / elapsed:6.1f} "
+                    f"{summarize(latencies)} hand_found={detected:.0%}")
+    pool.close()
+    for hands in static:
+        hands.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=0, help="0 = os.cpu_count()")
+    parser.add_argument("--frames-dir", default="", help="frames of one real capture, sorted by name")
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--sessions", type=int, default=2)
+    args = parser.parse_args()
+    logger.info(f"cpu_count={os.cpu_count()}")
+    frames = load_frames(args.frames_dir, args.frames)
+    asyncio.run(single_images(frames, args.clients, args.requests, args.workers))
+    streams(frames, args.sessions)
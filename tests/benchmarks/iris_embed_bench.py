@@ -0,0 +1,80 @@
+"""
+Iris embedding throughput and tail latency under concurrent clients:
+the legacy path (get_embedding inline in the async handler) vs the
+micro-batching EmbeddingBatcher backed by a process pool.
+
+Usage:
+    python tests/benchmarks/iris_embed_bench.py --clients 1 8 32 --requests 256
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+import numpy as np
+
+from bench_utils import load_service_module, synthetic_eye_images
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("iris-bench")
+
+model_mod = load_service_module("iris-engine", "model")
+pipeline = load_service_module("iris-engine", "pipeline")
+
+
+async def drive(handler, images, clients, total):
+    latencies = []
+    counter = iter(range(total))
+
+    async def client():
+        # Closed loop: each client issues its next request the moment the
+        # previous one completes, and latency is measured from that instant,
+        # so time spent waiting behind a blocked event loop is counted
+        issued = start
+        for i in counter:
+            await handler(images[i % len(images)])
+            done = time.perf_counter()
+            latencies.append((done - issued) * 1000.0)
+            issued = done
+            await asyncio.sleep(0)
+
+    start = t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - t0
+    return total / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+async def run(clients_list, total, workers, max_batch, max_wait_ms):
+    images = synthetic_eye_images(32)
+    model = model_mod.IrisModel()
+
+    async def legacy(image):
+        # What `async def create_embedding` did: CPU work on the event loop
+        return model.get_embedding(image)
+
+    batcher = pipeline.EmbeddingBatcher(None, workers=workers, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    await batcher.start()
+    await batcher.embed_many(images[:batcher.workers])  # warm the pool
+
+    try:
+        for clients in clients_list:
+            rps, p50, p99 = await drive(legacy, images, clients, total)
+            logger.info(f"[inline ] clients={clients:>3} rps={rps:7.1f} p50={p50:7.1f}ms p99={p99:7.1f}ms")
+            rps, p50, p99 = await drive(batcher.embed, images, clients, total)
+            logger.info(f"[batched] clients={clients:>3} rps={rps:7.1f} p50={p50:7.1f}ms p99={p99:7.1f}ms "
+                        f"(workers={batcher.workers})")
+    finally:
+        await batcher.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=0, help="0 = os.cpu_count()")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    logger.info(f"cpu_count={os.cpu_count()}")
+    asyncio.run(run(args.clients, args.requests, args.workers, args.max_batch, args.max_wait_ms))
@@ -0,0 +1,94 @@
+"""
+ES256 access tokens and JWKS verification (gabizap_common.jwks) with
+auth-service's signing keys. Forgeries, rotation and the refetch limits
+are covered by tests/unit/test_jwks.py.
+
+  throughput (single core, verifications per second)
+    - HS256 shared secret (the previous scheme), ES256 with the pre-parsed
+      key, ES256 re-parsing the JWK per call, and the claims cache; plus
+      signing cost at auth-service
+
+Usage:
+    python tests/benchmarks/jwks_verify_bench.py --tokens 1000 --seconds 2
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from jose import jwk, jwt
+
+from bench_utils import load_service_module
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("jwks-verify-bench")
+
+TMP = tempfile.mkdtemp(prefix="jwks-verify-bench-")
+KEYS_DIR = os.path.join(TMP, "keys")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP, 'auth.db')}"
+os.environ["JWT_KEYS_DIR"] = KEYS_DIR
+os.environ["JWT_KEY_ACTIVATION_S"] = "0"
+os.environ.pop("REDIS_URL", None)
+
+from gabizap_common.jwks import KeySet, TokenVerifier  # noqa: E402
+
+auth = load_service_module("auth-service", "main")
+
+
+def claims(ttl=900.0, sub="user@example.com"):
+    now = time.time()
+    return {"sub": sub, "exp": int(now + ttl), "iat": int(now), "jti": uuid.uuid4().hex}
+
+
+def rate(fn, tokens, seconds):
+    n, t0 = 0, time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        fn(tokens[n % len(tokens)])
+        n += 1
+    return n / (time.perf_counter() - t0)
+
+
+def throughput(n_tokens, seconds):
+    secret = "bench-secret"
+    hs_tokens = [jwt.encode(claims(), secret, algorithm="HS256") for _ in range(n_tokens)]
+    es_tokens = [auth.signing_keys.sign(claims()) for _ in range(n_tokens)]
+    public = {k["kid"]: k for k in auth.signing_keys.jwks()["keys"]}
+    keyset = KeySet.from_jwks(auth.signing_keys.jwks())
+
+    def uncached(verifier):
+        def run(token):
+            verifier._cache.clear()
+            return verifier.verify(token)
+        return run
+
+    def reparse(token):
+        entry = public[jwt.get_unverified_header(token)["kid"]]
+        return jwt.decode(token, entry, algorithms=["ES256"])
+
+    cached = TokenVerifier(keyset, ["ES256"])
+    rows = (
+        ("HS256 shared secret, no cache", uncached(TokenVerifier(secret, ["HS256"])), hs_tokens),
+        ("ES256 pre-parsed key, no cache", uncached(TokenVerifier(keyset, ["ES256"])), es_tokens),
+        ("ES256 JWK parsed per call     ", reparse, es_tokens),
+        ("ES256 + claims cache          ", cached.verify, es_tokens),
+    )
+    for name, fn, tokens in rows:
+        logger.info(f"[verify {name}] {rate(fn, tokens, seconds):10,.0f}/s")
+    hs_key = jwk.construct(secret, "HS256")
+    for name, fn in (("HS256", lambda _: jwt.encode(claims(), hs_key, algorithm="HS256")),
+                     ("ES256", lambda _: auth.signing_keys.sign(claims()))):
+        logger.info(f"[sign {name}] {rate(fn, [None], seconds):10,.0f}/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+    try:
+        throughput(args.tokens, args.seconds)
+    finally:
+        shutil.rmtree(TMP)
@@ -0,0 +1,116 @@
+"""
+Single-frame liveness: accuracy, calibration and per-frame cost of the
+LBP/FFT feature classifier (gabizap_common.liveness) against the legacy
+heuristic (skimage LBP on the full frame, decision on Laplacian variance
+alone), on synthetic live / print / screen / noise / blur frames.
+
+The built-in default coefficients come from `--fit` with the default
+training recipe below; evaluation frames use different seeds and sizes.
+
+Usage:
+    python tests/benchmarks/liveness_bench.py --frames 200 --budget-ms 10
+    python tests/benchmarks/liveness_bench.py --fit --save /tmp/liveness.npz
+"""
+import argparse
+import logging
+import time
+
+import cv2
+import numpy as np
+
+from bench_utils import LIVENESS_KINDS, summarize, synthetic_liveness_frames
+
+from gabizap_common import liveness  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("liveness-bench")
+
+TRAIN_SETS = [(0, (480, 640)), (1, (720, 960)), (2, (240, 320)), (3, (960, 1280)), (4, (360, 480))]
+EVAL_SIZES = [(240, 320), (600, 800), (1080, 1440)]
+
+
+def legacy_check(gray):
+    """The pre-classifier check_liveness: LBP histogram computed, decision on sharpness only."""
+    from skimage.feature import local_binary_pattern
+    lbp = local_binary_pattern(gray, 8, 1, "uniform")
+    n_bins = int(lbp.max() + 1)
+    np.histogram(lbp, density=True, bins=n_bins, range=(0, n_bins))
+    laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
+    return laplacian_var > 100, min(0.99, laplacian_var / 500.0)
+
+
+def decode(images):
+    return [cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_GRAYSCALE) for image in images]
+
+
+def fit(frames_per_set, l2):
+    features, labels = [], []
+    for seed, size in TRAIN_SETS:
+        images, y, _ = synthetic_liveness_frames(frames_per_set, size=size, seed=seed)
+        features.extend(liveness.liveness_features(g) for g in decode(images))
+        labels.extend(y)
+    return liveness.LivenessClassifier.fit(np.stack(features), np.asarray(labels), l2=l2)
+
+
+def expected_calibration_error(probs, labels, bins=10):
+    edges = np.linspace(0, 1, bins + 1)
+    idx = np.clip(np.digitize(probs, edges) - 1, 0, bins - 1)
+    ece = 0.0
+    for b in range(bins):
+        in_bin = idx == b
+        if in_bin.any():
+            ece += in_bin.mean() * abs(probs[in_bin].mean() - labels[in_bin].mean())
+    return ece
+
+
+def evaluate(name, check, frames, labels, kinds):
+    latencies, decided, probs = [], [], []
+    for gray in frames:
+        t0 = time.process_time()
+        is_live, confidence = check(gray)
+        latencies.append((time.process_time() - t0) * 1000.0)
+        decided.append(is_live)
+        probs.append(confidence)
+    decided, probs = np.asarray(decided), np.asarray(probs)
+    per_kind = " ".join(f"{k}={np.mean(decided[kinds == k] == labels[kinds == k]):.2f}"
+                        for k in LIVENESS_KINDS)
+    logger.info(f"[{name:>10}] cpu {summarize(latencies)}")
+    logger.info(f"[{name:>10}] accuracy={np.mean(decided == labels):.3f} ({per_kind}) "
+                f"brier={np.mean((probs - labels) ** 2):.3f} ece={expected_calibration_error(probs, labels):.3f}")
+    return latencies
+
+
+def main(n_frames, budget_ms, do_fit, frames_per_set, l2, save):
+    classifier = liveness.default_classifier()
+    if do_fit:
+        classifier = fit(frames_per_set, l2)
+        if save:
+            classifier.save(save)
+            logger.info(f"Saved classifier to {save}")
+        # Paste into gabizap_common/liveness.py to update the built-in default
+        for name in ("mean", "scale", "weights"):
+            print(f"_DEFAULT_{name.upper()} = [" + ", ".join(f"{v:.6g}" for v in getattr(classifier, name)) + "]")
+        print(f"_DEFAULT_BIAS = {classifier.bias:.6g}")
+
+    for i, size in enumerate(EVAL_SIZES):
+        images, labels, kinds = synthetic_liveness_frames(n_frames, size=size, seed=100 + i)
+        frames = decode(images)
+        logger.info(f"{len(frames)} frames at {size[1]}x{size[0]}")
+        evaluate("legacy", legacy_check, frames, labels, np.asarray(kinds))
+        latencies = evaluate("classifier", lambda g: liveness.check_liveness(g, classifier),
+                             frames, labels, np.asarray(kinds))
+        p99 = np.percentile(latencies, 99)
+        status = "within" if p99 <= budget_ms else "OVER"
+        logger.info(f"[classifier] p99 {p99:.2f}ms {status} the {budget_ms:.1f}ms per-frame budget")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=200, help="evaluation frames per size")
+    parser.add_argument("--budget-ms", type=float, default=10.0)
+    parser.add_argument("--fit", action="store_true", help="refit instead of using the built-in coefficients")
+    parser.add_argument("--frames-per-set", type=int, default=200)
+    parser.add_argument("--l2", type=float, default=1.0)
+    parser.add_argument("--save", default="", help="write the fitted classifier (.npz)")
+    args = parser.parse_args()
+    main(args.frames, args.budget_ms, args.fit, args.frames_per_set, args.l2, args.save)
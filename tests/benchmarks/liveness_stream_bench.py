@@ -0,0 +1,72 @@
+"""
+Streaming video liveness: decision accuracy, frames needed and CPU per
+decision for TemporalLiveness with early exit, against scoring every frame
+of the clip, on synthetic live / photo / handheld-photo / screen-replay
+clips. Frames go through analyze_frame in-process, as one pool worker
+would run them.
+
+Usage:
+    python tests/benchmarks/liveness_stream_bench.py --clips 8 --frames 30
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from bench_utils import CLIP_KINDS, load_service_module, synthetic_eye_clip
+
+temporal = load_service_module("liveness-engine", "temporal")
+TemporalLiveness, analyze_frame = temporal.TemporalLiveness, temporal.analyze_frame
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("liveness-stream-bench")
+
+
+def run_clip(frames, early_exit, min_frames):
+    state = TemporalLiveness(min_frames=min_frames if early_exit else len(frames), max_frames=len(frames))
+    previous = None
+    started = time.process_time()
+    decision = None
+    for frame in frames:
+        previous, stats = analyze_frame(frame, previous)
+        decision = state.update(stats)
+        if decision is not None:
+            break
+    decision = decision or state.decide("client_end")
+    return decision, (time.process_time() - started) * 1000.0
+
+
+def main(n_clips, n_frames, min_frames):
+    clips = {kind: [synthetic_eye_clip(kind, n_frames, seed=1000 + i) for i in range(n_clips)]
+             for kind in CLIP_KINDS}
+    run_clip(clips["live"][0][:3], True, min_frames)  # warm caches
+
+    for early_exit in (False, True):
+        label = "early exit" if early_exit else "full clip"
+        correct, cpu, used = 0, [], []
+        for kind, kind_clips in clips.items():
+            evidence = {}
+            kind_correct = 0
+            for frames in kind_clips:
+                decision, ms = run_clip(frames, early_exit, min_frames)
+                kind_correct += decision["is_live"] == (kind == "live")
+                cpu.append(ms)
+                used.append(decision["frames"])
+                for name, value in decision["evidence"].items():
+                    evidence.setdefault(name, []).append(value)
+            correct += kind_correct
+            terms = " ".join(f"{name}={np.mean(v):+.2f}" for name, v in evidence.items())
+            logger.info(f"[{label:>10}] {kind:>8}: {kind_correct}/{len(kind_clips)} correct, evidence {terms}")
+        total = n_clips * len(CLIP_KINDS)
+        logger.info(f"[{label:>10}] accuracy={correct / total:.3f} frames/decision={np.mean(used):.1f} "
+                    f"cpu/decision p50={np.percentile(cpu, 50):.1f}ms mean={np.mean(cpu):.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clips", type=int, default=8, help="clips per kind")
+    parser.add_argument("--frames", type=int, default=30)
+    parser.add_argument("--min-frames", type=int, default=4)
+    args = parser.parse_args()
+    main(args.clips, args.frames, args.min_frames)
@@ -0,0 +1,45 @@
+"""
+Batch 1:N throughput: N sequential gallery.search calls vs one
+gallery.search_many call, plus the blocked all-pairs duplicate scan.
+
+Usage:
+    python tests/benchmarks/matcher_batch_bench.py --size 100000 --probes 1 16 128
+"""
+import argparse
+import logging
+
+from bench_utils import load_service_module, synthetic_embeddings, noisy_copies, timed
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("batch-bench")
+
+gallery_mod = load_service_module("matcher", "gallery")
+
+
+def run(size, dim, probe_counts, k, dup_size):
+    templates = synthetic_embeddings(size, dim)
+    gallery = gallery_mod.TemplateGallery(dim=dim, initial_capacity=size)
+    gallery.upsert_many([f"user_{i}" for i in range(size)], templates)
+
+    for m in probe_counts:
+        probes = noisy_copies(templates[:m])
+        _, seq = timed(lambda: [gallery.search(p, k=k) for p in probes])
+        _, bat = timed(gallery.search_many, probes, k=k)
+        logger.info(f"probes={m:>5} sequential={seq[0]:.1f}ms batch={bat[0]:.1f}ms "
+                    f"speedup={seq[0] / bat[0]:.1f}x ({m * 1000 / bat[0]:.0f} probes/s)")
+
+    dup = gallery_mod.TemplateGallery(dim=dim, initial_capacity=dup_size)
+    dup.upsert_many([f"user_{i}" for i in range(dup_size)], templates[:dup_size])
+    pairs, lat = timed(lambda: [p for found, _, _ in dup.iter_duplicates(0.95) for p in found])
+    logger.info(f"duplicate scan n={dup_size}: {len(pairs)} pairs in {lat[0]:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 16, 128])
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dup-size", type=int, default=20_000)
+    args = parser.parse_args()
+    run(args.size, args.dim, args.probes, args.k, args.dup_size)
@@ -0,0 +1,70 @@
+"""
+Matcher 1:N latency: in-memory TemplateGallery vs the legacy per-template loop.
+
+Usage:
+    python tests/benchmarks/matcher_gallery_bench.py --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import logging
+
+import numpy as np
+
+from bench_utils import load_service_module, synthetic_embeddings, noisy_copies, timed, summarize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("matcher-bench")
+
+gallery_mod = load_service_module("matcher", "gallery")
+
+
+def legacy_match(probe, stored_json):
+    # Mirrors the old /match body: JSON decode + one cosine per template
+    input_vec = np.array(probe)
+    input_norm = np.linalg.norm(input_vec)
+    best_score, best_idx = -1.0, None
+    for i, val in enumerate(stored_json):
+        stored_vec = np.array(json.loads(val))
+        score = np.dot(input_vec, stored_vec) / (input_norm * np.linalg.norm(stored_vec))
+        if score > best_score:
+            best_score, best_idx = score, i
+    return best_idx, best_score
+
+
+def run(sizes, dim, queries, legacy_limit):
+    for n in sizes:
+        templates = synthetic_embeddings(n, dim)
+        gallery = gallery_mod.TemplateGallery(dim=dim, initial_capacity=n)
+        ids = [f"user_{i}" for i in range(n)]
+        _, load_ms = timed(gallery.upsert_many, ids, templates)
+
+        probe_rows = np.random.default_rng(7).integers(0, n, size=queries)
+        probes = noisy_copies(templates[probe_rows])
+
+        latencies, hits = [], 0
+        for row, probe in zip(probe_rows, probes):
+            result, lat = timed(gallery.search, probe, k=5)
+            latencies.extend(lat)
+            hits += result[0][0] == ids[row]
+
+        logger.info(f"[gallery] n={n:>8} load={load_ms[0]:.0f}ms "
+                    f"mem={gallery.nbytes / 2**20:.0f}MiB {summarize(latencies)} "
+                    f"top1={hits / queries:.3f}")
+
+        if n <= legacy_limit:
+            stored_json = [json.dumps(v.tolist()) for v in templates]
+            _, lat = timed(legacy_match, probes[0].tolist(), stored_json, repeat=3)
+            logger.info(f"[legacy ] n={n:>8} {summarize(lat)}")
+
+        del gallery, templates
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--legacy-limit", type=int, default=10_000,
+                        help="Only run the slow legacy loop up to this gallery size")
+    args = parser.parse_args()
+    run(args.sizes, args.dim, args.queries, args.legacy_limit)
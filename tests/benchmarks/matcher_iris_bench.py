@@ -0,0 +1,93 @@
+"""
+Iris-code 1:N matching: packed Hamming gallery (with and without the staged
+early exit) vs float cosine over the same codes mapped to +/-1 vectors.
+Probes are genuine re-reads rotated by a few columns with ~20% bit noise,
+so the cosine baseline is run both without rotation search and with one
+full gallery scan per rotation.
+
+Usage:
+    python tests/benchmarks/matcher_iris_bench.py --sizes 10000 50000 --queries 20
+"""
+import argparse
+import logging
+
+import numpy as np
+
+from bench_utils import (load_service_module, synthetic_iris_codes, iris_code_probes,
+                         timed, summarize)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("matcher-iris-bench")
+
+gallery_mod = load_service_module("matcher", "gallery")
+iriscode = load_service_module("matcher", "iriscode")
+
+
+def to_float(codes, masks):
+    """Masked +/-1 vectors: cosine of these is 1 - 2 * HD over the shared bits."""
+    bits = np.unpackbits(codes, axis=1).astype(np.float32) * 2 - 1
+    return bits * np.unpackbits(masks, axis=1)
+
+
+def run(sizes, queries, max_shift, threshold, float_limit):
+    for n in sizes:
+        codes, masks = synthetic_iris_codes(n)
+        ids = [f"user_{i}" for i in range(n)]
+        rows = np.random.default_rng(3).integers(0, n, size=queries)
+        probe_codes, probe_masks, _ = iris_code_probes(codes[rows], masks[rows])
+
+        staged = iriscode.IrisCodeGallery(initial_capacity=n)
+        staged.upsert_many(ids, list(codes), list(masks))
+        single = iriscode.IrisCodeGallery(initial_capacity=n, stages=1)
+        single.upsert_many(ids, list(codes), list(masks))
+
+        for label, gal, md in (("hamming early-exit", staged, threshold),
+                               ("hamming top-1     ", staged, None),
+                               ("hamming full-scan ", single, threshold)):
+            latencies, hits = [], 0
+            for row, c, m in zip(rows, probe_codes, probe_masks):
+                result, lat = timed(gal.search, c, m, k=1, max_shift=max_shift, max_distance=md)
+                latencies.extend(lat)
+                hits += bool(result) and result[0][0] == ids[row]
+            logger.info(f"[{label}] n={n:>7} mem={gal.nbytes / 2**20:.0f}MiB "
+                        f"{summarize(latencies)} top1={hits / queries:.3f}")
+
+        if n > float_limit:
+            continue
+        vectors = to_float(codes, masks)
+        cosine = gallery_mod.TemplateGallery(dim=vectors.shape[1], initial_capacity=n)
+        cosine.upsert_many(ids, vectors)
+        del vectors
+        probes = to_float(probe_codes, probe_masks)
+
+        latencies, hits = [], 0
+        for row, probe in zip(rows, probes):
+            result, lat = timed(cosine.search, probe, k=1)
+            latencies.extend(lat)
+            hits += result[0][0] == ids[row]
+        logger.info(f"[cosine no-rotation] n={n:>7} mem={cosine.nbytes / 2**20:.0f}MiB "
+                    f"{summarize(latencies)} top1={hits / queries:.3f}")
+
+        latencies, hits = [], 0
+        per_col = probe_codes.shape[1] * 8 // staged.columns
+        for row, probe in zip(rows, probes):
+            rotated = np.stack([np.roll(probe, s * per_col) for s in range(-max_shift, max_shift + 1)])
+            result, lat = timed(cosine.search_many, rotated, k=1)
+            latencies.extend(lat)
+            best = max((hits_[0] for hits_ in result), key=lambda hit: hit[1])
+            hits += best[0] == ids[row]
+        logger.info(f"[cosine rotations  ] n={n:>7} mem={cosine.nbytes / 2**20:.0f}MiB "
+                    f"{summarize(latencies)} top1={hits / queries:.3f}")
+        del cosine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--max-shift", type=int, default=8)
+    parser.add_argument("--threshold", type=float, default=0.32)
+    parser.add_argument("--float-limit", type=int, default=50_000,
+                        help="Skip the float cosine baseline above this gallery size (16 KiB/template)")
+    args = parser.parse_args()
+    run(args.sizes, args.queries, args.max_shift, args.threshold, args.float_limit)
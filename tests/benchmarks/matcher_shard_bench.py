@@ -0,0 +1,113 @@
+"""
+Sharded matcher throughput on one box: the gallery is partitioned with the
+matcher's HashRing across N worker processes, each holding a local
+TemplateGallery; the parent scatters every probe to all shards and merges the
+local top-k lists with merge_top_k, exactly as the coordinator does over HTTP.
+
+Also checks that merged results equal an unsharded search and reports how
+many templates a rebalance from N to N+1 shards moves.
+
+Usage:
+    python tests/benchmarks/matcher_shard_bench.py --size 200000 --shards 1 2 4
+"""
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+from bench_utils import load_service_module, synthetic_embeddings, noisy_copies
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("shard-bench")
+
+gallery_mod = load_service_module("matcher", "gallery")
+sharding = load_service_module("matcher", "sharding")
+
+
+def shard_worker(name, members, size, dim, k, conn):
+    ring = sharding.HashRing(members)
+    templates = synthetic_embeddings(size, dim)
+    ids = [f"user_{i}" for i in range(size)]
+    owned = [i for i, u in enumerate(ids) if ring.owner(u) == name]
+
+    gallery = gallery_mod.TemplateGallery(dim=dim, initial_capacity=len(owned))
+    gallery.upsert_many([ids[i] for i in owned], templates[owned])
+    del templates
+    conn.send(len(gallery))
+
+    while True:
+        probes = conn.recv()
+        if probes is None:
+            break
+        conn.send([gallery.search(p, k=k) for p in probes])
+
+
+def run_cluster(n_shards, size, dim, probes, k, chunk):
+    members = [f"shard-{i}" for i in range(n_shards)]
+    conns, procs = [], []
+    for name in members:
+        parent, child = mp.Pipe()
+        proc = mp.Process(target=shard_worker, args=(name, members, size, dim, k, child), daemon=True)
+        proc.start()
+        conns.append(parent)
+        procs.append(proc)
+    sizes = [c.recv() for c in conns]
+
+    merged = []
+    t0 = time.perf_counter()
+    for start in range(0, len(probes), chunk):
+        block = probes[start:start + chunk]
+        for c in conns:          # scatter
+            c.send(block)
+        partials = [c.recv() for c in conns]   # gather
+        for i in range(len(block)):
+            merged.append(sharding.merge_top_k((p[i] for p in partials), k))
+    elapsed = time.perf_counter() - t0
+
+    for c, proc in zip(conns, procs):
+        c.send(None)
+        proc.join()
+    return merged, elapsed, sizes
+
+
+def run(size, dim, shard_counts, queries, k, chunk):
+    templates = synthetic_embeddings(size, dim)
+    probes = noisy_copies(templates[np.random.default_rng(2).integers(0, size, queries)])
+    reference = gallery_mod.TemplateGallery(dim=dim, initial_capacity=size)
+    reference.upsert_many([f"user_{i}" for i in range(size)], templates)
+    truth = [[u for u, _ in reference.search(p, k=k)] for p in probes]
+    del reference, templates
+
+    baseline = None
+    for n in shard_counts:
+        merged, elapsed, sizes = run_cluster(n, size, dim, probes, k, chunk)
+        qps = queries / elapsed
+        baseline = baseline or qps
+        exact = all([u for u, _ in m] == t for m, t in zip(merged, truth))
+        logger.info(f"shards={n} sizes={sizes} qps={qps:.1f} scaling={qps / baseline:.2f}x "
+                    f"matches_unsharded={exact}")
+
+    ids = [f"user_{i}" for i in range(size)]
+    for n in shard_counts:
+        old = sharding.HashRing([f"shard-{i}" for i in range(n)])
+        new = sharding.HashRing([f"shard-{i}" for i in range(n + 1)])
+        moved = len(sharding.rebalance_moves(old, new, ids))
+        logger.info(f"rebalance {n}->{n + 1} shards moves {moved / size:.1%} of templates "
+                    f"(ideal {1 / (n + 1):.1%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--chunk", type=int, default=1,
+                        help="Probes per scatter round (1 = one /match per probe)")
+    args = parser.parse_args()
+    logger.info(f"cpu_count={os.cpu_count()} (scaling is bounded by physical cores)")
+    run(args.size, args.dim, args.shards, args.queries, args.k, args.chunk)
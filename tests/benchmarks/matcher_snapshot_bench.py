@@ -0,0 +1,86 @@
+"""
+Matcher cold start: rebuilding the gallery from template blobs (what a
+restart without a snapshot does after the Redis SCAN) vs mapping a gallery
+snapshot and serving the first match.
+
+Usage:
+    python tests/benchmarks/matcher_snapshot_bench.py --size 1000000 --fmt int8
+"""
+import argparse
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+from bench_utils import load_service_module, synthetic_embeddings, timed, summarize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("snapshot-bench")
+
+codec = load_service_module("matcher", "codec")
+gallery_mod = load_service_module("matcher", "gallery")
+ann_mod = load_service_module("matcher", "ann")
+snapshot = load_service_module("matcher", "snapshot")
+
+
+def rebuild_from_blobs(blobs, ids, dim, fmt):
+    gallery = gallery_mod.TemplateGallery(dim=dim, fmt=fmt)
+    batch = 10_000
+    for start in range(0, len(blobs), batch):
+        vectors = [codec.decode_template(b) for b in blobs[start:start + batch]]
+        gallery.upsert_many(ids[start:start + batch], vectors)
+    return gallery
+
+
+def run(size, dim, fmt, lists, rebuild_limit, path):
+    templates = synthetic_embeddings(size, dim)
+    ids = [f"user_{i}" for i in range(size)]
+    gallery = gallery_mod.TemplateGallery(dim=dim, initial_capacity=size, fmt=fmt)
+    for start in range(0, size, 100_000):
+        gallery.upsert_many(ids[start:start + 100_000], templates[start:start + 100_000])
+    if lists:
+        gallery.attach_index(ann_mod.IVFIndex(n_lists=lists))
+        _, lat = timed(gallery.train_index)
+        logger.info(f"IVF trained ({lists} lists) in {lat[0]:.0f}ms")
+
+    _, lat = timed(snapshot.save_snapshot, gallery, path, {"log_id": "0-0"})
+    logger.info(f"snapshot n={size} fmt={fmt}: write={lat[0]:.0f}ms "
+                f"file={os.path.getsize(path) / 2**20:.0f}MiB")
+
+    probes = templates[np.random.default_rng(4).integers(0, size, 20)].copy()
+    del gallery, templates
+
+    index = ann_mod.IVFIndex(n_lists=lists) if lists else None
+    (restored, _), load_lat = timed(snapshot.load_snapshot, path, index)
+    _, first = timed(restored.search, probes[0], 5, "ivf" if lists else "exact")
+    logger.info(f"[snapshot] load={load_lat[0]:.2f}ms first_match={first[0]:.1f}ms "
+                f"ready_in={load_lat[0] + first[0]:.1f}ms")
+    lat_all = [timed(restored.search, p, 5, "ivf" if lists else "exact")[1][0] for p in probes[1:]]
+    logger.info(f"[snapshot] steady-state match {summarize(lat_all)}")
+    _, reg = timed(restored.upsert, "late_user", probes[0])
+    logger.info(f"[snapshot] first registration after restore={reg[0]:.1f}ms "
+                f"(materializes the id index)")
+    del restored
+
+    if size <= rebuild_limit:
+        blobs = [codec.encode_template(v, codec.FORMAT_FLOAT32) for v in synthetic_embeddings(size, dim)]
+        # A Redis-backed restart also pays SCAN + MGET on top of this
+        _, lat = timed(rebuild_from_blobs, blobs, ids, dim, fmt)
+        logger.info(f"[rebuild ] decode+insert {size} blobs={lat[0]:.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--fmt", default="float32", choices=["float32", "int8", "bits"])
+    parser.add_argument("--lists", type=int, default=0, help="Also snapshot an IVF index")
+    parser.add_argument("--rebuild-limit", type=int, default=200_000)
+    parser.add_argument("--path", default=os.path.join(tempfile.gettempdir(), "gabizap_gallery.snap"))
+    args = parser.parse_args()
+    try:
+        run(args.size, args.dim, args.fmt, args.lists, args.rebuild_limit, args.path)
+    finally:
+        if os.path.exists(args.path):
+            os.remove(args.path)
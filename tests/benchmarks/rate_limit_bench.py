@@ -0,0 +1,167 @@
+"""
+api-gateway rate limiter, against an in-process fake Redis (fakeredis; the
+Lua script needs the `lupa` package):
+
+  overshoot
+    - requests a concurrent burst from one client gets through: the legacy
+      GET-then-INCR limiter vs the ASGI limiter (correctness of the latter
+      is covered by tests/unit/test_gateway_rate_limit.py)
+  latency
+    - per-request overhead at a simulated Redis round-trip time: legacy
+      BaseHTTPMiddleware (2 round trips) vs the ASGI limiter with one token
+      per round trip vs with local leases
+
+Usage:
+    python tests/benchmarks/rate_limit_bench.py --rtt-ms 1 --requests 2000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+import fakeredis
+import httpx
+from starlette.applications import Starlette
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+
+from bench_utils import load_service_module, summarize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("rate-limit-bench")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+middleware = load_service_module("api-gateway", "middleware")
+
+
+class LegacyRateLimit(BaseHTTPMiddleware):
+    """The original RateLimitMiddleware.dispatch: GET, then INCR (+ EXPIRE) in a pipeline."""
+
+    def __init__(self, app, client, limit=100, window=60):
+        super().__init__(app)
+        self.redis, self.limit, self.window = client, limit, window
+
+    async def dispatch(self, request, call_next):
+        key = f"rate_limit:{request.client.host}"
+        current = await self.redis.get(key)
+        if current and int(current) >= self.limit:
+            return Response("Too Many Requests", status_code=429)
+        async with self.redis.pipeline() as pipe:
+            await pipe.incr(key)
+            if not current:
+                await pipe.expire(key, self.window)
+            await pipe.execute()
+        return await call_next(request)
+
+
+class DelayedRedis:
+    """Adds a fixed round-trip time to every Redis command the limiters issue."""
+
+    def __init__(self, client, rtt: float):
+        self._client, self._rtt = client, rtt
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    async def get(self, key):
+        await asyncio.sleep(self._rtt)
+        return await self._client.get(key)
+
+    def pipeline(self):
+        pipe, rtt = self._client.pipeline(), self._rtt
+        execute = pipe.execute
+
+        async def delayed_execute(*args, **kwargs):
+            await asyncio.sleep(rtt)
+            return await execute(*args, **kwargs)
+        pipe.execute = delayed_execute
+        return pipe
+
+    def register_script(self, script):
+        inner, rtt = self._client.register_script(script), self._rtt
+
+        async def delayed(*args, **kwargs):
+            await asyncio.sleep(rtt)
+            return await inner(*args, **kwargs)
+        return delayed
+
+
+def backend():
+    async def ok(request):
+        return PlainTextResponse("ok")
+    return Starlette(routes=[Route("/{path:path}", ok, methods=["GET", "POST"])])
+
+
+def asgi_limited(client, limit=100, window=60.0, rules=(), lease=None, timeout=0.05):
+    app = middleware.RateLimitMiddleware(backend(), limit=limit, window=window, rules=rules,
+                                         redis_timeout=timeout, client=client)
+    if lease is not None:
+        app.default.lease = lease
+    return app
+
+
+async def burst(app, n, path="/users/me", concurrency=64, ip="10.0.0.1"):
+    transport = httpx.ASGITransport(app=app, client=(ip, 5000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with semaphore:
+                return (await client.get(path)).status_code
+        codes = await asyncio.gather(*(one() for _ in range(n)))
+    return sum(c == 200 for c in codes), codes
+
+
+async def overshoot(limit):
+    variants = (("legacy", lambda client: LegacyRateLimit(backend(), client, limit=limit)),
+                ("asgi  ", lambda client: asgi_limited(client, limit=limit)))
+    for name, make in variants:
+        client = DelayedRedis(fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True), 0.0005)
+        allowed, _ = await burst(make(client), 3 * limit)
+        logger.info(f"[overshoot {name}] concurrent burst of {3 * limit}: {allowed} allowed (limit {limit})")
+
+
+async def latency(rtt_ms, requests, concurrency):
+    server = fakeredis.FakeServer()
+    limit = 10 ** 6   # measure overhead, never reject
+    variants = [
+        ("legacy BaseHTTPMiddleware", LegacyRateLimit(backend(), DelayedRedis(
+            fakeredis.FakeAsyncRedis(server=server, decode_responses=True), rtt_ms / 1000), limit=limit)),
+        ("asgi, 1 token/round trip ", None),
+        ("asgi, local leases       ", None),
+        ("no limiter               ", backend()),
+    ]
+    for i, lease in ((1, 1), (2, 50)):
+        client = DelayedRedis(fakeredis.FakeAsyncRedis(server=server, decode_responses=True), rtt_ms / 1000)
+        app = asgi_limited(client, limit=limit, lease=lease, timeout=1.0)
+        variants[i] = (variants[i][0], app)
+
+    for name, app in variants:
+        transport = httpx.ASGITransport(app=app, client=("10.0.0.1", 5000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            latencies = []
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one():
+                async with semaphore:
+                    t0 = time.perf_counter()
+                    await client.get("/users/me")
+                    latencies.append((time.perf_counter() - t0) * 1000.0)
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one() for _ in range(requests)))
+            rps = requests / (time.perf_counter() - t0)
+        calls = getattr(getattr(app, "limiter", None), "redis_calls", None)
+        logger.info(f"[{name}] rtt={rtt_ms}ms rps={rps:7.1f} {summarize(latencies)}"
+                    + (f" redis_calls={calls}" if calls is not None else ""))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--rtt-ms", type=float, default=1.0)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(overshoot(args.limit))
+    asyncio.run(latency(args.rtt_ms, args.requests, args.concurrency))
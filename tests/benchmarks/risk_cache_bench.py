@@ -0,0 +1,192 @@
+"""
+api-gateway risk scoring in the zero-trust path, against an in-process fake
+risk engine (fixed decisions per subject, configurable scoring delay):
+
+  checks (exit status 1 if any fails)
+    - a first request from a risky subject goes through under the default
+      action; its background scoring makes the next one 403 (block) or
+      401 with an insufficient_user_authentication challenge (step_up)
+    - concurrent misses for one context trigger a single scoring call
+    - a stale decision is served while it is re-scored in the background
+    - with the risk engine down requests still pass under the default
+  latency
+    - per-request latency through ZeroTrustMiddleware: awaiting /score
+      inline vs the cache, for a population of subjects
+
+Usage:
+    python tests/benchmarks/risk_cache_bench.py --subjects 200 --requests 5000 --engine-ms 5
+"""
+import argparse
+import asyncio
+import logging
+import sys
+import time
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from bench_utils import load_service_module, summarize
+from zero_trust_bench import SECRET, issue
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("risk-cache-bench")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+zero_trust = load_service_module("api-gateway", "zero_trust")
+risk = load_service_module("api-gateway", "risk")
+
+DECISIONS = {"mallory@example.com": ("block", 95), "eve@example.com": ("step_up", 65)}
+
+
+def risk_engine(delay_s: float, calls: list):
+    async def score(request):
+        context = await request.json()
+        calls.append(context)
+        await asyncio.sleep(delay_s)
+        action, score = DECISIONS.get(context["user_id"], ("allow", 10))
+        return JSONResponse({"risk_score": score, "action": action, "anomaly": action != "allow"})
+    return Starlette(routes=[Route("/score", score, methods=["POST"])])
+
+
+def risk_cache(engine, **kwargs):
+    cache = risk.RiskCache("http://risk-engine", **kwargs)
+    cache.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=engine), base_url="http://risk-engine")
+    return cache
+
+
+class InlineRisk:
+    """The synchronous alternative: await the risk engine on every request."""
+
+    def __init__(self, engine):
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=engine), base_url="http://risk-engine")
+
+
+def inline_middleware(app, verifier, inline):
+    inner = zero_trust.ZeroTrustMiddleware(app, auth_url="", risk_url="", verifier=verifier)
+
+    async def middleware(scope, receive, send):
+        if scope["type"] == "http":
+            token = dict(scope["headers"]).get(b"authorization", b"").decode().partition(" ")[2]
+            claims = verifier.verify(token)
+            resp = await inline.client.post("/score", json={"user_id": claims["sub"], "hour": 12,
+                                                            "device_trust": 0.9, "geo_dist": 0.0, "velocity": 1.0})
+            if resp.json()["action"] == "block":
+                return await PlainTextResponse("Access denied by risk policy", status_code=403)(scope, receive, send)
+        await inner(scope, receive, send)
+    return middleware
+
+
+def gateway(cache=None, inline=None):
+    async def ok(request):
+        return PlainTextResponse("ok")
+    backend = Starlette(routes=[Route("/{path:path}", ok)])
+    verifier = zero_trust.TokenVerifier(SECRET, ["HS256"])
+    if inline is not None:
+        return inline_middleware(backend, verifier, inline)
+    return zero_trust.ZeroTrustMiddleware(backend, auth_url="", risk_url="", verifier=verifier, risk=cache)
+
+
+def client_for(app, ip="10.1.2.3"):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=(ip, 5000)), base_url="http://gateway")
+
+
+async def settle(cache):
+    while cache._tasks:
+        await asyncio.gather(*list(cache._tasks), return_exceptions=True)
+
+
+async def checks():
+    results = []
+
+    def check(name, ok, detail):
+        results.append(ok)
+        logger.info(f"[{'PASS' if ok else 'FAIL'}] {name}: {detail}")
+
+    calls = []
+    cache = risk_cache(risk_engine(0.01, calls))
+    async with client_for(gateway(cache)) as client:
+        for sub, want in (("mallory@example.com", 403), ("eve@example.com", 401)):
+            headers = {"Authorization": f"Bearer {issue(sub)[0]}", "X-Device-ID": "d1"}
+            first = (await client.get("/users/me", headers=headers)).status_code
+            await settle(cache)
+            resp = await client.get("/users/me", headers=headers)
+            detail = f"{first} then {resp.status_code} {resp.headers.get('www-authenticate', '')}".strip()
+            check(f"{DECISIONS[sub][0]} enforced on the next request", (first, resp.status_code) == (200, want), detail)
+
+        calls.clear()
+        headers = {"Authorization": f"Bearer {issue('alice@example.com')[0]}"}
+        codes = await asyncio.gather(*(client.get("/users/me", headers=headers) for _ in range(50)))
+        await settle(cache)
+        check("concurrent misses deduplicated", len(calls) == 1 and all(r.status_code == 200 for r in codes),
+              f"{len(calls)} scoring call(s) for 50 concurrent requests")
+    await cache.close()
+
+    calls = []
+    cache = risk_cache(risk_engine(0.01, calls), ttl=0.2, stale_ttl=10.0)
+    async with client_for(gateway(cache)) as client:
+        headers = {"Authorization": f"Bearer {issue('mallory@example.com')[0]}"}
+        await client.get("/users/me", headers=headers)
+        await settle(cache)
+        await asyncio.sleep(0.25)
+        status = (await client.get("/users/me", headers=headers)).status_code
+        await settle(cache)
+        check("stale decision served and re-scored", status == 403 and len(calls) == 2 and cache.stale_hits == 1,
+              f"status {status}, {len(calls)} scoring calls, stale_hits={cache.stale_hits}")
+    await cache.close()
+
+    cache = risk.RiskCache("http://127.0.0.1:9", timeout=0.2)
+    async with client_for(gateway(cache)) as client:
+        headers = {"Authorization": f"Bearer {issue('mallory@example.com')[0]}"}
+        codes = []
+        for _ in range(3):
+            codes.append((await client.get("/users/me", headers=headers)).status_code)
+            await settle(cache)
+        check("risk engine down: default action", codes == [200] * 3 and cache.errors == 3,
+              f"{codes}, errors={cache.errors}")
+    await cache.close()
+    return all(results)
+
+
+async def latency(subjects, requests, engine_ms, concurrency):
+    tokens = [issue(f"user{i}@example.com")[0] for i in range(subjects)]
+    for name in ("inline /score", "risk cache   "):
+        calls = []
+        engine = risk_engine(engine_ms / 1000.0, calls)
+        cache = risk_cache(engine) if name.startswith("risk") else None
+        app = gateway(cache=cache, inline=None if cache else InlineRisk(engine))
+        latencies = []
+        async with client_for(app) as client:
+            counter = iter(range(requests))
+
+            async def worker():
+                for i in counter:
+                    t0 = time.perf_counter()
+                    await client.get("/users/me", headers={"Authorization": f"Bearer {tokens[i % subjects]}"})
+                    latencies.append((time.perf_counter() - t0) * 1000.0)
+                    # ASGITransport never blocks on a socket; let background scoring run as a server would
+                    await asyncio.sleep(0)
+            t0 = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            rps = requests / (time.perf_counter() - t0)
+        extra = ""
+        if cache is not None:
+            await settle(cache)
+            stats = cache.stats()
+            extra = f" hit_rate={stats['hit_rate']} mean_check={stats['mean_check_us']}us"
+            await cache.close()
+        logger.info(f"[{name}] engine={engine_ms}ms rps={rps:7.1f} {summarize(latencies)} "
+                    f"scoring_calls={len(calls)}{extra}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subjects", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--engine-ms", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    passed = asyncio.run(checks())
+    asyncio.run(latency(args.subjects, args.requests, args.engine_ms, args.concurrency))
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,134 @@
+"""
+risk-engine model hot-swap and incremental refit.
+
+  swap     /score load runs against the real app while new model versions
+           are published (atomic rename) underneath it; reports failed
+           requests (must be 0), time from publish to swap, and latency
+           with and without swaps in progress
+  refit    traffic drifts away from the training distribution; reports the
+           share of it flagged anomalous before and after sliding-window
+           refits on the recently scored rows
+
+Usage:
+    python tests/benchmarks/risk_model_swap_bench.py --publishes 5 --refits 5
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from bench_utils import load_service_module, summarize
+
+risk_engine = load_service_module("risk-engine", "main")
+model_store = load_service_module("risk-engine", "model_store")
+ModelStore, publish_model = model_store.ModelStore, model_store.publish_model
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("risk-model-swap-bench")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+BASE = ([12, 0.9, 10, 1], [4, 0.1, 5, 0.5])
+DRIFTED = ([13, 0.88, 15, 1.6], [4, 0.1, 5, 0.5])
+
+
+def sample(dist, n, seed):
+    loc, scale = dist
+    return np.random.default_rng(seed).normal(loc=loc, scale=scale, size=(n, 4))
+
+
+def train(seed: int) -> IsolationForest:
+    return IsolationForest(random_state=seed, contamination=0.05).fit(sample(BASE, 1000, seed))
+
+
+async def swap(publishes: int, poll_s: float, path: str) -> bool:
+    store = risk_engine.store = ModelStore(path, n_features=4, poll_s=poll_s)
+    publish_model(train(0), path)
+    store.load()
+    store.start()
+    rows = sample(BASE, 2000, 99)
+    body = lambda i: dict(zip(("hour", "device_trust", "geo_dist", "velocity"), rows[i % len(rows)]),  # noqa: E731
+                          user_id=f"user{i}")
+    latencies, failures = {"steady": [], "swapping": []}, 0
+    swapping = False
+    stop = asyncio.Event()
+
+    async def client_loop(client):
+        nonlocal failures
+        i = 0
+        while not stop.is_set():
+            ctx = body(i)
+            ctx["hour"] = int(ctx["hour"])
+            t0 = time.perf_counter()
+            resp = await client.post("/score", json=ctx)
+            latencies["swapping" if swapping else "steady"].append((time.perf_counter() - t0) * 1000.0)
+            failures += resp.status_code != 200 or "anomaly" not in resp.json()
+            i += 1
+
+    delays = []
+    transport = httpx.ASGITransport(app=risk_engine.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://risk-engine") as client:
+        clients = [asyncio.create_task(client_loop(client)) for _ in range(8)]
+        await asyncio.sleep(1.0)
+        for k in range(publishes):
+            model = train(k + 1)
+            before = store.swaps
+            swapping = True
+            t0 = time.perf_counter()
+            await asyncio.to_thread(publish_model, model, path)
+            while store.swaps == before:
+                await asyncio.sleep(0.01)
+            delays.append(time.perf_counter() - t0)
+            await asyncio.sleep(0.2)
+            swapping = False
+            await asyncio.sleep(0.5)
+        stop.set()
+        await asyncio.gather(*clients)
+    await store.stop()
+    await risk_engine.batcher.close()
+    ok = failures == 0 and store.swaps == publishes + 1
+    total = sum(len(v) for v in latencies.values())
+    logger.info(f"[{'PASS' if ok else 'FAIL'}] {publishes} hot swaps under load: {total} requests, "
+                f"{failures} failed, version {store.version}")
+    logger.info(f"[swap] publish -> live: mean {np.mean(delays) * 1000:.0f}ms max {max(delays) * 1000:.0f}ms "
+                f"(poll {poll_s}s)")
+    for phase, values in latencies.items():
+        logger.info(f"[swap] {phase:>8}: {summarize(values)} over {len(values)} requests")
+    return ok
+
+
+def refit(refits: int, path: str):
+    store = ModelStore(path, n_features=4, window=5000, refit_interval_s=1.0, min_refit_rows=1000,
+                       publish_refits=False)
+    store._install(train(0), "base")
+    probe = sample(DRIFTED, 5000, 7)
+    rates = []
+    for r in range(refits + 1):
+        rates.append(float(np.mean(store.model.score_samples(probe) - store.model.offset_ < 0)))
+        traffic = sample(DRIFTED, 3000, 100 + r)
+        store.record(traffic)
+        t0 = time.perf_counter()
+        store.refit()
+        took = time.perf_counter() - t0
+    base_rate = float(np.mean(store.model.score_samples(sample(BASE, 5000, 8)) - store.model.offset_ < 0))
+    logger.info(f"[refit] drifted traffic flagged anomalous per refit: {' -> '.join(f'{x:.1%}' for x in rates)} "
+                f"(last refit {took:.2f}s on {store._window_len} rows); original distribution now {base_rate:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--publishes", type=int, default=5)
+    parser.add_argument("--poll-s", type=float, default=0.1)
+    parser.add_argument("--refits", type=int, default=5)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "risk_model.joblib")
+        passed = asyncio.run(swap(args.publishes, args.poll_s, path))
+        refit(args.refits, path)
+    sys.exit(0 if passed else 1)
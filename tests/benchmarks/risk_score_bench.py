@@ -0,0 +1,132 @@
+"""
+risk-engine scoring throughput: the legacy /score (predict + score_samples,
+two forest traversals per request, inline on the event loop) vs the
+single-traversal /score behind the micro-batcher, and /score/batch.
+
+Requests go through httpx's ASGI transport to the real risk-engine app (no
+sockets), from 1, 8 and 64 concurrent clients. A check first confirms the
+single traversal reproduces the legacy decisions and scores.
+
+Usage:
+    python tests/benchmarks/risk_score_bench.py --concurrency 1 8 64 --requests 2000
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+from sklearn.ensemble import IsolationForest
+
+from bench_utils import load_service_module, summarize
+
+risk_engine = load_service_module("risk-engine", "main")
+score_rows = load_service_module("risk-engine", "scoring").score_rows
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("risk-score-bench")
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def train(n_estimators: int) -> IsolationForest:
+    X = np.random.default_rng(0).normal(loc=[12, 0.9, 10, 1], scale=[4, 0.1, 5, 0.5], size=(1000, 4))
+    return IsolationForest(n_estimators=n_estimators, random_state=42, contamination=0.05).fit(X)
+
+
+def legacy_app(model):
+    app = FastAPI()
+
+    @app.post("/score")
+    async def calculate_risk(context: risk_engine.RiskContext):
+        # The original calculate_risk body
+        features = [[context.hour, context.device_trust, context.geo_dist, context.velocity]]
+        prediction = model.predict(features)[0]
+        score_raw = model.score_samples(features)[0]
+        if prediction == -1:
+            risk_score = 85 + random.randint(0, 15)
+        else:
+            risk_score = max(0, 100 * (0.5 - abs(score_raw)))
+        action = "allow"
+        if risk_score > 80:
+            action = "block"
+        elif risk_score > 50:
+            action = "step_up"
+        return {"risk_score": int(risk_score), "action": action, "anomaly": bool(prediction == -1)}
+
+    return app
+
+
+def contexts(n: int, seed: int = 1):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(loc=[12, 0.9, 10, 1], scale=[6, 0.2, 15, 2], size=(n, 4))
+    return [{"user_id": f"user{i}", "hour": int(np.clip(r[0], 0, 23)), "device_trust": float(r[1]),
+             "geo_dist": float(abs(r[2])), "velocity": float(abs(r[3]))} for i, r in enumerate(X)]
+
+
+def check(model) -> bool:
+    rows = contexts(5000)
+    X = np.array([[c["hour"], c["device_trust"], c["geo_dist"], c["velocity"]] for c in rows])
+    prediction = model.predict(X)
+    raw = model.score_samples(X)
+    results = score_rows(model, X)
+    same_decision = all((p == -1) == r["anomaly"] for p, r in zip(prediction, results))
+    normal = [(int(max(0, 100 * (0.5 - abs(s)))), r["risk_score"]) for p, s, r in zip(prediction, raw, results) if p == 1]
+    same_score = all(a == b for a, b in normal)
+    ok = same_decision and same_score
+    logger.info(f"[{'PASS' if ok else 'FAIL'}] single traversal matches predict + score_samples on {len(rows)} rows "
+                f"({int((prediction == -1).sum())} anomalies)")
+    return ok
+
+
+async def load(app, path, concurrency, total, batch_size=1):
+    rows = contexts(max(total, batch_size))
+    latencies = []
+    counter = iter(range(0, total, batch_size))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://risk-engine") as client:
+        async def worker():
+            for i in counter:
+                body = rows[i] if batch_size == 1 else {"contexts": rows[i:i + batch_size]}
+                t0 = time.perf_counter()
+                resp = await client.post(path, json=body)
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+                assert resp.status_code == 200, resp.text
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return total / (time.perf_counter() - t0), latencies
+
+
+async def run(args, model):
+    risk_engine.store.model = model
+    legacy = legacy_app(model)
+    for concurrency in args.concurrency:
+        for name, app, path, batch in (("legacy /score      ", legacy, "/score", 1),
+                                       ("/score, batcher    ", risk_engine.app, "/score", 1),
+                                       (f"/score/batch x{args.batch:<4}", risk_engine.app, "/score/batch", args.batch)):
+            before = dict(risk_engine.batcher.stats())
+            rps, latencies = await load(app, path, concurrency, args.requests, batch)
+            extra = ""
+            if path == "/score" and app is risk_engine.app:
+                stats = risk_engine.batcher.stats()
+                batches = stats["batches"] - before["batches"]
+                extra = f" mean_batch={(stats['rows'] - before['rows']) / max(batches, 1):.1f}"
+            logger.info(f"[{name}] concurrency={concurrency:>3} rows/s={rps:8.1f} "
+                        f"{summarize(latencies)} (per call){extra}")
+    await risk_engine.batcher.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=64)
+    parser.add_argument("--trees", type=int, default=100)
+    args = parser.parse_args()
+    model = train(args.trees)
+    passed = check(model)
+    asyncio.run(run(args, model))
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,74 @@
+"""
+Template encoding report: storage/bandwidth per template, decode cost,
+gallery memory and match accuracy of each compact format against exact
+float32 cosine on the same gallery.
+
+Usage:
+    python tests/benchmarks/template_codec_bench.py --size 100000
+"""
+import argparse
+import json
+import logging
+
+import numpy as np
+
+from bench_utils import load_service_module, iris_like_embeddings, noisy_copies, timed, summarize
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("codec-bench")
+
+codec = load_service_module("matcher", "codec")
+gallery_mod = load_service_module("matcher", "gallery")
+
+
+def wire_report(sample):
+    legacy = [json.dumps(v.astype(np.float64).tolist()).encode() for v in sample]
+    _, lat = timed(lambda: [np.array(json.loads(b)) for b in legacy])
+    logger.info(f"[wire] json     {np.mean([len(b) for b in legacy]):>8.0f} B/template "
+                f"decode={lat[0] * 1000 / len(sample):.1f}us")
+
+    for fmt in codec.FORMATS:
+        blobs = [codec.encode_template(v, fmt) for v in sample]
+        _, lat = timed(lambda: [codec.decode_template(b) for b in blobs])
+        logger.info(f"[wire] {fmt:<8} {len(blobs[0]):>8} B/template "
+                    f"decode={lat[0] * 1000 / len(sample):.1f}us")
+
+
+def accuracy_report(templates, queries, k):
+    ids = [f"user_{i}" for i in range(templates.shape[0])]
+    rows = np.random.default_rng(5).integers(0, templates.shape[0], size=queries)
+    probes = noisy_copies(templates[rows])
+
+    reference = gallery_mod.TemplateGallery(dim=templates.shape[1], initial_capacity=len(ids))
+    reference.upsert_many(ids, templates)
+    truth = [reference.search(p, k=k) for p in probes]
+
+    for fmt in codec.FORMATS:
+        gallery = gallery_mod.TemplateGallery(dim=templates.shape[1], initial_capacity=len(ids), fmt=fmt)
+        gallery.upsert_many(ids, templates)
+
+        agree = recall = 0.0
+        score_err, latencies = [], []
+        for probe, gt, row in zip(probes, truth, rows):
+            res, lat = timed(gallery.search, probe, k=k)
+            latencies.extend(lat)
+            agree += res[0][0] == gt[0][0]
+            recall += len({u for u, _ in res} & {u for u, _ in gt}) / k
+            if fmt != codec.FORMAT_BITS:
+                score_err.append(abs(res[0][1] - gt[0][1]))
+        err = f"max|dscore|={max(score_err):.4f}" if score_err else "score=1-2*hamming"
+        logger.info(f"[match] {fmt:<8} mem={gallery.nbytes / 2**20:>7.1f}MiB top1_agree={agree / queries:.3f} "
+                    f"recall@{k}={recall / queries:.3f} {err} {summarize(latencies)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    templates = iris_like_embeddings(args.size, args.dim)
+    wire_report(templates[:1000])
+    accuracy_report(templates, args.queries, args.k)
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+# Service modules are loaded the way the benchmarks load them (relative
+# imports inside the service directories, gabizap_common on the path)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "benchmarks"))
+
+from bench_utils import load_service_module  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def auth_service(tmp_path_factory):
+    """auth-service main on a temporary sqlite database, no Redis configured."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("DATABASE_URL", f"sqlite:///{tmp_path_factory.mktemp('auth-service') / 'auth.db'}")
+        mp.delenv("REDIS_URL", raising=False)
+        mp.delenv("JWT_KEYS_DIR", raising=False)
+        mp.setenv("HASH_WORKERS", "1")
+        return load_service_module("auth-service", "main")
@@ -0,0 +1,88 @@
+import asyncio
+import types
+import uuid
+
+import httpx
+import pytest
+from sqlalchemy import event
+
+from bench_utils import load_service_module
+
+negative_cache = load_service_module("auth-service", "negative_cache")
+PASSWORD = "correct horse battery staple"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the module's monotonic clock with one the test advances."""
+    now = [1000.0]
+    monkeypatch.setattr(negative_cache, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = negative_cache.NegativeCache(b"key", ttl=30.0)
+    cache.add("ghost@example.com")
+    clock[0] += 29.0
+    assert "ghost@example.com" in cache and cache.hits == 1
+    clock[0] += 1.0
+    assert "ghost@example.com" not in cache and cache.hits == 1
+    # Expired entries are dropped on lookup
+    assert len(cache) == 0
+
+
+def test_oldest_entry_evicted_at_max_entries(clock):
+    cache = negative_cache.NegativeCache(b"key", max_entries=3)
+    for i in range(3):
+        cache.add(f"u{i}@example.com")
+    # Re-adding refreshes an entry, so u1 is now the oldest
+    cache.add("u0@example.com")
+    cache.add("u3@example.com")
+    assert len(cache) == 3
+    assert [f"u{i}@example.com" in cache for i in range(4)] == [True, False, True, True]
+
+
+def test_discard_on_registration(clock):
+    cache = negative_cache.NegativeCache(b"key")
+    cache.add("new@example.com")
+    cache.discard("new@example.com")
+    cache.discard("never-added@example.com")
+    assert "new@example.com" not in cache and len(cache) == 0
+
+
+def test_entries_are_keyed_digests():
+    cache = negative_cache.NegativeCache(b"key")
+    cache.add("ghost@example.com")
+    assert "ghost@example.com" not in negative_cache.NegativeCache(b"other-key")
+    assert all(len(digest) == 16 for digest in cache._entries)
+
+
+def test_unknown_email_answered_without_a_query(auth_service):
+    auth = auth_service
+    email = f"ghost-{uuid.uuid4().hex[:8]}@example.com"
+    queries = []
+
+    def count(*args):
+        queries.append(args[2])
+
+    async def scenario():
+        await auth.startup()
+        event.listen(auth.engine.sync_engine, "before_cursor_execute", count)
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=auth.app), base_url="http://auth") as client:
+                login = {"email": email, "password": PASSWORD}
+                first = await client.post("/token", json=login)
+                looked_up = len(queries)
+                second = await client.post("/token", json=login)
+                assert first.status_code == second.status_code == 401
+                assert looked_up >= 1 and len(queries) == looked_up
+
+                # Registration clears the entry: the new account can log in at once
+                created = await client.post("/users/", json=login)
+                assert created.status_code == 200, created.text
+                assert (await client.post("/token", json=login)).status_code == 200
+        finally:
+            event.remove(auth.engine.sync_engine, "before_cursor_execute", count)
+            await auth.shutdown()
+
+    asyncio.run(scenario())
@@ -0,0 +1,182 @@
+import asyncio
+import contextlib
+import time
+import uuid
+
+import fakeredis
+import httpx
+import pytest
+from jose import jwt
+from sqlalchemy import event
+
+from gabizap_common.passwords import hash_password
+from gabizap_common.revocation import RevocationFeed, RevocationSet
+
+PASSWORD = "correct horse battery staple"
+
+
+@pytest.fixture
+def auth(auth_service):
+    return auth_service
+
+
+@contextlib.asynccontextmanager
+async def running(auth, server):
+    """The service started with its Redis clients on a shared fakeredis server."""
+    saved = auth.revocation_redis, auth.revocation_feed, auth.sessions.redis
+    auth.revocation_redis = fakeredis.FakeAsyncRedis(server=server)
+    auth.revocation_feed = RevocationFeed(fakeredis.FakeAsyncRedis(server=server), auth.revocations)
+    auth.sessions.redis = fakeredis.FakeAsyncRedis(server=server)
+    await auth.startup()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=auth.app), base_url="http://auth") as client:
+            yield client
+    finally:
+        await auth.shutdown()
+        auth.revocation_redis, auth.revocation_feed, auth.sessions.redis = saved
+        auth.sessions._local.clear()
+
+
+def run(auth, scenario):
+    async def main():
+        server = fakeredis.FakeServer()
+        async with running(auth, server) as client:
+            await scenario(client, server)
+    asyncio.run(main())
+
+
+async def seed(auth, role="user"):
+    """A new user; returns (email, id)."""
+    email = f"{role}-{uuid.uuid4().hex[:8]}@example.com"
+    async with auth.SessionLocal() as db:
+        user = auth.models.User(email=email, hashed_password=hash_password(PASSWORD, rounds=4), role=role)
+        db.add(user)
+        await db.commit()
+        return email, user.id
+
+
+async def login(client, email):
+    resp = await client.post("/token", json={"email": email, "password": PASSWORD})
+    assert resp.status_code == 200, resp.text
+    return resp.json()
+
+
+def bearer(tokens):
+    return {"Authorization": f"Bearer {tokens['access_token']}"}
+
+
+def sid(tokens):
+    return jwt.get_unverified_claims(tokens["access_token"])["sid"]
+
+
+def test_login_opens_a_session(auth):
+    async def scenario(client, server):
+        tokens = await login(client, (await seed(auth))[0])
+        resp = await client.get("/validate", headers=bearer(tokens))
+        assert tokens["refresh_token"]
+        assert resp.status_code == 200 and resp.json()["sid"] == sid(tokens)
+    run(auth, scenario)
+
+
+def test_refresh_rotates(auth):
+    async def scenario(client, server):
+        first = await login(client, (await seed(auth))[0])
+        resp = await client.post("/token/refresh", json={"refresh_token": first["refresh_token"]})
+        assert resp.status_code == 200
+        second = resp.json()
+        assert second["refresh_token"] != first["refresh_token"] and sid(second) == sid(first)
+        assert (await client.get("/validate", headers=bearer(second))).status_code == 200
+    run(auth, scenario)
+
+
+def test_replayed_refresh_token_ends_the_session(auth):
+    async def scenario(client, server):
+        first = await login(client, (await seed(auth))[0])
+        second = (await client.post("/token/refresh", json={"refresh_token": first["refresh_token"]})).json()
+
+        replay = await client.post("/token/refresh", json={"refresh_token": first["refresh_token"]})
+        assert replay.status_code == 401
+        # Whoever holds the current token may be the thief: it is dead too
+        assert (await client.get("/validate", headers=bearer(second))).status_code == 401
+        current = await client.post("/token/refresh", json={"refresh_token": second["refresh_token"]})
+        assert current.status_code == 401
+    run(auth, scenario)
+
+
+def test_token_revoke_ends_the_session(auth):
+    async def scenario(client, server):
+        email, _ = await seed(auth)
+        tokens, other = await login(client, email), await login(client, email)
+        resp = await client.post("/token/revoke", json={"refresh_token": tokens["refresh_token"]})
+        assert resp.status_code == 204
+        assert (await client.get("/validate", headers=bearer(tokens))).status_code == 401
+        refresh = await client.post("/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+        assert refresh.status_code == 401
+        assert (await client.get("/validate", headers=bearer(other))).status_code == 200
+        # Unknown tokens are not an error (RFC 7009)
+        assert (await client.post("/token/revoke", json={"refresh_token": "nope"})).status_code == 204
+    run(auth, scenario)
+
+
+def test_revoke_all_sessions_is_self_or_admin_only(auth):
+    async def scenario(client, server):
+        alice_email, alice_id = await seed(auth)
+        alice = [await login(client, alice_email) for _ in range(3)]
+        bob = await login(client, (await seed(auth))[0])
+        admin = await login(client, (await seed(auth, role="admin"))[0])
+
+        denied = await client.delete(f"/users/{alice_id}/sessions", headers=bearer(bob))
+        assert denied.status_code == 403
+        assert [(await client.get("/validate", headers=bearer(t))).status_code for t in alice] == [200] * 3
+
+        resp = await client.delete(f"/users/{alice_id}/sessions", headers=bearer(admin))
+        assert resp.status_code == 200 and resp.json() == {"revoked_sessions": 3}
+        assert [(await client.get("/validate", headers=bearer(t))).status_code for t in alice] == [401] * 3
+        assert (await client.get("/validate", headers=bearer(bob))).status_code == 200
+
+        own = await login(client, alice_email)
+        resp = await client.delete(f"/users/{alice_id}/sessions", headers=bearer(own))
+        assert resp.json() == {"revoked_sessions": 1}
+    run(auth, scenario)
+
+
+def test_revocation_reaches_the_other_replica(auth):
+    async def scenario(client, server):
+        alice_email, alice_id = await seed(auth)
+        admin = await login(client, (await seed(auth, role="admin"))[0])
+        sids = [sid(await login(client, alice_email)) for _ in range(3)]
+
+        # Replica B: its own memory and revocation set, same Redis and database
+        replica_revocations = RevocationSet()
+        feed = RevocationFeed(fakeredis.FakeAsyncRedis(server=server), replica_revocations)
+        await feed.start(wait=2.0)
+        try:
+            replica = auth.SessionStore(fakeredis.FakeAsyncRedis(server=server), auth.load_session,
+                                        replica_revocations, access_ttl_s=1800)
+            assert all([await replica.active(s) for s in sids])
+
+            await client.delete(f"/users/{alice_id}/sessions", headers=bearer(admin))
+            deadline = time.monotonic() + 2.0
+            while not all(s in replica_revocations for s in sids) and time.monotonic() < deadline:
+                await asyncio.sleep(0.001)
+            assert not any([await replica.active(s) for s in sids])
+        finally:
+            await feed.stop()
+    run(auth, scenario)
+
+
+def test_validate_issues_no_query_once_cached(auth):
+    async def scenario(client, server):
+        tokens = await login(client, (await seed(auth))[0])
+        queries = []
+
+        def count(*args):
+            queries.append(args[2])
+        event.listen(auth.engine.sync_engine, "before_cursor_execute", count)
+        try:
+            for _ in range(20):
+                assert (await client.get("/validate", headers=bearer(tokens))).status_code == 200
+        finally:
+            event.remove(auth.engine.sync_engine, "before_cursor_execute", count)
+        assert queries == []
+    run(auth, scenario)
@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import fakeredis
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+from bench_utils import load_service_module
+
+# fakeredis runs the GCRA Lua script through lupa
+pytest.importorskip("lupa")
+
+middleware = load_service_module("api-gateway", "middleware")
+
+LIMIT = 100
+
+
+def backend():
+    async def ok(request):
+        return PlainTextResponse("ok")
+    return Starlette(routes=[Route("/{path:path}", ok, methods=["GET", "POST"])])
+
+
+def limited(client, limit=LIMIT, window=60.0, rules=(), lease=None):
+    app = middleware.RateLimitMiddleware(backend(), limit=limit, window=window, rules=rules,
+                                         redis_timeout=0.05, client=client)
+    if lease is not None:
+        app.default.lease = lease
+    return app
+
+
+def fake(server):
+    return fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+
+async def burst(app, n, path="/users/me", ip="10.0.0.1"):
+    """Number of n concurrent requests from one client that got through."""
+    transport = httpx.ASGITransport(app=app, client=(ip, 5000))
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        semaphore = asyncio.Semaphore(64)
+
+        async def one():
+            async with semaphore:
+                return (await client.get(path)).status_code
+        codes = await asyncio.gather(*(one() for _ in range(n)))
+    return sum(c == 200 for c in codes)
+
+
+@pytest.mark.parametrize("lease", [1, None])
+def test_concurrent_burst_never_overshoots(lease):
+    app = limited(fake(fakeredis.FakeServer()), lease=lease)
+    assert asyncio.run(burst(app, 3 * LIMIT)) == LIMIT
+
+
+def test_replicas_share_one_limit():
+    server = fakeredis.FakeServer()
+
+    async def run():
+        return await asyncio.gather(burst(limited(fake(server)), 2 * LIMIT), burst(limited(fake(server)), 2 * LIMIT))
+
+    assert sum(asyncio.run(run())) == LIMIT
+
+
+def test_sustained_rate_after_burst():
+    window = 2.0
+    app = limited(fake(fakeredis.FakeServer()), window=window, lease=1)
+
+    async def run():
+        await burst(app, LIMIT)
+        allowed, t0 = 0, time.perf_counter()
+        while time.perf_counter() - t0 < window:
+            allowed += await burst(app, 1)
+            await asyncio.sleep(window / LIMIT / 4)
+        return allowed
+
+    assert abs(asyncio.run(run()) - LIMIT) <= 0.1 * LIMIT + 1
+
+
+def test_per_route_rule():
+    login = middleware.RateLimitRule("login", "/auth/token", 5, 60.0, per="ip")
+    app = limited(fake(fakeredis.FakeServer()), rules=[login])
+
+    async def run():
+        return (await burst(app, 20, path="/auth/token"), await burst(app, 20, path="/users/me"),
+                await burst(app, 20, path="/auth/token", ip="10.0.0.2"))
+
+    assert asyncio.run(run()) == (5, 20, 5)
+
+
+def test_redis_down_enforces_locally():
+    down = fakeredis.FakeServer()
+    down.connected = False
+    app = limited(fakeredis.FakeAsyncRedis(server=down))
+    assert asyncio.run(burst(app, 3 * LIMIT)) == LIMIT
+    assert app.limiter.fallbacks > 0
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from bench_utils import load_service_module
+from gabizap_common.executor import Overloaded
+
+pool_mod = load_service_module("hand-engine", "pool")
+
+
+class FakeHands:
+    def __init__(self, static_image_mode=True):
+        self.static_image_mode = static_image_mode
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_session_graph_built_outside_the_lock():
+    # Both openers of cam-1 are inside the factory at once
+    both_building = threading.Barrier(2, timeout=5)
+    created = []
+
+    def factory(static_image_mode=True):
+        hands = FakeHands(static_image_mode)
+        created.append(hands)
+        if not static_image_mode:
+            both_building.wait()
+        return hands
+
+    pool = pool_mod.HandsPool(1, factory=factory)
+    used = []
+
+    def track():
+        with pool.session("cam-1") as hands:
+            used.append(hands)
+
+    threads = [threading.Thread(target=track) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+
+    assert len(created) == 2 and len(used) == 2
+    # One graph kept for the session, the other closed
+    assert used[0] is used[1] and not used[0].closed
+    assert [h.closed for h in created].count(True) == 1
+    assert pool.stats()["sessions"] == 1
+
+
+def test_checkout_not_blocked_by_session_construction():
+    building, release = threading.Event(), threading.Event()
+
+    def factory(static_image_mode=True):
+        if not static_image_mode:
+            building.set()
+            release.wait(5)
+        return FakeHands(static_image_mode)
+
+    pool = pool_mod.HandsPool(1, factory=factory)
+    t = threading.Thread(target=lambda: pool.session("cam-1").__enter__())
+    t.start()
+    assert building.wait(5)
+    t0 = time.monotonic()
+    with pool.checkout(timeout=1) as hands:
+        assert hands.static_image_mode
+    assert time.monotonic() - t0 < 1.0
+    release.set()
+    t.join(5)
+
+
+def test_full_pool_rejects_before_building():
+    created = []
+
+    def factory(static_image_mode=True):
+        created.append(FakeHands(static_image_mode))
+        return created[-1]
+
+    pool = pool_mod.HandsPool(1, max_sessions=1, factory=factory)
+    entered, leave = threading.Event(), threading.Event()
+
+    def busy():
+        with pool.session("cam-1"):
+            entered.set()
+            leave.wait(5)
+
+    t = threading.Thread(target=busy)
+    t.start()
+    assert entered.wait(5)
+    with pytest.raises(Overloaded):
+        with pool.session("cam-2"):
+            pass
+    leave.set()
+    t.join(5)
+    assert len(created) == 1 and not created[0].closed
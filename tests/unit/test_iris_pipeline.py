@@ -0,0 +1,43 @@
+import asyncio
+
+from bench_utils import load_service_module, synthetic_eye_images
+
+model = load_service_module("iris-engine", "model")
+pipeline = load_service_module("iris-engine", "pipeline")
+
+
+def test_bad_image_fails_only_its_own_slot():
+    pipeline._worker_model = model.IrisModel()
+    good = synthetic_eye_images(2)
+    results, _ = pipeline.analyze_images([good[0], b"not an image", good[1]])
+    assert isinstance(results[1], ValueError)
+    assert all(isinstance(r, model.IrisTemplate) for r in (results[0], results[2]))
+
+
+def test_batch_with_undecodable_image():
+    good = synthetic_eye_images(3)
+
+    async def run():
+        batcher = pipeline.EmbeddingBatcher(None, workers=1, max_batch=8)
+        await batcher.start()
+        try:
+            many = await batcher.embed_many([good[0], b"not an image", good[1], good[2]])
+            single = await asyncio.gather(batcher.embed(good[0]), batcher.embed(b"\x00" * 64),
+                                          return_exceptions=True)
+        finally:
+            await batcher.stop()
+        return many, single
+
+    many, single = asyncio.run(run())
+    assert isinstance(many[1], ValueError)
+    assert [isinstance(r, model.IrisTemplate) for r in many] == [True, False, True, True]
+    assert isinstance(single[0], model.IrisTemplate) and isinstance(single[1], ValueError)
+
+
+def test_default_admission_fits_a_full_batch():
+    batcher = pipeline.EmbeddingBatcher(None, workers=1, max_batch=16, max_batch_files=64)
+    assert batcher.executor.max_pending >= 64
+    batcher.executor.admit(64)
+    batcher.executor.release(64)
+    # An explicit limit is kept as configured
+    assert pipeline.EmbeddingBatcher(None, workers=1, max_pending=8, max_batch_files=64).executor.max_pending == 8
@@ -0,0 +1,190 @@
+import asyncio
+import base64
+import json
+import os
+import time
+
+import httpx
+import pytest
+from jose import jwk, jwt
+
+from bench_utils import load_service_module
+from gabizap_common.jwks import InvalidToken, KeySet, RemoteKeySet, TokenVerifier, UnknownSigningKey
+from gabizap_common.revocation import RevocationSet
+
+signing_keys = load_service_module("auth-service", "signing_keys")
+JWKS_URL = "http://auth/.well-known/jwks.json"
+
+
+def new_key(created=None):
+    key = jwk.construct(signing_keys.generate_pem(), signing_keys.ALGORITHM)
+    return (time.time() if created is None else created), key, signing_keys.public_jwk(key)
+
+
+def claims(**extra):
+    return {"sub": "alice@example.com", "exp": time.time() + 60, **extra}
+
+
+def kid_of(token):
+    return jwt.get_unverified_header(token)["kid"]
+
+
+def test_sign_verify_round_trip():
+    keys = signing_keys.SigningKeys.generate()
+    token = keys.sign(claims(jti="j1", sid="s1"))
+    assert kid_of(token) == keys.jwks()["keys"][0]["kid"]
+
+    verified = TokenVerifier(KeySet.from_jwks(keys.jwks()), [signing_keys.ALGORITHM]).verify(token)
+    assert verified["sub"] == "alice@example.com" and verified["jti"] == "j1"
+
+
+def test_auth_service_token_verifies_with_published_jwks(auth_service):
+    async def scenario():
+        transport = httpx.ASGITransport(app=auth_service.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://auth") as client:
+            keys = RemoteKeySet(JWKS_URL, client=client)
+            await keys.refresh()
+            token = auth_service.create_access_token({"sub": "alice@example.com"})
+            return TokenVerifier(keys, [signing_keys.ALGORITHM]).verify(token)
+
+    assert asyncio.run(scenario())["sub"] == "alice@example.com"
+
+
+def forgeries(public, token):
+    kid = public["kid"]
+    _, other, _ = new_key()
+    none_header = base64.urlsafe_b64encode(json.dumps({"alg": "none", "kid": kid}).encode()).rstrip(b"=").decode()
+    return {
+        # HMAC "signed" with the public key, the classic algorithm confusion
+        "hs256-public-key": jwt.encode(claims(), public["x"], algorithm="HS256", headers={"kid": kid}),
+        "foreign-key": jwt.encode(claims(), other, algorithm=signing_keys.ALGORITHM, headers={"kid": kid}),
+        "alg-none": f"{none_header}.{token.split('.')[1]}.",
+    }
+
+
+@pytest.mark.parametrize("forgery", ["hs256-public-key", "foreign-key", "alg-none"])
+def test_forgery_rejected(forgery):
+    keys = signing_keys.SigningKeys.generate()
+    verifier = TokenVerifier(KeySet.from_jwks(keys.jwks()), [signing_keys.ALGORITHM])
+    token = forgeries(keys.jwks()["keys"][0], keys.sign(claims()))[forgery]
+    with pytest.raises(InvalidToken):
+        verifier.verify(token)
+
+
+def test_unknown_kid_rejected_by_fixed_key_set():
+    keys = signing_keys.SigningKeys.generate()
+    verifier = TokenVerifier(KeySet.from_jwks(keys.jwks()), [signing_keys.ALGORITHM])
+    _, other, public = new_key()
+    unknown = jwt.encode(claims(), other, algorithm=signing_keys.ALGORITHM, headers={"kid": public["kid"]})
+    with pytest.raises(UnknownSigningKey):
+        verifier.verify(unknown)
+    # A fixed key set can't learn new keys
+    with pytest.raises(UnknownSigningKey):
+        asyncio.run(verifier.verify_async(unknown))
+
+
+def test_unknown_kid_refetches_once_then_throttles():
+    old, new = new_key(), new_key()
+    published = {"keys": [old[2]]}
+
+    async def scenario():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json=published)))
+        keys = RemoteKeySet(JWKS_URL, min_refresh_s=0.5, client=client)
+        verifier = TokenVerifier(keys, [signing_keys.ALGORITHM])
+        await keys.refresh()
+        assert keys.fetches == 1
+        await asyncio.sleep(0.6)
+
+        # Rotation: tokens signed with a key the verifier hasn't fetched yet
+        published["keys"] = [old[2], new[2]]
+        rotated = signing_keys.SigningKeys([old, new]).sign(claims())
+        results = await asyncio.gather(*(verifier.verify_async(rotated) for _ in range(20)))
+        assert all(r["sub"] == "alice@example.com" for r in results)
+        assert keys.fetches == 2
+
+        # Forged kids within min_refresh_s of that fetch don't reach auth-service
+        _, other, _ = new_key()
+        forged = jwt.encode(claims(), other, algorithm=signing_keys.ALGORITHM, headers={"kid": "forged"})
+        for _ in range(20):
+            with pytest.raises(UnknownSigningKey):
+                await verifier.verify_async(forged)
+        assert keys.fetches == 2
+        await keys.close()
+
+    asyncio.run(scenario())
+
+
+def test_refresh_after_ttl_runs_in_background():
+    key = new_key()
+
+    async def scenario():
+        fetched = asyncio.Event()
+
+        async def handler(request):
+            await fetched.wait()
+            return httpx.Response(200, json={"keys": [key[2]]})
+
+        keys = RemoteKeySet(JWKS_URL, ttl_s=0.0, min_refresh_s=0.0,
+                            client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        fetched.set()
+        await keys.refresh()
+        fetched.clear()
+        verifier = TokenVerifier(keys, [signing_keys.ALGORITHM])
+        # The stale set still verifies while the refetch waits on auth-service
+        token = signing_keys.SigningKeys([key]).sign(claims())
+        assert verifier.verify(token)["sub"] == "alice@example.com"
+        await asyncio.sleep(0)
+        assert keys.fetches == 2 and not keys._refreshing.done()
+        fetched.set()
+        await keys._refreshing
+        await keys.close()
+
+    asyncio.run(scenario())
+
+
+def test_expired_token_rejected():
+    keys = signing_keys.SigningKeys.generate()
+    verifier = TokenVerifier(KeySet.from_jwks(keys.jwks()), [signing_keys.ALGORITHM])
+    with pytest.raises(InvalidToken):
+        verifier.verify(keys.sign(claims(exp=time.time() - 5)))
+
+    # Expiry also applies to a token already in the verified-claims cache
+    token = keys.sign(claims(exp=time.time() + 0.3))
+    verifier.verify(token)
+    time.sleep(0.4)
+    with pytest.raises(InvalidToken):
+        verifier.verify(token)
+
+
+@pytest.mark.parametrize("field", ["jti", "sid"])
+def test_revoked_token_rejected(field):
+    keys = signing_keys.SigningKeys.generate()
+    revocations = RevocationSet()
+    verifier = TokenVerifier(KeySet.from_jwks(keys.jwks()), [signing_keys.ALGORITHM], revocations=revocations)
+    token = keys.sign(claims(jti="j1", sid="s1"))
+    other = keys.sign(claims(jti="j2", sid="s2"))
+    verifier.verify(token)
+
+    revocations.add({"jti": "j1", "sid": "s1"}[field], time.time() + 60)
+    with pytest.raises(InvalidToken):
+        verifier.verify(token)
+    assert verifier.verify(other)["jti"] == "j2"
+
+
+def test_new_key_is_published_before_it_signs(tmp_path):
+    old_kid = signing_keys.write_key(str(tmp_path))
+    an_hour_ago = time.time() - 3600
+    os.utime(tmp_path / f"{old_kid}.pem", (an_hour_ago, an_hour_ago))
+    new_kid = signing_keys.write_key(str(tmp_path))
+
+    keys = signing_keys.SigningKeys.load(str(tmp_path), activation_s=600)
+    assert {k["kid"] for k in keys.jwks()["keys"]} == {old_kid, new_kid}
+    token = keys.sign(claims())
+    assert kid_of(token) == old_kid
+    assert keys.current(time.time() + 601)[1] == new_kid
+
+    # Verifiers holding the published set accept both
+    verifier = TokenVerifier(KeySet.from_jwks(keys.jwks()), [signing_keys.ALGORITHM])
+    assert verifier.verify(token)["sub"] == "alice@example.com"
+    new_token = signing_keys.SigningKeys.load(str(tmp_path), activation_s=0).sign(claims())
+    assert kid_of(new_token) == new_kid and verifier.verify(new_token)
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from bench_utils import load_service_module
+
+codec = load_service_module("matcher", "codec")
+
+
+@pytest.mark.parametrize("fmt", codec.FORMATS)
+def test_round_trip(fmt):
+    vector = np.random.default_rng(0).standard_normal(128).astype(np.float32)
+    decoded = codec.decode_template(codec.encode_template(vector, fmt))
+    assert decoded.shape == (128,)
+    assert np.dot(decoded, vector) / (np.linalg.norm(decoded) * np.linalg.norm(vector)) > 0.7
+
+
+@pytest.mark.parametrize("fmt", codec.FORMATS)
+@pytest.mark.parametrize("keep", [0, 2, 5, -1])
+def test_truncated_template_is_a_value_error(fmt, keep):
+    blob = codec.encode_template(np.ones(128, dtype=np.float32), fmt)
+    with pytest.raises(ValueError, match="Truncated template"):
+        codec.decode_template(blob[:codec.HEADER.size + keep] if keep >= 0 else blob[:keep])
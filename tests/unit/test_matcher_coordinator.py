@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from bench_utils import load_service_module
+
+os.environ.setdefault("SHARD_URLS", "shard-0=http://shard-0,shard-1=http://shard-1")
+coordinator = load_service_module("matcher", "coordinator")
+
+
+def call_with(handler, route, *args):
+    async def run():
+        coordinator.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await route(*args)
+        finally:
+            await coordinator.client.aclose()
+    return asyncio.run(run())
+
+
+def register_with(response: httpx.Response):
+    return call_with(lambda request: response, coordinator.register_template, "alice", [0.1, 0.2])
+
+
+def owned_by_each_shard():
+    """One user_id per shard, so owner routing is observable."""
+    users = {}
+    for i in range(1000):
+        users.setdefault(coordinator.ring.owner(f"user-{i}"), f"user-{i}")
+        if len(users) == len(coordinator.shard_urls):
+            return users
+    raise AssertionError("ring never assigned some shard")
+
+
+def echo_shard(seen):
+    def handler(request):
+        seen.append(str(request.url))
+        return httpx.Response(200, json={"status": "ok", "user_id": json.loads(request.content)["user_id"]})
+    return handler
+
+
+def test_register_forwards_json_error_detail():
+    with pytest.raises(HTTPException) as exc:
+        register_with(httpx.Response(422, json={"detail": "Embedding has the wrong dimension"}))
+    assert exc.value.status_code == 422 and exc.value.detail == "Embedding has the wrong dimension"
+
+
+@pytest.mark.parametrize("response", [
+    httpx.Response(502, text="Bad Gateway", headers={"content-type": "text/plain"}),
+    httpx.Response(500, content=b"<html>Internal Server Error</html>", headers={"content-type": "text/html"}),
+    httpx.Response(503, content=b"not json", headers={"content-type": "application/json"}),
+])
+def test_register_non_json_error(response):
+    with pytest.raises(HTTPException) as exc:
+        register_with(response)
+    assert exc.value.status_code == response.status_code
+    assert exc.value.detail == response.text
+
+
+@pytest.mark.parametrize("path, route, make_request", [
+    ("/register/iris", coordinator.register_iris_code,
+     lambda user_id: coordinator.IrisCodeRegistration(user_id=user_id, iris_code="AAAA", iris_mask="AAAA")),
+    ("/register/hand", coordinator.register_hand,
+     lambda user_id: coordinator.HandRegistration(user_id=user_id, descriptor="AAAA")),
+    ("/verify/fusion", coordinator.verify_fusion,
+     lambda user_id: coordinator.FusionVerifyRequest(user_id=user_id, hand_descriptor="AAAA")),
+])
+def test_per_user_routes_go_to_owner(path, route, make_request):
+    for owner, user_id in owned_by_each_shard().items():
+        seen = []
+        result = call_with(echo_shard(seen), route, make_request(user_id))
+        assert seen == [f"{coordinator.shard_urls[owner]}{path}"]
+        assert result["shard"] == owner and result["user_id"] == user_id
+
+
+def test_fusion_passes_shard_status_through():
+    def handler(request):
+        return httpx.Response(404, json={"detail": "No enrolled template for the supplied modalities"})
+    req = coordinator.FusionVerifyRequest(user_id="alice", hand_descriptor="AAAA")
+    with pytest.raises(HTTPException) as exc:
+        call_with(handler, coordinator.verify_fusion, req)
+    assert exc.value.status_code == 404
+
+
+def test_match_hand_merges_nearest_across_shards():
+    hits = {
+        "shard-0": [{"user_id": "bob", "distance": 0.08}, {"user_id": "carol", "distance": 0.2}],
+        "shard-1": [{"user_id": "alice", "distance": 0.03}],
+    }
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.path)
+        assert json.loads(request.content)["top_k"] == 2
+        return httpx.Response(200, json={"shard": request.url.host, "results": [hits[request.url.host]]})
+
+    result = call_with(handler, coordinator.match_hand, coordinator.HandMatchRequest(descriptor="AAAA", top_k=2))
+    assert seen == ["/shard/search/hand"] * 2
+    assert result["match"] and result["user_id"] == "alice" and result["distance"] == 0.03
+    assert [c["user_id"] for c in result["candidates"]] == ["alice", "bob"]
+
+    result = call_with(handler, coordinator.match_hand,
+                       coordinator.HandMatchRequest(descriptor="AAAA", threshold=0.01, top_k=2))
+    assert not result["match"] and "user_id" not in result
+
+
+def test_match_hand_fails_when_a_shard_is_down():
+    def handler(request):
+        if request.url.host == "shard-1":
+            raise httpx.ConnectError("refused")
+        return httpx.Response(200, json={"shard": "shard-0", "results": [[]]})
+    with pytest.raises(HTTPException) as exc:
+        call_with(handler, coordinator.match_hand, coordinator.HandMatchRequest(descriptor="AAAA"))
+    assert exc.value.status_code == 503
+
+
+def test_match_iris_merges_nearest_across_shards():
+    hits = {
+        "shard-0": [{"user_id": "bob", "distance": 0.21, "shift": 1}],
+        "shard-1": [{"user_id": "alice", "distance": 0.12, "shift": -2}, {"user_id": "bob", "distance": 0.25, "shift": 0}],
+    }
+    seen = []
+
+    def handler(request):
+        seen.append(request.url.path)
+        body = json.loads(request.content)
+        assert body["threshold"] == 0.3 and body["top_k"] == 3
+        return httpx.Response(200, json={"shard": request.url.host, "results": [hits[request.url.host]]})
+
+    req = coordinator.IrisMatchRequest(iris_code="AAAA", iris_mask="AAAA", threshold=0.3, top_k=3)
+    result = call_with(handler, coordinator.match_iris_code, req)
+    assert seen == ["/shard/search/iris"] * 2
+    assert (result["user_id"], result["distance"], result["shift"]) == ("alice", 0.12, -2)
+    # bob is reported once, with the closer of his two distances
+    assert [(c["user_id"], c["distance"]) for c in result["candidates"]] == [("alice", 0.12), ("bob", 0.21)]
+
+
+def test_match_iris_without_hits_is_no_match():
+    def handler(request):
+        return httpx.Response(200, json={"shard": request.url.host, "results": [[]]})
+    result = call_with(handler, coordinator.match_iris_code,
+                       coordinator.IrisMatchRequest(iris_code="AAAA", iris_mask="AAAA"))
+    assert result == {"match": False, "distance": None}
+
+
+def test_match_iris_invalid_probe_is_400():
+    def handler(request):
+        return httpx.Response(400, json={"detail": "Iris code has the wrong length"})
+    with pytest.raises(HTTPException) as exc:
+        call_with(handler, coordinator.match_iris_code,
+                  coordinator.IrisMatchRequest(iris_code="AAAA", iris_mask="AAAA"))
+    assert exc.value.status_code == 400 and exc.value.detail == "Iris code has the wrong length"
@@ -0,0 +1,39 @@
+import numpy as np
+
+from bench_utils import load_service_module
+
+gallery_mod = load_service_module("matcher", "gallery")
+ann = load_service_module("matcher", "ann")
+
+
+def indexed_rows(index):
+    return np.sort(np.concatenate([inv.view() for inv in index.lists]))
+
+
+def test_changes_during_training_reach_the_new_index():
+    rng = np.random.default_rng(0)
+    gallery = gallery_mod.TemplateGallery(dim=32, initial_capacity=8)
+    gallery.upsert_many([f"user_{i}" for i in range(200)], rng.standard_normal((200, 32)))
+    gallery.attach_index(ann.IVFIndex(n_lists=8, n_iter=3))
+    gallery.train_index()
+    late = rng.standard_normal((50, 32)).astype(np.float32)
+
+    class Racing(ann.IVFIndex):
+        def train(self, vectors):
+            # Runs without the gallery lock: registrations and matches go on
+            assert gallery.search(late[0], k=1)
+            gallery.upsert_many([f"late_{i}" for i in range(50)], late)
+            gallery.remove("user_3")
+            gallery.remove("late_7")
+            super().train(vectors)
+
+    old = gallery.index
+    gallery.index.empty_copy = lambda: Racing(n_lists=8, n_iter=3)
+    gallery.train_index()
+
+    assert gallery.index is not old and gallery.index.is_trained
+    assert len(gallery) == 248
+    assert np.array_equal(indexed_rows(gallery.index), np.arange(248))
+    for i in (0, 10, 49):
+        assert gallery.search(late[i], k=1, mode="ivf", n_probe=8)[0][0] == f"late_{i}"
+    assert gallery._changes is None
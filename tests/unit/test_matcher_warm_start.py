@@ -0,0 +1,34 @@
+import os
+
+import fakeredis
+import numpy as np
+
+from bench_utils import load_service_module
+
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+matcher = load_service_module("matcher", "main")
+snapshot = load_service_module("matcher", "snapshot")
+
+
+def test_restored_gallery_above_threshold_gets_an_index(tmp_path, monkeypatch):
+    cfg = matcher.config
+    monkeypatch.setattr(cfg, "SNAPSHOT_PATH", str(tmp_path / "gallery.snap"))
+    monkeypatch.setattr(cfg, "SNAPSHOT_INTERVAL", 0)
+    monkeypatch.setattr(cfg, "IVF_MIN_TRAIN", 100)
+    monkeypatch.setattr(cfg, "IVF_LISTS", 8)
+    monkeypatch.setattr(matcher, "r", fakeredis.FakeRedis())
+
+    # Snapshot of a gallery that was too small to cluster when it was taken
+    small = matcher.TemplateGallery(dim=cfg.EMBEDDING_DIM, fmt=cfg.GALLERY_FORMAT)
+    small.attach_index(matcher.IVFIndex(n_lists=8))
+    vectors = np.random.default_rng(0).standard_normal((150, cfg.EMBEDDING_DIM))
+    small.upsert_many([f"user_{i}" for i in range(150)], vectors)
+    snapshot.save_snapshot(small, cfg.SNAPSHOT_PATH, meta={"log_id": "0-0", "shard_members": None})
+    assert not small.index.is_trained
+
+    monkeypatch.setattr(matcher, "gallery", matcher.TemplateGallery(dim=cfg.EMBEDDING_DIM))
+    matcher.warm_gallery()
+
+    assert len(matcher.gallery) == 150
+    assert matcher.gallery.index.is_trained
+    assert matcher.gallery.search(vectors[7], k=1, mode="ivf", n_probe=8)[0][0] == "user_7"
@@ -0,0 +1,29 @@
+import threading
+
+import numpy as np
+
+from bench_utils import load_service_module
+
+model_store = load_service_module("risk-engine", "model_store")
+
+
+def test_concurrent_records_keep_the_window_consistent(tmp_path):
+    store = model_store.ModelStore(str(tmp_path / "model.joblib"), n_features=4, window=1000,
+                                   refit_interval_s=60.0)
+    batches = [np.full((7, 4), float(t)) for t in range(8)]
+
+    def record(X):
+        for _ in range(100):
+            store.record(X)
+
+    threads = [threading.Thread(target=record, args=(X,)) for X in batches]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert store._window_len == 1000
+    assert store._window_pos == (8 * 100 * 7) % 1000
+    # Every row is one whole batch's row, never a mix of two
+    rows = store._window[:store._window_len]
+    assert np.all(rows == rows[:, :1])